@@ -1,12 +1,37 @@
+import asyncio
+import hashlib
+import io
 import logging
-from openai import OpenAI
-import json
+import orjson
 
-def evaluate_and_suggest_improvements(llm_client: OpenAI, user_query: str, answer: str, context: str) -> dict:
+from .answer_synthesizer import NARRATIVE_ERROR_MESSAGE, NO_INFORMATION_MESSAGE
+from .response_cache import ResponseCache
+
+CRITIC_MODEL = "gpt-4o-mini"
+
+# Fallback answers produced upstream; there is nothing for the critic to evaluate
+SENTINEL_ANSWERS = frozenset({NO_INFORMATION_MESSAGE, NARRATIVE_ERROR_MESSAGE})
+
+async def evaluate_and_suggest_improvements(llm_client, user_query: str, answer: str, context: str,
+                                            cache: ResponseCache = None) -> dict:
     """
     Evaluates the answer's faithfulness to the provided context and its relevance to the user query.
+    Uses the client's async `achat` interface so it can run alongside other requests.
+    If a ResponseCache is given, evaluations are reused for an identical (query, answer, context).
     """
+    if answer.strip() in SENTINEL_ANSWERS or not context.strip():
+        logging.info("Critic skipped: the answer is a fallback message or there is no context.")
+        return {"decision": "ACCEPT", "feedback": "sentinel"}
+
     logging.info("Critic is evaluating the answer...")
+
+    namespace = None
+    if cache is not None:
+        context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+        namespace = ResponseCache.make_key("critic", getattr(llm_client, "model", CRITIC_MODEL), user_query, context_hash)
+        cached = await asyncio.to_thread(cache.get, namespace, answer, False)
+        if cached is not None:
+            return orjson.loads(cached)
     
     prompt = f"""
 Your role is to act as a strict, constructive critic. Your primary goal is to ensure the "Synthesized Answer" is a faithful and comprehensive summary of the "Provided Context" in relation to the "User Query".
@@ -44,20 +69,29 @@ Example of REFINE:
 Provide your JSON response now.
 """
     try:
-        response = llm_client.chat.completions.create(
-            model="gpt-4o-mini",
+        response_stream = await llm_client.achat.completions.create(
+            model=CRITIC_MODEL,
             messages=[
                 {"role": "system", "content": "You are a critical AI evaluator that responds in JSON format."},
                 {"role": "user", "content": prompt}
             ],
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            stream=True
         )
-        
-        evaluation_str = response.choices[0].message.content
-        logging.info(f"Critic evaluation: {evaluation_str}")
-        evaluation = json.loads(evaluation_str)
+
+        # Accumulate the streamed deltas and parse once at the end
+        buffer = io.StringIO()
+        async for chunk in response_stream:
+            if chunk.choices:
+                buffer.write(chunk.choices[0].delta.content or "")
+
+        evaluation_str = buffer.getvalue()
+        logging.info("Critic evaluation: %s", evaluation_str)
+        evaluation = orjson.loads(evaluation_str)
+        if namespace is not None:
+            await asyncio.to_thread(cache.set, namespace, answer, evaluation_str, False)
         return evaluation
     except Exception as e:
-        logging.error(f"An error occurred during critic evaluation: {e}")
+        logging.error("An error occurred during critic evaluation: %s", e)
         # Fallback in case of error to prevent a crash
         return {"decision": "ACCEPT", "feedback": "Critic failed to evaluate, accepting by default."} 
\ No newline at end of file
@@ -1,22 +1,91 @@
+import asyncio
+import functools
+import hashlib
+import io
 import json
 import logging
-import time
-from openai import OpenAI
-import textwrap
+import orjson
+import tiktoken
 
-# Define a constant for character limits to approximate token counts
-# A safe buffer for a 200k model is around 180k characters (at ~4 chars/token)
-MAX_CHARS_PER_CHUNK = 180000
+from .rate_limiter import AsyncRateLimiter
+from .response_cache import ResponseCache
 
-def _split_text_into_chunks(text: str, chunk_size: int = MAX_CHARS_PER_CHUNK) -> list[str]:
-    """Splits a long text into chunks of a specified size without breaking words."""
-    if len(text) <= chunk_size:
+# Token budget per chunk, counted with the tokenizer rather than approximated from characters.
+# This is the same budget the previous 180k-character limit aimed for (at ~4 chars/token).
+MAX_TOKENS_PER_CHUNK = 45000
+TOKENIZER_MODEL = "gpt-4o-mini"
+
+# Concurrency limits for the map step. The semaphore bounds chunks in flight;
+# the limiter (not the semaphore) is what keeps us inside the provider's tier.
+MAX_CONCURRENT_CHUNKS = 8
+MAX_REQUESTS_PER_MINUTE = 50
+MAX_TOKENS_PER_MINUTE = 450000
+# Completion allowance added to each request's prompt tokens when reserving TPM capacity
+EXPECTED_COMPLETION_TOKENS = 1000
+
+NARRATIVE_ERROR_MESSAGE = "Could not generate narrative summary due to an error."
+NO_INFORMATION_MESSAGE = "No information was found that matched the query."
+
+def _extraction_error(tasks: list) -> str:
+    return json.dumps({task: "Extraction Error" for task in tasks})
+
+def _narrative_error(tasks: list) -> str:
+    return NARRATIVE_ERROR_MESSAGE
+
+def _combined_error(tasks: dict) -> str:
+    return json.dumps({
+        "extracted": {task: "Extraction Error" for task in tasks["table_extraction"]},
+        "narrative": NARRATIVE_ERROR_MESSAGE
+    })
+
+def _cached(kind: str, error_result):
+    """
+    Wraps a specialist `(client, text, tasks, ...)` coroutine with the optional
+    ResponseCache passed as `cache=`. Error fallbacks are never written to the cache.
+    Only the exact tier is used: the embedder only reads a chunk's opening tokens, so a
+    semantic match could hand back another filing's extracted figures.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(client, text: str, tasks: list, *args, cache: ResponseCache = None, **kwargs):
+            if cache is None or not tasks:
+                return await func(client, text, tasks, *args, **kwargs)
+
+            namespace = ResponseCache.make_key(kind, client.model, tasks)
+            cached = await asyncio.to_thread(cache.get, namespace, text, semantic=False)
+            if cached is not None:
+                return cached
+
+            result = await func(client, text, tasks, *args, **kwargs)
+            if result != error_result(tasks):
+                await asyncio.to_thread(cache.set, namespace, text, result, semantic=False)
+            return result
+        return wrapper
+    return decorator
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model: str = TOKENIZER_MODEL):
+    """Loads the tiktoken encoding once per process."""
+    return tiktoken.encoding_for_model(model)
+
+def _count_tokens(text: str) -> int:
+    """Counts the tokens of a prompt, used to reserve token capacity with the rate limiter."""
+    return len(_get_encoding().encode(text, disallowed_special=()))
+
+def _split_text_into_chunks(text: str, chunk_tokens: int = MAX_TOKENS_PER_CHUNK) -> list[str]:
+    """Splits a long text into chunks of at most `chunk_tokens` tokens."""
+    # Every token covers at least one character, so short texts can skip tokenization
+    if len(text) <= chunk_tokens:
         return [text]
-    
-    # Use textwrap to split gracefully
-    return textwrap.wrap(text, width=chunk_size, break_long_words=True, replace_whitespace=False)
 
-def _extract_table_data(client: OpenAI, text: str, tasks: list) -> str:
+    enc = _get_encoding()
+    ids = enc.encode(text, disallowed_special=())
+    if len(ids) <= chunk_tokens:
+        return [text]
+    return [enc.decode(ids[i:i + chunk_tokens]) for i in range(0, len(ids), chunk_tokens)]
+
+@_cached("table_extraction", _extraction_error)
+async def _extract_table_data(client, text: str, tasks: list, limiter: AsyncRateLimiter = None) -> str:
     """
     Specialist function to extract structured data from text that may contain tables.
     """
@@ -49,7 +118,9 @@ You are a precision data extraction bot. Your task is to analyze the provided te
 }}
 """
     try:
-        response = client.chat.completions.create(
+        if limiter:
+            await limiter.acquire(_count_tokens(prompt) + EXPECTED_COMPLETION_TOKENS)
+        response = await client.achat.completions.create(
             model=client.model,
             messages=[
                 {"role": "system", "content": "You are a data extraction expert that only responds with JSON."},
@@ -59,11 +130,12 @@ You are a precision data extraction bot. Your task is to analyze the provided te
         )
         return response.choices[0].message.content
     except Exception as e:
-        logging.error(f"Error during table data extraction: {e}")
-        return json.dumps({task: "Extraction Error" for task in tasks})
+        logging.error("Error during table data extraction: %s", e)
+        return _extraction_error(tasks)
 
 
-def _summarize_narrative(client: OpenAI, text: str, tasks: list, filename: str) -> str:
+@_cached("narrative_summary", _narrative_error)
+async def _summarize_narrative(client, text: str, tasks: list, limiter: AsyncRateLimiter = None) -> str:
     """
     Specialist function to summarize narrative prose based on a set of tasks.
     """
@@ -73,8 +145,6 @@ def _summarize_narrative(client: OpenAI, text: str, tasks: list, filename: str)
     prompt = f"""
 You are a financial analyst. Your task is to summarize key points from a section of a financial document based on a list of objectives.
 
-**Document Section:** {filename}
-
 **Objectives for this Summary:**
 {json.dumps(tasks, indent=2)}
 
@@ -89,7 +159,9 @@ You are a financial analyst. Your task is to summarize key points from a section
 3. If the text does not contain information for an objective, state that it was not found.
 """
     try:
-        response = client.chat.completions.create(
+        if limiter:
+            await limiter.acquire(_count_tokens(prompt) + EXPECTED_COMPLETION_TOKENS)
+        response = await client.achat.completions.create(
             model=client.model,
             messages=[
                 {"role": "system", "content": "You are an expert financial analyst."},
@@ -98,55 +170,183 @@ You are a financial analyst. Your task is to summarize key points from a section
         )
         return response.choices[0].message.content
     except Exception as e:
-        logging.error(f"Error during narrative summarization: {e}")
-        return "Could not generate narrative summary due to an error."
+        logging.error("Error during narrative summarization: %s", e)
+        return NARRATIVE_ERROR_MESSAGE
+
+
+@_cached("extract_and_summarize", _combined_error)
+async def _extract_and_summarize(client, text: str, tasks: dict, limiter: AsyncRateLimiter = None) -> str:
+    """
+    Runs data extraction and narrative summarization in a single call, so a chunk's text
+    is only sent (and prefilled) once. `tasks` maps 'table_extraction' and
+    'narrative_summary' to their task lists. Returns the model's JSON object as a string.
+    """
+    prompt = f"""
+You are a financial analyst and precision data extraction bot. Your task is to analyze a section of a financial document, which may be a messy, text-only representation, and complete two jobs at once: extract specific data points and summarize key points for a list of objectives.
+
+**Data Points to Extract:**
+{json.dumps(tasks["table_extraction"], indent=2)}
+
+**Objectives for the Narrative Summary:**
+{json.dumps(tasks["narrative_summary"], indent=2)}
+
+**Text to Analyze:**
+---
+{text}
+---
+
+**Instructions:**
+1.  For each item in the "Data Points to Extract" list, find the corresponding value in the text. If a data point is not found, you MUST use the value "Not Found".
+2.  Create a concise, point-by-point summary that directly addresses the "Objectives for the Narrative Summary". Focus only on relevant information, and state when the text does not contain information for an objective.
+3.  Return a single JSON object with exactly two keys:
+    -   "extracted": an object whose keys are the descriptions from the extraction list and whose values are the data you found.
+    -   "narrative": the point-by-point summary as a single markdown string.
+4.  Do not add any commentary, explanation, or introductory text. Your entire output must be ONLY the JSON object.
+
+**Example Response:**
+{{
+  "extracted": {{
+    "Net Income for Q2 2025": "$7.4 billion",
+    "Allowance for credit losses at March 31, 2025": "Not Found"
+  }},
+  "narrative": "- Net interest income increased due to higher deposit balances.\n- Credit quality remained stable."
+}}
+"""
+    try:
+        if limiter:
+            await limiter.acquire(_count_tokens(prompt) + EXPECTED_COMPLETION_TOKENS)
+        response = await client.achat.completions.create(
+            model=client.model,
+            messages=[
+                {"role": "system", "content": "You are an expert financial analyst and data extraction expert that only responds with JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"}
+        )
+        content = response.choices[0].message.content
+        # Validate the shape up front so malformed output is treated as an error (and not cached)
+        parsed = orjson.loads(content)
+        if not isinstance(parsed, dict) or "extracted" not in parsed or "narrative" not in parsed:
+            raise ValueError("response is missing the 'extracted' or 'narrative' key")
+        return content
+    except Exception as e:
+        logging.error("Error during combined extraction and summarization: %s", e)
+        return _combined_error(tasks)
+
+
+def _format_combined_output(content: str) -> tuple[str, str]:
+    """Splits a combined JSON response back into the extracted-data JSON and the narrative text."""
+    parsed = orjson.loads(content)
+    narrative = parsed.get("narrative") or ""
+    if isinstance(narrative, list):
+        narrative = "\n".join(f"- {point}" for point in narrative)
+    extracted_json = orjson.dumps(parsed.get("extracted") or {}, option=orjson.OPT_INDENT_2).decode()
+    return extracted_json, str(narrative)
+
+
+async def _process_chunk(semaphore: asyncio.Semaphore, limiter: AsyncRateLimiter, client, chunk: str,
+                         table_tasks: list, narrative_tasks: list, chunk_log_name: str,
+                         cache: ResponseCache = None) -> str:
+    """
+    Gets structured data and a narrative summary for a single chunk and formats them.
+    When both kinds of task are present they are answered by one combined call;
+    otherwise only the relevant specialist runs. The prompts see only the chunk text, never
+    its filename, so one result can serve every document containing the same chunk; the
+    reduce step attributes results to their sources.
+    """
+    async with semaphore:
+        logging.info("      - Analyzing %s...", chunk_log_name)
+        table_results_json, narrative_summary = "", ""
+        if table_tasks and narrative_tasks:
+            tasks = {"table_extraction": table_tasks, "narrative_summary": narrative_tasks}
+            content = await _extract_and_summarize(client, chunk, tasks, limiter, cache=cache)
+            table_results_json, narrative_summary = _format_combined_output(content)
+        elif table_tasks:
+            table_results_json = await _extract_table_data(client, chunk, table_tasks, limiter, cache=cache)
+        elif narrative_tasks:
+            narrative_summary = await _summarize_narrative(client, chunk, narrative_tasks, limiter, cache=cache)
+
+    chunk_output = ""
+    if table_results_json:
+        chunk_output += f"Extracted Data:\n{table_results_json}\n\n"
+    if narrative_summary:
+        chunk_output += f"Narrative Summary:\n{narrative_summary}"
+    return chunk_output
+
+
+async def _aiter_documents(documents):
+    """Iterates a list of documents or an async stream of them (e.g. Neo4j rows as they arrive)."""
+    if hasattr(documents, "__aiter__"):
+        async for doc in documents:
+            yield doc
+    else:
+        for doc in documents:
+            yield doc
 
 
-def map_summarize_sections(client: OpenAI, documents: list, user_query: str, extraction_checklist: list):
+async def map_summarize_sections(client, documents, user_query: str, extraction_checklist: list,
+                                 max_concurrency: int = MAX_CONCURRENT_CHUNKS,
+                                 max_requests_per_minute: int = MAX_REQUESTS_PER_MINUTE,
+                                 max_tokens_per_minute: int = MAX_TOKENS_PER_MINUTE,
+                                 cache: ResponseCache = None):
     """
     Processes documents using a hybrid approach. It separates extraction tasks from
     summarization tasks and uses specialized functions for each. This is the "Map" step.
+    All chunks of all documents are processed concurrently through the client's async
+    interface, bounded by a semaphore and a limiter tracking both requests and tokens per minute.
+    `documents` may be a list or an async iterable; with a stream, each document's chunks are
+    submitted as soon as it arrives, and its text is not kept once the chunk tasks hold it.
+    If a ResponseCache is given, previously seen (chunk, tasks) pairs skip the LLM entirely.
     """
-    batch_summaries = []
-    logging.info(f"Mapping {len(documents)} document(s) with hybrid strategy...")
+    logging.info("Mapping documents with hybrid strategy...")
 
     # Separate the checklist into two types of tasks
     table_tasks = [item['task'] for item in extraction_checklist if item['type'] == 'table_extraction']
     narrative_tasks = [item['task'] for item in extraction_checklist if item['type'] == 'narrative_summary']
 
-    for i, doc in enumerate(documents, 1):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    limiter = AsyncRateLimiter(max_requests_per_minute, max_tokens_per_minute)
+
+    # Fan out every chunk of every document, keyed by (doc_idx, chunk_idx).
+    # Identical chunks (boilerplate repeated across filings) share a single task.
+    pending = {}
+    tasks_by_digest = {}
+    chunk_counts = []
+    filenames = []
+    total_chars = 0
+    async for doc in _aiter_documents(documents):
         filename = doc['filename']
         text = doc['text']
-        logging.info(f"  - Processing document: {filename} ({i}/{len(documents)})")
-
-        # Add a delay to prevent rate-limiting on the API between documents
-        time.sleep(1)
+        i = len(filenames)
+        logging.info("  - Processing document: %s (#%d)", filename, i + 1)
+        filenames.append(filename)
+        total_chars += len(text)
 
         chunks = _split_text_into_chunks(text)
         if len(chunks) > 1:
-            logging.warning(f"    - Document '{filename}' is large ({len(text)} chars). Processing in {len(chunks)} chunks.")
-
-        # Process each chunk with both specialists
-        all_chunk_results = []
-        for j, chunk in enumerate(chunks, 1):
-            chunk_log_name = f"{filename} (part {j}/{len(chunks)})"
-            logging.info(f"      - Analyzing chunk {j}/{len(chunks)}...")
-            
-            # Get structured data and narrative summary for the chunk
-            table_results_json = _extract_table_data(client, chunk, table_tasks)
-            
-            # Add a second delay between the two API calls for the same chunk
-            time.sleep(1) 
-            
-            narrative_summary = _summarize_narrative(client, chunk, narrative_tasks, chunk_log_name)
-            
-            chunk_output = ""
-            if table_results_json:
-                chunk_output += f"Extracted Data:\n{table_results_json}\n\n"
-            if narrative_summary:
-                chunk_output += f"Narrative Summary:\n{narrative_summary}"
-
-            all_chunk_results.append(chunk_output)
+            logging.warning("    - Document '%s' is large (%d chars). Processing in %d chunks.", filename, len(text), len(chunks))
+        chunk_counts.append(len(chunks))
+
+        for j, chunk in enumerate(chunks):
+            digest = hashlib.blake2b(chunk.encode("utf-8"), digest_size=16).digest()
+            if digest not in tasks_by_digest:
+                chunk_log_name = f"{filename} (part {j + 1}/{len(chunks)})"
+                tasks_by_digest[digest] = asyncio.create_task(
+                    _process_chunk(semaphore, limiter, client, chunk, table_tasks, narrative_tasks, chunk_log_name, cache)
+                )
+            pending[(i, j)] = tasks_by_digest[digest]
+
+    logging.info("Submitted %d document(s) (%d chars) for mapping.", len(filenames), total_chars)
+    if len(tasks_by_digest) < len(pending):
+        logging.info("Deduplicated %d repeated chunk(s).", len(pending) - len(tasks_by_digest))
+
+    # gather awaits a task passed more than once only once, fanning its result back out
+    chunk_results = dict(zip(pending.keys(), await asyncio.gather(*pending.values())))
+
+    # Reassemble the chunk outputs in their original per-document order
+    batch_summaries = []
+    for i, filename in enumerate(filenames):
+        all_chunk_results = [chunk_results[(i, j)] for j in range(chunk_counts[i])]
 
         # Combine results from all chunks for the document
         final_doc_summary = "\n\n---\n\n".join(all_chunk_results)
@@ -160,23 +360,39 @@ def map_summarize_sections(client: OpenAI, documents: list, user_query: str, ext
     return batch_summaries
 
 
-def reduce_and_synthesize_answer(llm_client: OpenAI, query: str, results: list, analysis_goal: str) -> str:
+async def stream_synthesized_answer(llm_client, query: str, results: list, analysis_goal: str,
+                                    feedback: str = None):
     """
-    Synthesizes a final, comprehensive answer from a list of structured and narrative results.
-    This is the "Reduce" step.
+    Streaming form of the "Reduce" step: yields the final answer as text deltas while the
+    LLM produces them, followed by the sources section. `feedback` is the critic's verdict
+    on a previous draft, which the new draft must address.
     """
     logging.info("Synthesizing final answer from hybrid results...")
     
     if not results:
-        return "No information was found that matched the query."
+        yield NO_INFORMATION_MESSAGE
+        return
     
-    context_parts = []
+    # Write each source straight into one buffer instead of formatting a copy of every text
+    context_buffer = io.StringIO()
     for i, res in enumerate(results):
-        text = res.get('text', '')
         filename = res.get('filename')
-        context_parts.append(f"--- START: Source from '{filename}' ---\n{text}\n--- END: Source from '{filename}' ---")
-    
-    context = "\n\n".join(context_parts)
+        if i:
+            context_buffer.write("\n\n")
+        context_buffer.write(f"--- START: Source from '{filename}' ---\n")
+        context_buffer.write(res.get('text', ''))
+        context_buffer.write(f"\n--- END: Source from '{filename}' ---")
+
+    context = context_buffer.getvalue()
+    context_buffer.close()
+
+    feedback_section = ""
+    if feedback:
+        feedback_section = f"""
+**Reviewer Feedback on a Previous Draft:**
+{feedback}
+Your report MUST correct the problems described in this feedback.
+"""
 
     prompt = f"""
 You are RiskGPT, a world-class financial analyst. Your task is to write a final, comprehensive report that directly addresses the user's query and original analysis goal, using only the structured data and narrative summaries provided.
@@ -191,7 +407,7 @@ You are RiskGPT, a world-class financial analyst. Your task is to write a final,
 ---
 {context}
 ---
-
+{feedback_section}
 **Your Task:**
 1.  **Synthesize, Do Not Summarize:** Read through all the provided context. Your primary job is to weave the extracted JSON data and the narrative summaries into a single, cohesive, and easy-to-read report that fulfills the `analysis_goal`.
 2.  **Prioritize Hard Data:** When presenting figures (like Net Income, Revenue, etc.), use the specific values from the `Extracted Data` JSON objects. These are the ground truth.
@@ -204,21 +420,32 @@ You are RiskGPT, a world-class financial analyst. Your task is to write a final,
 ---
 Begin your response now.
 """
-    response = llm_client.chat.completions.create(
+    response_stream = await llm_client.achat.completions.create(
         model=llm_client.model,
         messages=[
             {"role": "system", "content": "You are a helpful assistant."},
             {"role": "user", "content": prompt}
-        ]
+        ],
+        stream=True
     )
-    llm_answer = response.choices[0].message.content
 
-    source_filenames = sorted(list(set([r.get('filename') for r in results if r.get('filename')])))
-    sources_section = "\n\nSources:\n"
-    if source_filenames:
-        sources_section += "\n".join(f"- {name}" for name in source_filenames)
-    else:
-        sources_section += "- None"
-        
-    final_answer = llm_answer + sources_section
-    return final_answer
\ No newline at end of file
+    # Pass the (long) report on incrementally instead of waiting for the full body
+    async for chunk in response_stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+    source_filenames = sorted({r.get('filename') for r in results if r.get('filename')})
+    sources = "\n".join(f"- {name}" for name in source_filenames) if source_filenames else "- None"
+    yield f"\n\nSources:\n{sources}"
+
+
+async def reduce_and_synthesize_answer(llm_client, query: str, results: list, analysis_goal: str,
+                                       feedback: str = None) -> str:
+    """
+    Synthesizes a final, comprehensive answer from a list of structured and narrative results.
+    This is the "Reduce" step; `feedback` from the critic turns it into a redraft.
+    """
+    buffer = io.StringIO()
+    async for delta in stream_synthesized_answer(llm_client, query, results, analysis_goal, feedback=feedback):
+        buffer.write(delta)
+    return buffer.getvalue()
\ No newline at end of file
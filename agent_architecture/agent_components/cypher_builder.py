@@ -1,35 +1,31 @@
 import logging
-import sys
-import importlib.util
-from pathlib import Path
+from functools import lru_cache
+from string import Template
+import torch
 from sentence_transformers import SentenceTransformer
 
+from .vector_db import VectorDB
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Handle numbered directory import
-def import_from_file(file_path, class_name):
-    """Helper function to import from a specific file"""
-    spec = importlib.util.spec_from_file_location("temp_module", file_path)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    return getattr(module, class_name)
-
-# Import VectorDB from the numbered directory
-current_dir = Path(__file__).parent
-vector_db_path = current_dir / "vector_db.py"
-try:
-    VectorDB = import_from_file(vector_db_path, "VectorDB")
-except Exception as e:
-    print(f"Warning: Could not import VectorDB: {e}")
-    # Define a dummy VectorDB class as fallback
-    class VectorDB:
-        def __init__(self):
-            pass
-        def load_index(self):
-            pass
-        def search(self, embedding, k=10):
-            return [], []
+# Maximum number of concepts whose FAISS results are kept per builder
+SEARCH_CACHE_SIZE = 1024
+
+# Query skeletons, parsed once at import; builders only substitute the clause strings.
+# Values are substituted verbatim, so Cypher parameters like $companies inside the
+# clauses are left untouched.
+QUERY_TEMPLATE = Template("$match_clause $where_clause $return_clause")
+PATH_MATCH_CLAUSE = "MATCH (c:Company)-[:HAS_YEAR]->(y:Year)-[:HAS_QUARTER]->(q:Quarter)-[:HAS_DOC]->(d:Document)-[:HAS_SECTION]->(s:Section)"
+SECTION_RETURN_CLAUSE = "RETURN s.text AS text, s.filename AS filename"
+COMPREHENSIVE_QUERY = """
+MATCH (c:Company)-[:HAS_YEAR]->(y:Year)-[:HAS_QUARTER]->(q:Quarter)-[:HAS_DOC]->(d:Document)-[:HAS_SECTION]->(s:Section)
+WHERE c.name IN $companies
+WITH s, d, y, q
+ORDER BY y.value DESC, q.label DESC
+LIMIT 10
+RETURN s.text AS text, s.filename AS filename
+""".strip()
 
 class CypherQueryBuilder:
     """
@@ -45,10 +41,23 @@ class CypherQueryBuilder:
             vector_db: An instance of the VectorDB class for semantic search.
         """
         self.model = model
+        self.model.eval()
         self.vector_db = vector_db
+        # FAISS results per concept; the concept text fully determines its embedding
+        self._search_cache = {}
         logging.info("CypherQueryBuilder initialized with FAISS vector database.")
 
-    def build_query(self, plan: dict) -> str:
+    def _encode(self, texts: list[str]):
+        """Embeds a batch of texts in a single forward pass, without autograd bookkeeping."""
+        with torch.inference_mode():
+            return self.model.encode(texts, batch_size=max(len(texts), 1), convert_to_numpy=True, normalize_embeddings=True)
+
+    def build_query(self, plan: dict) -> tuple[str, dict]:
+        """
+        Builds a parameterized Cypher query for a plan and returns (query, params).
+        Filter values are always passed as driver parameters so Neo4j can reuse
+        the cached execution plan for each query shape.
+        """
         search_type = plan.get("search_type")
         if search_type == "Hybrid":
             return self._build_hybrid_query(plan)
@@ -57,7 +66,33 @@ class CypherQueryBuilder:
         else: # Default to Direct
             return self._build_direct_query(plan)
 
-    def _build_comprehensive_query(self, plan: dict) -> str:
+    def build_queries(self, plans: list[dict]) -> list[tuple[str, dict]]:
+        """
+        Builds a (query, params) pair for each plan. The concepts of all Hybrid plans are
+        embedded together and searched with a single batched FAISS call instead of one
+        encode/search round per plan.
+        """
+        hybrid_positions = [
+            i for i, plan in enumerate(plans)
+            if plan.get("search_type") == "Hybrid" and plan.get("concept") and plan["concept"] not in self._search_cache
+        ]
+        search_results = {}
+        if hybrid_positions:
+            concepts = [plans[i]["concept"] for i in hybrid_positions]
+            logging.info("Embedding and searching %d hybrid concept(s) in a single batch.", len(concepts))
+            all_distances, all_section_ids = self.vector_db.search_batch(self._encode(concepts), k=20)
+            if all_section_ids:
+                search_results = dict(zip(hybrid_positions, zip(all_distances, all_section_ids)))
+
+        queries = []
+        for i, plan in enumerate(plans):
+            if i in search_results:
+                queries.append(self._build_hybrid_query(plan, search_results=search_results[i]))
+            else:
+                queries.append(self.build_query(plan))
+        return queries
+
+    def _build_comprehensive_query(self, plan: dict) -> tuple[str, dict]:
         """
         Builds a query to retrieve the 10 latest document sections for a given company.
         """
@@ -65,103 +100,107 @@ class CypherQueryBuilder:
         companies = plan.get('companies', [])
         if not companies:
             logging.error("Comprehensive search requires a company.")
-            return ""
-
-        companies_str = "[" + ", ".join(f"'{c}'" for c in companies) + "]"
-        query = f"""
-        MATCH (c:Company)-[:HAS_YEAR]->(y:Year)-[:HAS_QUARTER]->(q:Quarter)-[:HAS_DOC]->(d:Document)-[:HAS_SECTION]->(s:Section)
-        WHERE c.name IN {companies_str}
-        WITH s, d, y, q
-        ORDER BY y.value DESC, q.label DESC
-        LIMIT 10
-        RETURN s.text AS text, s.filename AS filename
-        """
-        
-        return query.strip()
+            return "", {}
+
+        return COMPREHENSIVE_QUERY, {"companies": list(companies)}
 
-    def _build_direct_query(self, plan: dict) -> str:
+    def _build_direct_query(self, plan: dict) -> tuple[str, dict]:
         logging.info("[Direct Search] Building direct Cypher query.")
-        
-        match_clause = "MATCH (c:Company)-[:HAS_YEAR]->(y:Year)-[:HAS_QUARTER]->(q:Quarter)-[:HAS_DOC]->(d:Document)-[:HAS_SECTION]->(s:Section)"
-        
+        params = {
+            "companies": list(plan.get('companies', [])),
+            "years": list(plan.get('years', [])),
+            "quarters": list(plan.get('quarters', [])),
+            "sections": list(plan.get('sections', []))
+        }
+        query = self._direct_cached(
+            bool(params["companies"]), bool(params["years"]), bool(params["quarters"]), bool(params["sections"])
+        )
+        return query, {key: value for key, value in params.items() if value}
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _direct_cached(has_companies: bool, has_years: bool, has_quarters: bool, has_sections: bool) -> str:
+        """Pure string assembly for the direct query; there is one query per filter shape."""
         where_parts = []
-        
-        companies = plan.get('companies', [])
-        years = plan.get('years', [])
-        quarters = plan.get('quarters', [])
-        sections = plan.get('sections', [])
 
-        if companies:
-            companies_str = "[" + ", ".join(f"'{c}'" for c in companies) + "]"
-            where_parts.append(f"c.name IN {companies_str}")
-        
-        if years:
-            years_str = "[" + ", ".join(str(y) for y in years) + "]"
-            where_parts.append(f"y.value IN {years_str}")
-
-        if quarters:
-            quarters_str = "[" + ", ".join(f"'{q}'" for q in quarters) + "]"
-            where_parts.append(f"q.label IN {quarters_str}")
-
-        if sections:
-            sections_str = "[" + ", ".join(str(s) for s in sections) + "]"
-            where_parts.append(f"id(s) IN {sections_str}")
+        if has_companies:
+            where_parts.append("c.name IN $companies")
+        if has_years:
+            where_parts.append("y.value IN $years")
+        if has_quarters:
+            where_parts.append("q.label IN $quarters")
+        if has_sections:
+            where_parts.append("id(s) IN $sections")
         
         where_clause = ""
         if where_parts:
             where_clause = "WHERE " + " AND ".join(where_parts)
-        
-        return_clause = "RETURN s.text AS text, s.filename AS filename"
-        
-        final_query = f"{match_clause} {where_clause} {return_clause}"
-        return final_query
 
-    def _build_hybrid_query(self, plan: dict) -> str:
+        return QUERY_TEMPLATE.substitute(
+            match_clause=PATH_MATCH_CLAUSE, where_clause=where_clause, return_clause=SECTION_RETURN_CLAUSE
+        )
+
+    def _build_hybrid_query(self, plan: dict, search_results: tuple = None) -> tuple[str, dict]:
         logging.info("[Hybrid Search] Building hybrid query using FAISS.")
         
         semantic_query = plan.get("concept")
         if not semantic_query:
             logging.error("Hybrid search failed: No 'concept' found in plan.")
-            return ""
-
-        logging.info(f"Performing FAISS search for: '{semantic_query}'")
-        query_embedding = self.model.encode(semantic_query)
-        distances, section_ids = self.vector_db.search(query_embedding, k=20) 
+            return "", {}
+
+        if search_results is None:
+            search_results = self._search_cache.get(semantic_query)
+        if search_results is None:
+            logging.info("Performing FAISS search for: '%s'", semantic_query)
+            query_embedding = self._encode([semantic_query])[0]
+            search_results = self.vector_db.search(query_embedding, k=20)
+        distances, section_ids = search_results
+        # Empty results (a missing index or no hits) are not cached, so a later search can succeed
+        if section_ids and semantic_query not in self._search_cache:
+            if len(self._search_cache) >= SEARCH_CACHE_SIZE:
+                self._search_cache.pop(next(iter(self._search_cache)))
+            self._search_cache[semantic_query] = search_results
 
         if not section_ids:
             logging.warning("FAISS search returned no results.")
-            return ""
+            return "", {}
 
-        logging.info(f"FAISS search found {len(section_ids)} relevant sections.")
+        logging.info("FAISS search found %d relevant sections.", len(section_ids))
         
         # Build the Cypher query using the section IDs from FAISS
-        section_ids_str = "[" + ", ".join(f"'{sid}'" for sid in section_ids) + "]"
-        
-        match_clause = "MATCH (s:Section)"
-        where_parts = [f"s.id IN {section_ids_str}"]
-        
-        companies = plan.get('companies', [])
-        years = plan.get('years', [])
-        quarters = plan.get('quarters', [])
-
-        # Add filters by traversing back through the graph
-        if companies:
-            companies_str = "[" + ", ".join(f"'{c}'" for c in companies) + "]"
-            where_parts.append(f"EXISTS {{ MATCH (s)<-[:HAS_SECTION]-(d:Document)<-[:HAS_DOC]-(q:Quarter)<-[:HAS_QUARTER]-(y:Year)<-[:HAS_YEAR]-(c:Company) WHERE c.name IN {companies_str} }}")
-        
-        if years:
-            years_str = "[" + ", ".join(str(y) for y in years) + "]"
-            where_parts.append(f"EXISTS {{ MATCH (s)<-[:HAS_SECTION]-(d:Document)<-[:HAS_DOC]-(q:Quarter)<-[:HAS_QUARTER]-(y:Year) WHERE y.value IN {years_str} }}")
-        
-        if quarters:
-            quarters_str = "[" + ", ".join(f"'{q}'" for q in quarters) + "]"
-            where_parts.append(f"EXISTS {{ MATCH (s)<-[:HAS_SECTION]-(d:Document)<-[:HAS_DOC]-(q:Quarter) WHERE q.label IN {quarters_str} }}")
+        params = {
+            "section_ids": list(section_ids),
+            "companies": list(plan.get('companies', [])),
+            "years": list(plan.get('years', [])),
+            "quarters": list(plan.get('quarters', []))
+        }
+        query = self._hybrid_cached(bool(params["companies"]), bool(params["years"]), bool(params["quarters"]))
+        return query, {key: value for key, value in params.items() if value}
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _hybrid_cached(has_companies: bool, has_years: bool, has_quarters: bool) -> str:
+        """Pure string assembly for the hybrid query; there is one query per filter shape."""
+        where_parts = ["s.id IN $section_ids"]
+
+        if has_companies or has_years or has_quarters:
+            # Walk the Company->...->Section chain once and filter on it, rather than
+            # re-traversing it in a separate EXISTS subquery per filter
+            match_clause = PATH_MATCH_CLAUSE
+            if has_companies:
+                where_parts.append("c.name IN $companies")
+            if has_years:
+                where_parts.append("y.value IN $years")
+            if has_quarters:
+                where_parts.append("q.label IN $quarters")
+        else:
+            match_clause = "MATCH (s:Section)"
 
         where_clause = "WHERE " + " AND ".join(where_parts)
-        return_clause = "RETURN s.text AS text, s.filename AS filename"
 
-        final_query = f"{match_clause} {where_clause} {return_clause}"
-        return final_query
+        return QUERY_TEMPLATE.substitute(
+            match_clause=match_clause, where_clause=where_clause, return_clause=SECTION_RETURN_CLAUSE
+        )
 
 
 # Legacy functions for backward compatibility
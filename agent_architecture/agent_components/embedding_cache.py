@@ -0,0 +1,87 @@
+"""
+Embedding Cache
+An in-memory LRU cache in front of a SentenceTransformer-style encoder. The same query
+text is embedded several times per run (the planner's semantic cache lookups, the
+map-step cache, hybrid search), so each distinct text is encoded once and reused.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_EMBEDDING_CACHE_SIZE = 4096
+
+# encode() options that change how a batch is run but not the embeddings it returns
+_BATCHING_OPTIONS = frozenset({"batch_size", "show_progress_bar"})
+
+
+class CachedEmbedder:
+    """
+    Wraps a model exposing `encode(sentences, **kwargs)` and can be used in its place.
+    Entries are keyed by SHA-256 of (model name, encode options, text); other attributes
+    (e.g. `eval()`) are forwarded to the wrapped model. Safe to call from worker threads.
+    """
+    def __init__(self, model, model_name: str, maxsize: int = DEFAULT_EMBEDDING_CACHE_SIZE):
+        self.model = model
+        self.model_name = model_name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _key(self, text: str, options: tuple) -> bytes:
+        payload = "\0".join((self.model_name, repr(options), text))
+        return hashlib.sha256(payload.encode("utf-8")).digest()
+
+    def encode(self, sentences, **kwargs):
+        """
+        Same contract as SentenceTransformer.encode for numpy output: a 2-D array for a
+        list of texts, a 1-D array for a single string. Only cache misses are sent to the
+        model, in one batch. Tensor output is not cached and goes straight to the model.
+        """
+        if kwargs.get("convert_to_tensor") or kwargs.get("convert_to_numpy") is False:
+            return self.model.encode(sentences, **kwargs)
+
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        options = tuple(sorted((k, v) for k, v in kwargs.items() if k not in _BATCHING_OPTIONS))
+        keys = [self._key(text, options) for text in texts]
+
+        embeddings = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    embeddings[i] = cached
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        if missing:
+            encoded = self.model.encode([texts[i] for i in missing], **kwargs)
+            with self._lock:
+                for i, embedding in zip(missing, encoded):
+                    # Copy the row so the cache doesn't keep the whole batch array alive
+                    embeddings[i] = np.array(embedding)
+                    self._cache[keys[i]] = embeddings[i]
+                    self._cache.move_to_end(keys[i])
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if single:
+            return embeddings[0].copy()
+        if not embeddings:
+            return self.model.encode([], **kwargs)
+        return np.stack(embeddings)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
@@ -11,20 +11,236 @@ Key improvements:
 import json
 import logging
 import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple, Union
 
+from .response_cache import ResponseCache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Values used when validating LLM output
+_QUARTER_LABELS = frozenset({"Q1", "Q2", "Q3", "Q4"})
+_LIST_STRIP_TABLE = str.maketrans('', '', "[]\"'")
+
+# Columns returned by the focused sections query, in RETURN order
+_SECTION_COLUMNS = ("company", "section_id", "section_name", "doc_type", "year", "quarter")
+
+# The most common query shape. It is always a content query about one company, optionally
+# narrowed to one or two years, so classification and entity extraction can be skipped.
+_BUSINESS_SUMMARY_RE = re.compile(
+    r"^\s*(?P<ticker>[A-Za-z]{2,5})\s+business\s+summary\s+"
+    r"(?:of\s+(?P<y1>\d{4})(?:\s+vs\.?\s+(?P<y2>\d{4}))?|across\s+all\s+available\s+years)\b",
+    re.IGNORECASE
+)
+
+# Phrases suggesting the query may refer to more companies than the tickers it spells out
+_MULTI_COMPANY_HINTS = ("compare", "comparison", "versus", " vs", "against", "peer", "companies", "banks", " and ", "&")
+# Capitalized words, e.g. "Wells Fargo" or "Zions"; outside the query's first word they may
+# name a company, which only the LLM can resolve
+_CAPITALIZED_WORD_RE = re.compile(r"\b[A-Z][a-z]+\b")
+
+
+@lru_cache(maxsize=8)
+def _ticker_token_pattern(companies: Tuple[str, ...]):
+    """
+    Word-boundary regex matching any known ticker written in capitals, longest first.
+    Deliberately case-sensitive rather than IGNORECASE: tickers such as KEY, PB and RF
+    are also English words ("key risks"), so only the uppercase token counts as a ticker.
+    """
+    alternation = '|'.join(map(re.escape, sorted({c.upper() for c in companies}, key=len, reverse=True)))
+    return re.compile(r'\b(' + alternation + r')\b')
+
+
+def _enum_array(values: list) -> dict:
+    """JSON schema for a list whose items must be one of `values` (any string when empty)."""
+    values = list(values)
+    items = {"type": "integer" if values and all(isinstance(v, int) for v in values) else "string"}
+    if values:
+        items["enum"] = values
+    return {"type": "array", "items": items}
+
+
+def _json_schema_format(name: str, schema: dict) -> dict:
+    """Structured-output response_format, so the reply always parses against `schema`."""
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+
+
+# Cosine similarity above which a cached extraction guide is reused for a new query
+# that sees the same set of candidate sections.
+PLAN_CACHE_SIMILARITY_THRESHOLD = 0.92
+
+# Single-company extraction guides are also stored as templates: the query with its
+# ticker replaced by COMPANY_PLACEHOLDER, and the chosen sections by (doc type, year,
+# quarter, name) rather than id. A structurally similar query about another company
+# reuses the template when every templated section exists for that company.
+COMPANY_PLACEHOLDER = "<COMPANY>"
+PLAN_TEMPLATE_SIMILARITY_THRESHOLD = 0.90
+
+# Companies whose section inventory is kept on the planner between queries (LRU)
+SECTION_CACHE_SIZE = 64
+
+# Static system prompt for the extraction guide call. Kept free of per-request data so
+# providers can reuse the cached prefix across calls.
+EXTRACTION_GUIDE_SYSTEM_PROMPT = """You are a financial analyst planning how to answer a query about SEC filings from the document sections available in the database.
+
+The user message gives the query and the available sections, one per line, as: id|company|doc|section.
+
+Return a JSON object with three keys:
+1.  `analysis_goal`: One sentence describing what the final report should accomplish. This is the main instruction for the final answer synthesis.
+2.  `sections_to_retrieve`: The `section_id` numbers from the available sections that are necessary to achieve the `analysis_goal`. Be selective.
+3.  `extraction_checklist`: A list of objects with two keys:
+    - `task`: The specific data point or summary to extract.
+    - `type`: **'table_extraction'** for precise data points likely found in financial tables (e.g., Net Income, Revenue, loan amounts), or **'narrative_summary'** for prose or qualitative information (e.g., "key drivers for performance," "risk factors").
+
+You MUST provide your response as a single, valid JSON object with these three keys, and nothing else."""
+
+# Few-shot example appended to the system prompt only when a response failed validation
+EXTRACTION_GUIDE_EXAMPLE = """
+
+**Example Output:**
+{
+  "analysis_goal": "A comparative summary of the financial performance and risk profiles of BAC and JPM for Q2 2025.",
+  "sections_to_retrieve": [5348, 5353, 3781, 3784],
+  "extraction_checklist": [
+    {
+      "task": "Extract the Net Income, Revenue, and EPS for each company for Q2 2025.",
+      "type": "table_extraction"
+    },
+    {
+      "task": "Summarize the key drivers for revenue and expense changes and any forward-looking guidance.",
+      "type": "narrative_summary"
+    },
+    {
+      "task": "Summarize the top 3 disclosed risks for each company for the quarter.",
+      "type": "narrative_summary"
+    }
+  ]
+}"""
+
+
+# The remaining planner prompts follow the same rule: static instructions in the system
+# prompt, the query and per-request data in the user message.
+COMPANY_EXTRACTION_SYSTEM_PROMPT = """You are an expert entity extractor. Your task is to identify which company from the provided list is mentioned in the user's query. The user may use full names, abbreviations, or tickers.
+
+**Instructions:**
+1. Read the user query carefully.
+2. Compare the company mentioned in the query against the "List of Available Companies".
+3. Identify the official company ticker from the list that corresponds to the company in the query. For example, if the query says "JP Morgan", and the list contains "JPM", you must identify "JPM".
+4. If no company from the list is mentioned, return an empty list.
+5. If the query asks for "all companies" or similar, return the entire list of available companies.
+
+You MUST provide your response as a single, valid JSON object with a single key "companies", and nothing else.
+**Output Format:**
+{
+  "companies": ["ticker_1", "ticker_2", ...]
+}"""
+
+CONTEXT_EXTRACTION_SYSTEM_PROMPT = """You are an expert entity extractor. Your job is to independently identify the year, quarter, and document type from a user's query for each company, based on the data available for that company.
+
+**Instructions:**
+1.  **Year Extraction:** Look for a 4-digit year in the query. It must be one of the company's available "years". If not found, return an empty list for `years`. You can also extract a range of years.
+2.  **Quarter Extraction:** Look for a quarter mention (e.g., "Q1", "q2", "3rd quarter"). Extract only the quarter label (e.g., "Q1", "Q2", "Q3", "Q4"). If not found, return an empty list for `quarters`.
+3.  **Document Type Extraction:** Look for a document type mention (e.g., "10-K", "10-Q", "annual report"). It must be one of the company's available "document_types".
+    -   "annual report" or "annual filing" maps to "10-K".
+    -   "quarterly report" or "quarterly filing" maps to "10-Q".
+4.  Apply the same query to every company in the "Available Data per Company", and include every company ticker as a key in your response.
+
+**CRITICAL RULE:** The decision for each entity MUST be independent. Specifically, **you must NOT infer a document type** just because a quarter is mentioned. If the query does not explicitly state a document type like '10-K' or 'annual report', the `doc_types` field MUST be an empty list `[]`.
+
+You MUST provide your response as a single, valid JSON object keyed by company ticker, and nothing else.
+**Output Format:**
+{
+  "TICKER": {
+    "years": [YYYY],
+    "quarters": ["Q#"],
+    "doc_types": ["doc_type"]
+  }
+}"""
+
+METADATA_CLASSIFICATION_SYSTEM_PROMPT = """You are a query classifier and builder for a financial graph database.
+Your task is to determine if a user's query is a "metadata query" or a "content query".
+
+- **Metadata Query:** Asks for information ABOUT the dataset structure. It does NOT ask for information from inside a document.
+  Examples: "What companies are in the dataset?", "Which years are available for ZION?", "List the documents for BAC in Q1 2023".
+- **Content Query:** Asks for information FROM WITHIN a document, such as a summary, a specific section, or a report.
+  Examples: "What were the risk factors for JPM in 2022?", "Show me the MD&A for PNC's latest 10-K", "Give me a summary of BAC in Q1 2025", "Create a detailed summary report for all sections of ZION's 2023 10-K".
+
+**Instructions:**
+1.  Analyze the user's query.
+2.  If it is a **Metadata Query**:
+    a. Set `query_type` to "metadata".
+    b. Construct the appropriate Cypher query to answer it.
+    c. Set `response_format` to "list_of_strings".
+    d. Provide a brief `human_readable_answer`.
+3.  If it is a **Content Query** (including requests for summaries, reports, or specific sections):
+    a. Set `query_type` to "content".
+    b. Leave `cypher_query`, `response_format`, and `human_readable_answer` as `null`.
+
+**Available Schema:**
+- Companies are `(:Company {name: "TICKER"})`
+- Years are `(:Year {value: YYYY})`
+- Quarters are `(:Quarter {label: "Q#"})`
+- Documents are `(:Document {document_type: "10-K", filing_date: "YYYY-MM-DD"})`
+- Relationships are `(Company)-[:HAS_YEAR]->(Year)-[:HAS_QUARTER]->(Quarter)-[:HAS_DOC]->(Document)`
+
+You MUST provide your response as a single, valid JSON object, and nothing else.
+
+**Example 1: Metadata Query**
+- User Query: "what are the companies in the dataset?"
+- JSON Output:
+{
+  "query_type": "metadata",
+  "cypher_query": "MATCH (n:Company) RETURN DISTINCT n.name AS value ORDER BY value",
+  "response_format": "list_of_strings",
+  "human_readable_answer": "Here are the companies in the dataset:"
+}
+
+**Example 2: Content Query**
+- User Query: "what were the risks for zion in 2023"
+- JSON Output:
+{
+  "query_type": "content",
+  "cypher_query": null,
+  "response_format": null,
+  "human_readable_answer": null
+}
+
+**Example 3: Content Query (summary)**
+- User Query: "BAC 2025 q1 all sections, create a detailed summary report?"
+- JSON Output:
+{
+  "query_type": "content",
+  "cypher_query": null,
+  "response_format": null,
+  "human_readable_answer": null
+}"""
+
+
 class ImprovedQueryPlanner:
     """
     Enhanced query planner that generates a dynamic, grounded, multi-step extraction
     plan instead of just a simple query.
     """
     
-    def __init__(self, llm_client, neo4j_executor):
+    def __init__(self, llm_client, neo4j_executor, cache: Optional[ResponseCache] = None):
+        """
+        Args:
+            cache: Optional ResponseCache for planner LLM responses. Classification and
+                company extraction are reused on an exact query match; extraction guides
+                are also reused for semantically similar queries over the same sections.
+        """
         self.llm_client = llm_client
         self.neo4j_executor = neo4j_executor
+        self.cache = cache
+        # company -> (timestamp, tuple of its section rows). Entries expire with the executor's
+        # metadata TTL and are flushed with its metadata cache, since section ids change on
+        # re-ingestion.
+        self._section_cache: "OrderedDict[str, Tuple[float, Tuple[dict, ...]]]" = OrderedDict()
+        neo4j_executor.add_invalidation_callback(self._section_cache.clear)
         
     def create_plan(self, query: str) -> Optional[Dict]:
         """
@@ -36,37 +252,72 @@ class ImprovedQueryPlanner:
         """
         logging.info(f"🎯 Creating a dynamic extraction plan for query: '{query}'")
 
-        # Step 1: Preliminary check for a simple metadata query
-        metadata_plan = self._llm_classify_and_build_metadata_query(query)
-        if metadata_plan and metadata_plan.get("query_type") == "metadata":
-            logging.info("✅ This is a metadata query. Returning a simple metadata plan.")
-            # We wrap it in our new structure for consistency
-            return {
-                "plan_type": "metadata",
-                "analysis_goal": metadata_plan.get("human_readable_answer", "Execute metadata query."),
-                "cypher_query": metadata_plan.get("cypher_query"),
-                "sections_to_retrieve": [],
-                "extraction_checklist": []
-            }
+        all_companies = self.neo4j_executor.get_unique_values_for_property('Company', 'name')
+        # Queries matching a known template already tell us their type, company and years
+        template = self._match_query_template(query, all_companies)
+        if template:
+            ticker, years = template
+            logging.info(f"Query matches the business summary template for {ticker}; "
+                         "skipping classification and entity extraction.")
+            return self._create_content_plan(query, [ticker], template_years=years)
+
+        # Step 1: Preliminary check for a simple metadata query. Company extraction doesn't
+        # depend on the classification, so both LLM calls run concurrently; the company
+        # result is simply discarded for metadata queries.
+        ticker = self._match_single_ticker(query, all_companies)
+        pool = ThreadPoolExecutor(max_workers=2)
+        try:
+            metadata_future = pool.submit(self._llm_classify_and_build_metadata_query, query)
+            if ticker:
+                # A single exact ticker needs no LLM call to resolve
+                logging.info(f"Matched ticker {ticker} directly; skipping LLM company extraction.")
+                companies_future = None
+            else:
+                companies_future = pool.submit(self._llm_extract_company, query, all_companies)
+            metadata_plan = metadata_future.result()
+            if metadata_plan and metadata_plan.get("query_type") == "metadata":
+                logging.info("✅ This is a metadata query. Returning a simple metadata plan.")
+                # We wrap it in our new structure for consistency
+                return {
+                    "plan_type": "metadata",
+                    "analysis_goal": metadata_plan.get("human_readable_answer", "Execute metadata query."),
+                    "cypher_query": metadata_plan.get("cypher_query"),
+                    "sections_to_retrieve": [],
+                    "extraction_checklist": []
+                }
+            found_companies = [ticker] if ticker else companies_future.result()
+        finally:
+            # Don't block a metadata answer on the (unused) company extraction call
+            pool.shutdown(wait=False)
 
         # Step 2: For content queries, gather all available context from the database
         logging.info("Query is content-focused. Proceeding to gather all available documents.")
-        all_companies = self.neo4j_executor.get_unique_values_for_property('Company', 'name')
-        found_companies = self._llm_extract_company(query, all_companies)
         
         if not found_companies:
             logging.warning("No companies were identified in the query. Cannot create a plan.")
             return None
+        return self._create_content_plan(query, found_companies)
+
+    def _create_content_plan(self, query: str, found_companies: List[str],
+                             template_years: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Steps 2 and 3 of create_plan: pre-filters the companies' sections and generates the
+        extraction guide. `template_years` comes from a query template match and replaces
+        the LLM entity extraction for the (single) company.
+        """
+        # One traversal fetches every section of the found companies; the year/quarter/doc
+        # type inventory used to ground entity extraction is derived from the same rows, and
+        # the extraction for every company is fused into a single LLM call.
+        company_sections = self._get_company_sections(found_companies)
+        if template_years is not None:
+            context_entities = {found_companies[0]: self._template_context_entities(template_years, company_sections)}
+        else:
+            companies_data = self._summarize_company_data(found_companies, company_sections)
+            context_entities = self._llm_extract_context_entities_batch(query, companies_data)
 
-        # Aggregate all available sections for all found companies
-        all_available_sections = []
         for company in found_companies:
-            entities = self._extract_entities_from_query(query, company)
-            sections = self._get_focused_sections(company, entities)
-            # Add company name to each section for clarity in the plan
-            for section in sections:
-                section['company'] = company
-            all_available_sections.extend(sections)
+            logging.info(f"📋 Extracted entities for pre-filtering for {company}: {context_entities.get(company)}")
+        all_available_sections = self._filter_sections(company_sections, context_entities)
 
         if not all_available_sections:
             logging.warning("No documents found for the given companies and filters. Cannot create a plan.")
@@ -83,299 +334,445 @@ class ImprovedQueryPlanner:
         logging.info("✅ Successfully created dynamic extraction plan.")
         return extraction_plan
 
-    def _extract_entities_from_query(self, query: str, company: str) -> Dict[str, list]:
-        """
-        Extracts year, quarter, and document type for a given company to pre-filter documents.
-        This helps narrow down the context for the main planning LLM call.
-        """
-        # This is a simplified version of the original entity extraction logic
-        company_data = self._get_company_focused_data(company)
-        entities = {"companies": [company]}
-        context_entities = self._llm_extract_context_entities(query, company_data)
-        entities.update(context_entities)
-        logging.info(f"📋 Extracted entities for pre-filtering for {company}: {entities}")
-        return entities
+    def _cache_namespace(self, kind: str, *parts) -> str:
+        return ResponseCache.make_key("planner", kind, getattr(self.llm_client, "model", None), *parts)
+
+    def _cache_get(self, namespace: str, query: str, semantic: bool = False,
+                   similarity_threshold: float = PLAN_CACHE_SIMILARITY_THRESHOLD) -> Optional[str]:
+        if self.cache is None:
+            return None
+        try:
+            cached = self.cache.get(namespace, query, semantic=semantic,
+                                    similarity_threshold=similarity_threshold)
+        except Exception as e:
+            logging.warning(f"Planner cache lookup failed: {e}")
+            return None
+        if cached is not None:
+            logging.info("♻️ Reusing cached planner response.")
+        return cached
+
+    def _cache_set(self, namespace: str, query: str, value: str, semantic: bool = False):
+        if self.cache is None:
+            return
+        try:
+            self.cache.set(namespace, query, value, semantic=semantic)
+        except Exception as e:
+            logging.warning(f"Planner cache write failed: {e}")
 
     def _llm_generate_extraction_guide(self, query: str, available_sections: List[Dict]) -> Optional[Dict]:
         """
         The core of the new planner. This LLM call looks at the user's query and the
         list of available documents and generates a detailed plan (the "guide").
         """
-        # Create a simplified, readable list of documents for the prompt
-        readable_docs = [
-            f"- Company: {s['company']}, Document: {s['doc_type']}, Section Name: {s['section_name']}, Section ID: {s['section_id']}"
-            for s in available_sections
-        ]
-
-        prompt = f"""
-You are a world-class financial analyst and strategic planner. Your task is to create a structured, step-by-step plan to answer a user's complex query about SEC filings. You will be given the user's query and a list of all the specific document sections that are available in the database.
-
-**User's Query:**
+        # Compact table of the available sections; the column order is documented once
+        # in the system prompt.
+        readable_docs = "\n".join(
+            f"{s['section_id']}|{s['company']}|{s['doc_type']}|{s['section_name']}" for s in available_sections
+        )
+        user_prompt = f"""**User's Query:**
 {query}
 
 **Available Document Sections:**
-{json.dumps(readable_docs, indent=2)}
-
-**Your Task:**
-Based on the user's query and the *specific documents available*, generate a JSON object that contains a detailed and realistic plan. The plan must have three parts:
-
-1.  `analysis_goal`: A clear, one-sentence description of what the final report should accomplish. This will be the main instruction for the final answer synthesis.
-2.  `sections_to_retrieve`: A list of the specific `section_id` numbers from the "Available Document Sections" that are absolutely necessary to achieve the `analysis_goal`. Be selective; only choose the most relevant sections.
-3.  `extraction_checklist`: A detailed, point-by-point checklist of the specific information that needs to be extracted. Each item in the checklist must be an object with two keys:
-    - `task`: A string describing the specific data point or summary to extract.
-    - `type`: A string categorizing the task. Use **'table_extraction'** for tasks requiring precise data points likely found in financial tables (e.g., Net Income, Revenue, specific loan amounts). Use **'narrative_summary'** for tasks requiring summarization of prose or qualitative information (e.g., "key drivers for performance," "risk factors").
+{readable_docs}"""
+
+        # Only reuse a plan when exactly the same candidate sections are available
+        namespace = self._cache_namespace("extraction_guide", sorted(s['section_id'] for s in available_sections))
+        cached = self._cache_get(namespace, query, semantic=True)
+        if cached is not None:
+            plan = self._validate_extraction_plan(cached)
+            if plan:
+                return plan
+
+        # Otherwise a plan made for the same question about another company may fit
+        companies = {s['company'] for s in available_sections}
+        company = next(iter(companies)) if len(companies) == 1 else None
+        template_query = self._templatize(query, company) if company and self.cache is not None else None
+        template_namespace = self._cache_namespace("extraction_template")
+        if template_query:
+            cached = self._cache_get(template_namespace, template_query, semantic=True,
+                                     similarity_threshold=PLAN_TEMPLATE_SIMILARITY_THRESHOLD)
+            plan = self._plan_from_template(cached, company, available_sections) if cached is not None else None
+            if plan:
+                logging.info(f"Reused an extraction guide template for {company}; skipping the LLM call.")
+                return plan
+
+        # The few-shot example is only sent when a first attempt without it fails validation
+        for with_example in (False, True):
+            system_prompt = EXTRACTION_GUIDE_SYSTEM_PROMPT
+            if with_example:
+                logging.info("Retrying extraction guide generation with the example output.")
+                system_prompt += EXTRACTION_GUIDE_EXAMPLE
+            try:
+                response = self.llm_client.chat.completions.create(
+                    model=None,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    response_format={"type": "json_object"}
+                )
+                raw_response = response.choices[0].message.content
+                logging.info(f"LLM extraction guide response: {raw_response}")
+            except Exception as e:
+                logging.error(f"Error during LLM plan generation: {e}")
+                return None
 
-**Example Output:**
-{{
-  "analysis_goal": "A comparative summary of the financial performance and risk profiles of BAC and JPM for Q2 2025.",
-  "sections_to_retrieve": [5348, 5353, 3781, 3784],
-  "extraction_checklist": [
-    {{
-      "task": "Extract the Net Income, Revenue, and EPS for each company for Q2 2025.",
-      "type": "table_extraction"
-    }},
-    {{
-      "task": "Summarize the key drivers for revenue and expense changes and any forward-looking guidance.",
-      "type": "narrative_summary"
-    }},
-    {{
-      "task": "Summarize the top 3 disclosed risks for each company for the quarter.",
-      "type": "narrative_summary"
-    }}
-  ]
-}}
+            plan = self._validate_extraction_plan(raw_response)
+            if plan:
+                self._cache_set(namespace, query, raw_response, semantic=True)
+                if template_query:
+                    template = self._plan_to_template(plan, company, available_sections)
+                    self._cache_set(template_namespace, template_query, json.dumps(template), semantic=True)
+                return plan
+        return None
+
+    @staticmethod
+    def _templatize(text: str, company: str) -> Optional[str]:
+        """
+        Replaces the ticker in `text` with COMPANY_PLACEHOLDER; None if the ticker isn't
+        spelled out. Only the uppercase ticker is replaced, so "key risks for KEY" keeps
+        its "key".
+        """
+        templated, count = _ticker_token_pattern((company,)).subn(COMPANY_PLACEHOLDER, text)
+        return templated if count else None
+
+    @staticmethod
+    def _plan_to_template(plan: Dict, company: str, available_sections: List[Dict]) -> Dict:
+        """A company-independent copy of a single-company plan; see COMPANY_PLACEHOLDER."""
+        pattern = _ticker_token_pattern((company,))
+        by_id = {s['section_id']: s for s in available_sections}
+        return {
+            "analysis_goal": pattern.sub(COMPANY_PLACEHOLDER, str(plan["analysis_goal"])),
+            "sections": [
+                [by_id[section_id][key] for key in ("doc_type", "year", "quarter", "section_name")]
+                for section_id in plan["sections_to_retrieve"] if section_id in by_id
+            ],
+            "extraction_checklist": [
+                {**item, "task": pattern.sub(COMPANY_PLACEHOLDER, str(item["task"]))}
+                for item in plan["extraction_checklist"]
+            ],
+        }
+
+    def _plan_from_template(self, raw_template: str, company: str, available_sections: List[Dict]) -> Optional[Dict]:
+        """
+        Fills a cached template in for `company`. Returns None unless every templated
+        section maps onto one of the company's available sections.
+        """
+        try:
+            template = json.loads(raw_template)
+            section_ids = {
+                (s['doc_type'], s['year'], s['quarter'], s['section_name']): s['section_id']
+                for s in available_sections
+            }
+            sections_to_retrieve = [section_ids[tuple(section)] for section in template["sections"]]
+            plan = {
+                "analysis_goal": template["analysis_goal"].replace(COMPANY_PLACEHOLDER, company),
+                "sections_to_retrieve": sections_to_retrieve,
+                "extraction_checklist": [
+                    {**item, "task": item["task"].replace(COMPANY_PLACEHOLDER, company)}
+                    for item in template["extraction_checklist"]
+                ],
+            }
+        except (KeyError, TypeError, AttributeError, json.JSONDecodeError):
+            # A section the new company doesn't have, or a malformed entry
+            return None
+        if not sections_to_retrieve:
+            return None
+        return self._validate_extraction_plan(json.dumps(plan))
 
-You MUST provide your response as a single, valid JSON object with these three keys, and nothing else.
-"""
+    @staticmethod
+    def _validate_extraction_plan(raw_response: str) -> Optional[Dict]:
+        """Parses an extraction guide response, returning None if it isn't a valid plan."""
         try:
-            response = self.llm_client.chat.completions.create(
-                model=None,
-                messages=[{"role": "system", "content": prompt}],
-                response_format={"type": "json_object"}
-            )
-            raw_response = response.choices[0].message.content
-            logging.info(f"LLM extraction guide response: {raw_response}")
-            
-            # Basic validation to ensure the response is a dict with the right keys
             plan = json.loads(raw_response)
-            if all(key in plan for key in ["analysis_goal", "sections_to_retrieve", "extraction_checklist"]):
-                # Advanced validation for the new checklist structure
-                if isinstance(plan["extraction_checklist"], list) and all(
-                    isinstance(item, dict) and 'task' in item and 'type' in item
-                    for item in plan["extraction_checklist"]
-                ):
-                    plan["plan_type"] = "content_extraction" # Add our internal type
-                    return plan
-                else:
-                    logging.error("LLM-generated extraction_checklist is not in the correct format.")
-                    return None
-            else:
-                logging.error("LLM-generated plan is missing required keys.")
-                return None
-        except Exception as e:
-            logging.error(f"Error during LLM plan generation: {e}")
+        except (json.JSONDecodeError, TypeError) as e:
+            logging.error(f"LLM-generated plan is not valid JSON: {e}")
             return None
 
-    def _llm_extract_company(self, query: str, all_companies: List[str]) -> List[str]:
+        # Basic validation to ensure the response is a dict with the right keys
+        if not isinstance(plan, dict) or not all(key in plan for key in ["analysis_goal", "sections_to_retrieve", "extraction_checklist"]):
+            logging.error("LLM-generated plan is missing required keys.")
+            return None
+        # Advanced validation for the new checklist structure
+        if not (isinstance(plan["extraction_checklist"], list) and all(
+            isinstance(item, dict) and 'task' in item and 'type' in item
+            for item in plan["extraction_checklist"]
+        )):
+            logging.error("LLM-generated extraction_checklist is not in the correct format.")
+            return None
+
+        plan["plan_type"] = "content_extraction" # Add our internal type
+        return plan
+
+    @staticmethod
+    def _match_single_ticker(query: str, all_companies: List[str]) -> Optional[str]:
         """
-        Uses an LLM to extract the company ticker from a query, handling synonyms.
+        Returns the ticker when the query names exactly one known ticker, in capitals, and
+        nothing hints at other companies (comparisons, or capitalized words that may be a
+        company name); otherwise None, deferring to the LLM.
         """
-        prompt = f"""
-You are an expert entity extractor. Your task is to identify which company from a provided list is mentioned in the user's query. The user may use full names, abbreviations, or tickers.
+        if not all_companies:
+            return None
+        lowered = query.lower()
+        if any(hint in lowered for hint in _MULTI_COMPANY_HINTS):
+            return None
+        words = query.split(None, 1)
+        if len(words) > 1 and _CAPITALIZED_WORD_RE.search(words[1]):
+            return None
+        by_upper = {c.upper(): c for c in all_companies}
+        matches = {by_upper[m] for m in _ticker_token_pattern(tuple(sorted(all_companies))).findall(query)}
+        return matches.pop() if len(matches) == 1 else None
 
-**List of Available Companies:**
-{json.dumps(all_companies)}
+    @staticmethod
+    def _match_query_template(query: str, all_companies: List[str]) -> Optional[Tuple[str, List[str]]]:
+        """
+        Returns (ticker, years) when the query is a business summary for one known company,
+        e.g. "ZION business summary of 2025 vs 2024"; years is empty for "across all
+        available years". None for every other query.
+        """
+        match = _BUSINESS_SUMMARY_RE.match(query)
+        if not match:
+            return None
+        by_upper = {c.upper(): c for c in all_companies or ()}
+        ticker = by_upper.get(match.group("ticker").upper())
+        if not ticker:
+            return None
+        return ticker, [year for year in (match.group("y1"), match.group("y2")) if year]
 
-**User Query:**
-"{query}"
+    def _template_context_entities(self, years: List[str], sections: List[dict]) -> Dict[str, list]:
+        """
+        Context entities for a template match, validated against the graph like the LLM's:
+        years that don't exist for the company are dropped.
+        """
+        available_years = {str(section['year']): section['year'] for section in sections}
+        entities = self._empty_context_entities()
+        entities["years"] = [available_years[year] for year in years if year in available_years]
+        return entities
 
-**Instructions:**
-1. Read the user query carefully.
-2. Compare the company mentioned in the query against the "List of Available Companies".
-3. Identify the official company ticker from the list that corresponds to the company in the query. For example, if the query says "JP Morgan", and the list contains "JPM", you must identify "JPM".
-4. If no company from the list is mentioned, return an empty list.
-5. If the query asks for "all companies" or similar, return the entire list of available companies.
+    def _llm_extract_company(self, query: str, all_companies: List[str]) -> List[str]:
+        """
+        Uses an LLM to extract the company ticker from a query, handling synonyms.
+        """
+        user_prompt = f"""**User Query:**
+"{query}"
 
-You MUST provide your response as a single, valid JSON object with a single key "companies", and nothing else.
-**Output Format:**
-{{
-  "companies": ["ticker_1", "ticker_2", ...]
-}}
-"""
+**List of Available Companies:**
+{json.dumps(all_companies)}"""
+        namespace = self._cache_namespace("companies", sorted(all_companies))
         try:
-            response = self.llm_client.chat.completions.create(
-                model=None,
-                messages=[{"role": "system", "content": prompt}, {"role": "user", "content": f"Query: {query}"}],
-                response_format={"type": "json_object"}
-            )
-            raw_response = response.choices[0].message.content
-            logging.info(f"LLM company extraction response: {raw_response}")
+            raw_response = self._cache_get(namespace, query)
+            from_cache = raw_response is not None
+            if not from_cache:
+                response = self.llm_client.chat.completions.create(
+                    model=None,
+                    messages=[{"role": "system", "content": COMPANY_EXTRACTION_SYSTEM_PROMPT}, {"role": "user", "content": user_prompt}],
+                    response_format=_json_schema_format("company_extraction", {
+                        "type": "object",
+                        "properties": {"companies": _enum_array(all_companies)},
+                        "required": ["companies"],
+                        "additionalProperties": False,
+                    })
+                )
+                raw_response = response.choices[0].message.content
+                logging.info(f"LLM company extraction response: {raw_response}")
             
-            try:
-                data = json.loads(raw_response)
-            except json.JSONDecodeError:
-                logging.warning("LLM company extraction response was not valid JSON. Attempting to extract from text.")
-                match = re.search(r'\{.*\}', raw_response, re.DOTALL)
-                if match:
-                    json_str = match.group()
-                    data = json.loads(json_str)
-                else:
-                    raise ValueError("No JSON object found in LLM response.")
+            data = json.loads(raw_response)
 
             found_companies = data.get("companies", [])
-            valid_companies = [c for c in found_companies if c in all_companies]
+            company_set = frozenset(all_companies)
+            valid_companies = [c for c in found_companies if c in company_set]
             
             if len(found_companies) != len(valid_companies):
-                logging.warning(f"LLM returned companies not in the master list: {set(found_companies) - set(valid_companies)}")
+                logging.warning(f"LLM returned companies not in the master list: {set(found_companies) - company_set}")
 
+            if not from_cache:
+                self._cache_set(namespace, query, raw_response)
             return valid_companies
         except Exception as e:
             logging.error(f"Error during LLM company extraction: {e}")
             return []
 
-    def _llm_extract_context_entities(self, query: str, company_data: dict) -> Dict[str, list]:
-        """
-        Uses LLM to extract year, quarter, and doc type, grounded by available data.
-        """
+    @staticmethod
+    def _empty_context_entities() -> Dict[str, list]:
+        return {"years": [], "quarters": [], "doc_types": []}
+
+    @staticmethod
+    def _available_context(company_data: dict) -> Tuple[list, list]:
+        """Returns the (years, doc_types) actually present in the graph for a company."""
         available_years = list(company_data.get("actual_data", {}).keys())
-        available_doc_types = sorted(list(set(
+        available_doc_types = sorted(set(
             doc_type
             for year_data in company_data.get("actual_data", {}).values()
             for quarter_data in year_data.values()
             for doc_type in quarter_data
-        )))
-        
-        prompt = f"""
-You are an expert entity extractor. Your job is to independently identify the year, quarter, and document type from a user's query, based on available data.
+        ))
+        return available_years, available_doc_types
 
-**Available Data for the company:**
-- Years: {json.dumps(available_years)}
-- Document Types: {json.dumps(available_doc_types)}
+    def _llm_extract_context_entities_batch(self, query: str, companies_data: Dict[str, dict]) -> Dict[str, Dict[str, list]]:
+        """
+        Uses a single LLM call to extract year, quarter, and doc type for every company,
+        grounded by the data available for each one.
 
-**User Query:**
+        Returns:
+            A mapping of company ticker -> {"years", "quarters", "doc_types"}.
+        """
+        available = {company: self._available_context(data) for company, data in companies_data.items()}
+        available_data = {
+            company: {"years": years, "document_types": doc_types}
+            for company, (years, doc_types) in available.items()
+        }
+
+        schema = {
+            "type": "object",
+            "properties": {
+                company: {
+                    "type": "object",
+                    "properties": {
+                        "years": _enum_array(years),
+                        "quarters": _enum_array(sorted(_QUARTER_LABELS)),
+                        "doc_types": _enum_array(doc_types),
+                    },
+                    "required": ["years", "quarters", "doc_types"],
+                    "additionalProperties": False,
+                }
+                for company, (years, doc_types) in available.items()
+            },
+            "required": list(available),
+            "additionalProperties": False,
+        }
+
+        user_prompt = f"""**User Query:**
 "{query}"
 
-**Instructions:**
-1.  **Year Extraction:** Look for a 4-digit year in the query. It must be one of the "Available Years". If not found, return an empty list for `years`. You can also extract a range of years.
-2.  **Quarter Extraction:** Look for a quarter mention (e.g., "Q1", "q2", "3rd quarter"). Extract only the quarter label (e.g., "Q1", "Q2", "Q3", "Q4"). If not found, return an empty list for `quarters`.
-3.  **Document Type Extraction:** Look for a document type mention (e.g., "10-K", "10-Q", "annual report"). It must be one of the "Available Document Types".
-    -   "annual report" or "annual filing" maps to "10-K".
-    -   "quarterly report" or "quarterly filing" maps to "10-Q".
-
-**CRITICAL RULE:** The decision for each entity MUST be independent. Specifically, **you must NOT infer a document type** just because a quarter is mentioned. If the query does not explicitly state a document type like '10-K' or 'annual report', the `document_types` field MUST be an empty list `[]`.
-
-You MUST provide your response as a single, valid JSON object, and nothing else.
-**Output Format:**
-{{
-  "years": [YYYY],
-  "quarters": ["Q#"],
-  "document_types": ["doc_type"]
-}}
-"""
+**Available Data per Company:**
+{json.dumps(available_data, indent=2)}"""
         try:
             response = self.llm_client.chat.completions.create(
                 model=None,
-                messages=[{"role": "system", "content": prompt}, {"role": "user", "content": f"Query: {query}"}],
-                response_format={"type": "json_object"}
+                messages=[{"role": "system", "content": CONTEXT_EXTRACTION_SYSTEM_PROMPT}, {"role": "user", "content": user_prompt}],
+                response_format=_json_schema_format("context_extraction", schema)
             )
             raw_response = response.choices[0].message.content
             logging.info(f"LLM context extraction response: {raw_response}")
             
-            try:
-                data = json.loads(raw_response)
-            except json.JSONDecodeError:
-                logging.warning("LLM context extraction response was not valid JSON. Attempting to extract from text.")
-                match = re.search(r'\{.*\}', raw_response, re.DOTALL)
-                if match:
-                    json_str = match.group()
-                    data = json.loads(json_str)
-                else:
-                    raise ValueError("No JSON object found in LLM response.")
-
-            validated_data = {
-                "years": [y for y in self._sanitize_llm_list_output(data.get("years", [])) if y in available_years],
-                "quarters": [q.upper() for q in self._sanitize_llm_list_output(data.get("quarters", [])) if isinstance(q, str) and re.match(r'^Q[1-4]$', q, re.IGNORECASE)],
-                "document_types": [dt for dt in self._sanitize_llm_list_output(data.get("document_types", [])) if dt in available_doc_types]
-            }
+            data = json.loads(raw_response)
+
+            validated_data = {}
+            for company, (available_years, available_doc_types) in available.items():
+                company_entities = data.get(company)
+                if not isinstance(company_entities, dict):
+                    logging.warning(f"LLM context extraction response is missing company {company}.")
+                    validated_data[company] = self._empty_context_entities()
+                    continue
+                years_set, doc_types_set = frozenset(available_years), frozenset(available_doc_types)
+                validated_data[company] = {
+                    "years": [y for y in self._sanitize_llm_list_output(company_entities.get("years", [])) if y in years_set],
+                    "quarters": [q.upper() for q in self._sanitize_llm_list_output(company_entities.get("quarters", [])) if isinstance(q, str) and q.upper() in _QUARTER_LABELS],
+                    "doc_types": [dt for dt in self._sanitize_llm_list_output(company_entities.get("doc_types", [])) if dt in doc_types_set]
+                }
             return validated_data
             
         except Exception as e:
             logging.error(f"Error during LLM context extraction: {e}")
-            return {"years": [], "quarters": [], "document_types": []}
+            return {company: self._empty_context_entities() for company in companies_data}
 
-    def _get_company_focused_data(self, company: str) -> dict:
+    def _get_company_sections(self, companies: List[str]) -> List[dict]:
         """
-        Get real year/quarter/document type combinations for the specific company.
+        Returns every section of the given companies, with its document context, ordered
+        like the Cypher query orders them. Companies fetched within the executor's
+        metadata TTL are served from the planner's section cache; the rest are fetched in
+        a single query. Empty results are not cached, since the query iterator also ends
+        early on errors.
         """
-        query = """
-        MATCH (c:Company {name: $company})-[:HAS_YEAR]->(y:Year)-[:HAS_QUARTER]->(q:Quarter)-[:HAS_DOC]->(d:Document)
-        RETURN y.value as year, q.label as quarter, d.document_type as doc_type
-        ORDER BY y.value DESC, q.label
-        """
-        
-        result = self.neo4j_executor.run_cypher_query(query, {"company": company})
-        
-        focused_data = {"company": company, "actual_data": {}}
-        for record in result:
-            year, quarter, doc_type = record['year'], record['quarter'], record['doc_type']
-            focused_data["actual_data"].setdefault(year, {}).setdefault(quarter, []).append(doc_type)
-        
-        return focused_data
-    
-    def _get_focused_sections(self, company: str, entities: dict) -> List[dict]:
+        now = time.monotonic()
+        found = {}
+        for company in dict.fromkeys(companies):
+            cached = self._section_cache.get(company)
+            if cached and now - cached[0] < self.neo4j_executor.metadata_ttl:
+                self._section_cache.move_to_end(company)
+                found[company] = cached[1]
+
+        missing = [company for company in dict.fromkeys(companies) if company not in found]
+        if missing:
+            fetched = {company: [] for company in missing}
+            for section in self._fetch_company_sections(missing):
+                fetched[section["company"]].append(section)
+            for company, rows in fetched.items():
+                found[company] = tuple(rows)
+                if rows:
+                    self._section_cache[company] = (now, found[company])
+                    self._section_cache.move_to_end(company)
+                else:
+                    self._section_cache.pop(company, None)
+            while len(self._section_cache) > SECTION_CACHE_SIZE:
+                self._section_cache.popitem(last=False)
+
+        sections = []
+        for company in sorted(found):
+            sections.extend(found[company])
+        return sections
+
+    def _fetch_company_sections(self, companies: List[str]) -> List[dict]:
         """
-        Builds and executes a precise Cypher query to fetch only the sections that
-        match the filters extracted from the user's query, using the correct graph schema.
+        Fetches every section of the given companies, with its document context, in a
+        single Cypher query.
         """
-        logging.info(f"Getting focused sections for {company} with entities: {entities}")
-
-        # Base of the Cypher query matching the actual graph structure
         cypher_query = """
-        MATCH (c:Company {name: $company})-[:HAS_YEAR]->(y:Year)-[:HAS_QUARTER]->(q:Quarter)-[:HAS_DOC]->(d:Document)-[:HAS_SECTION]->(s:Section)
-        """
-        
-        # Start building the WHERE clause and parameters
-        where_clauses = []
-        params = {"company": company}
-
-        # Dynamically add filters based on extracted entities
-        if entities.get("years"):
-            where_clauses.append("y.value IN $years")
-            params["years"] = entities["years"]
-        
-        if entities.get("quarters"):
-            where_clauses.append("q.label IN $quarters")
-            params["quarters"] = entities["quarters"]
-            
-        if entities.get("doc_types"):
-            where_clauses.append("d.document_type IN $doc_types")
-            params["doc_types"] = entities["doc_types"]
-            
-        # Append WHERE clauses if any exist
-        if where_clauses:
-            cypher_query += "WHERE " + " AND ".join(where_clauses)
-            
-        # Finalize the query to return all necessary data
-        cypher_query += """
+        UNWIND $companies AS company
+        MATCH (c:Company {name: company})-[:HAS_YEAR]->(y:Year)-[:HAS_QUARTER]->(q:Quarter)-[:HAS_DOC]->(d:Document)-[:HAS_SECTION]->(s:Section)
         RETURN
+            company,
             id(s) as section_id,
             s.name as section_name,
             d.document_type as doc_type,
             y.value as year,
             q.label as quarter
-        ORDER BY y.value DESC, q.label DESC
+        ORDER BY company, y.value DESC, q.label DESC
         """
-        
-        logging.info(f"Constructed precise Cypher query for pre-filtering:\n{cypher_query}\nParams: {params}")
-        
-        # Execute the query
-        results = self.neo4j_executor.run_cypher_query(cypher_query, params)
-        
-        if not results:
-            logging.warning("Precise pre-filtering query returned no sections.")
-        
-        return results
-    
+        rows = self.neo4j_executor.run_cypher_query_iter(cypher_query, {"companies": companies}, keys=_SECTION_COLUMNS)
+        return [
+            {"company": company, "section_id": section_id, "section_name": section_name,
+             "doc_type": doc_type, "year": year, "quarter": quarter}
+            for company, section_id, section_name, doc_type, year, quarter in rows
+        ]
+
+    @staticmethod
+    def _summarize_company_data(companies: List[str], sections: List[dict]) -> Dict[str, dict]:
+        """
+        Get real year/quarter/document type combinations for each company from its sections.
+        """
+        companies_data = {company: {"company": company, "actual_data": {}} for company in companies}
+        for section in sections:
+            doc_types = (companies_data[section['company']]["actual_data"]
+                         .setdefault(section['year'], {})
+                         .setdefault(section['quarter'], []))
+            if section['doc_type'] not in doc_types:
+                doc_types.append(section['doc_type'])
+        return companies_data
+
+    def _filter_sections(self, sections: List[dict], context_entities: Dict[str, Dict[str, list]]) -> List[dict]:
+        """
+        Keeps only the sections matching each company's extracted years, quarters and
+        doc types; an empty list means "no filter" for that level of the graph.
+        """
+        filters = {}
+        for company, entities in context_entities.items():
+            entities = entities or self._empty_context_entities()
+            filters[company] = tuple(frozenset(entities.get(key) or ()) for key in ("years", "quarters", "doc_types"))
+
+        no_filter = (frozenset(), frozenset(), frozenset())
+        focused = []
+        for section in sections:
+            years, quarters, doc_types = filters.get(section['company'], no_filter)
+            if ((not years or section['year'] in years)
+                    and (not quarters or section['quarter'] in quarters)
+                    and (not doc_types or section['doc_type'] in doc_types)):
+                focused.append(section)
+
+        if not focused:
+            logging.warning("Precise pre-filtering returned no sections.")
+        return focused
+
     def _sanitize_llm_list_output(self, value) -> list:
         """
         Robustly handles LLM output that might be a string representation of a list.
@@ -383,16 +780,18 @@ You MUST provide your response as a single, valid JSON object, and nothing else.
         if isinstance(value, list):
             return value
         if isinstance(value, str):
-            try:
-                # Attempt to parse it as JSON
-                return json.loads(value)
-            except (json.JSONDecodeError, TypeError):
-                # Fallback for simple strings that aren't JSON, e.g., "[]"
-                cleaned_value = value.strip().replace('[', '').replace(']', '').replace('"', '').replace("'", "")
-                if not cleaned_value:
-                    return []
-                # Split by comma and strip spaces
-                return [item.strip() for item in cleaned_value.split(',')]
+            stripped = value.lstrip()
+            # Only attempt JSON when it looks like JSON, rather than relying on the exception
+            if stripped[:1] in ('[', '{'):
+                try:
+                    parsed = json.loads(stripped)
+                    if isinstance(parsed, list):
+                        return parsed
+                except json.JSONDecodeError:
+                    pass
+            # Fallback for simple strings that aren't JSON, e.g. "[Q1, 'Q2']"
+            cleaned_value = value.translate(_LIST_STRIP_TABLE)
+            return [item.strip() for item in cleaned_value.split(',') if item.strip()]
         return []
 
     def _llm_classify_and_build_metadata_query(self, query: str) -> Optional[dict]:
@@ -400,83 +799,25 @@ You MUST provide your response as a single, valid JSON object, and nothing else.
         Uses an LLM call to classify if a query is "metadata" or "content".
         If it is, it generates the appropriate Cypher query.
         """
-        prompt = self._build_metadata_prompt_builtin()
-        
+        namespace = self._cache_namespace("metadata_classification")
         try:
+            cached = self._cache_get(namespace, query)
+            if cached is not None:
+                return json.loads(cached)
             response = self.llm_client.chat.completions.create(
                 model=None, # Use default from client
-                messages=[{"role": "system", "content": prompt}, {"role": "user", "content": f"Query: {query}"}],
+                messages=[{"role": "system", "content": METADATA_CLASSIFICATION_SYSTEM_PROMPT}, {"role": "user", "content": f"Query: {query}"}],
                 response_format={"type": "json_object"}
             )
             raw_response = response.choices[0].message.content
             logging.info(f"LLM metadata classification response: {raw_response}")
-            return json.loads(raw_response)
+            classification = json.loads(raw_response)
+            self._cache_set(namespace, query, raw_response)
+            return classification
         except Exception as e:
             logging.error(f"Error during metadata classification: {e}")
             return None # Return None on failure to allow fallback to content planning
 
-    def _build_metadata_prompt_builtin(self) -> str:
-        """Builds the prompt for the metadata classification LLM call."""
-        return """
-You are a query classifier and builder for a financial graph database.
-Your task is to determine if a user's query is a "metadata query" or a "content query".
-
-- **Metadata Query:** Asks for information ABOUT the dataset structure. It does NOT ask for information from inside a document.
-  Examples: "What companies are in the dataset?", "Which years are available for ZION?", "List the documents for BAC in Q1 2023".
-- **Content Query:** Asks for information FROM WITHIN a document, such as a summary, a specific section, or a report.
-  Examples: "What were the risk factors for JPM in 2022?", "Show me the MD&A for PNC's latest 10-K", "Give me a summary of BAC in Q1 2025", "Create a detailed summary report for all sections of ZION's 2023 10-K".
-
-**Instructions:**
-1.  Analyze the user's query.
-2.  If it is a **Metadata Query**:
-    a. Set `query_type` to "metadata".
-    b. Construct the appropriate Cypher query to answer it.
-    c. Set `response_format` to "list_of_strings".
-    d. Provide a brief `human_readable_answer`.
-3.  If it is a **Content Query** (including requests for summaries, reports, or specific sections):
-    a. Set `query_type` to "content".
-    b. Leave `cypher_query`, `response_format`, and `human_readable_answer` as `null`.
-
-**Available Schema:**
-- Companies are `(:Company {name: "TICKER"})`
-- Years are `(:Year {value: YYYY})`
-- Quarters are `(:Quarter {label: "Q#"})`
-- Documents are `(:Document {document_type: "10-K", filing_date: "YYYY-MM-DD"})`
-- Relationships are `(Company)-[:HAS_YEAR]->(Year)-[:HAS_QUARTER]->(Quarter)-[:HAS_DOC]->(Document)`
-
-You MUST provide your response as a single, valid JSON object, and nothing else.
-
-**Example 1: Metadata Query**
-- User Query: "what are the companies in the dataset?"
-- JSON Output:
-{
-  "query_type": "metadata",
-  "cypher_query": "MATCH (n:Company) RETURN DISTINCT n.name AS value ORDER BY value",
-  "response_format": "list_of_strings",
-  "human_readable_answer": "Here are the companies in the dataset:"
-}
-
-**Example 2: Content Query**
-- User Query: "what were the risks for zion in 2023"
-- JSON Output:
-{
-  "query_type": "content",
-  "cypher_query": null,
-  "response_format": null,
-  "human_readable_answer": null
-}
-
-**Example 3: Content Query (summary)**
-- User Query: "BAC 2025 q1 all sections, create a detailed summary report?"
-- JSON Output:
-{
-  "query_type": "content",
-  "cypher_query": null,
-  "response_format": null,
-  "human_readable_answer": null
-}
-"""
-
 def create_focused_query_plan(llm_client, neo4j_executor, query: str) -> List[dict]:
     """
     Standalone function to create a query plan using the ImprovedQueryPlanner.
@@ -1,8 +1,19 @@
 from neo4j import GraphDatabase
+import asyncio
+import glob
 import logging
+import os
+import time
+
+# Idempotent schema statements (indexes/constraints) applied when the executor starts
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+# Company/year/quarter/document inventories only change on ingestion, so they are
+# cached for this long before being re-read from the graph.
+METADATA_CACHE_TTL_SECONDS = 600
 
 class Neo4jExecutor:
-    def __init__(self, uri: str, user: str, password: str):
+    def __init__(self, uri: str, user: str, password: str, metadata_ttl: float = METADATA_CACHE_TTL_SECONDS):
         """
         Initializes the Neo4jExecutor.
 
@@ -10,10 +21,52 @@ class Neo4jExecutor:
             uri (str): The Neo4j database URI.
             user (str): Database username.
             password (str): Database password.
+            metadata_ttl (float): Seconds a cached metadata lookup stays valid.
         """
-        print(f"Initializing Neo4jExecutor with URI: {uri}")
+        logging.info("Initializing Neo4jExecutor with URI: %s", uri)
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
-        print("Neo4j driver created.")
+        # Fail fast on an unreachable database or bad credentials, before callers spend
+        # LLM calls on a plan that could never be executed
+        try:
+            self.driver.verify_connectivity()
+        except Exception:
+            self.driver.close()
+            raise
+        self._db = "neo4j"
+        self.metadata_ttl = metadata_ttl
+        # key -> (timestamp, records)
+        self._metadata_cache = {}
+        # Flush hooks of caches kept by callers (e.g. the planner's section cache)
+        self._invalidation_callbacks = []
+        logging.info("Neo4j driver created.")
+        self.apply_migrations()
+
+    def apply_migrations(self, migrations_dir: str = MIGRATIONS_DIR):
+        """
+        Runs the `;`-separated statements of every .cypher file in `migrations_dir`, in
+        filename order. Statements are expected to be idempotent (IF NOT EXISTS); an
+        "already exists" error is ignored and any other failure is logged, so a read-only
+        user can still run queries.
+        """
+        for path in sorted(glob.glob(os.path.join(migrations_dir, "*.cypher"))):
+            with open(path, encoding="utf-8") as f:
+                script = "".join(line for line in f if not line.lstrip().startswith("//"))
+            statements = [s.strip() for s in script.split(";") if s.strip()]
+            failures = 0
+            for statement in statements:
+                try:
+                    self.driver.execute_query(statement, database_=self._db)
+                except Exception as e:
+                    if "already exists" in str(e).lower():
+                        logging.debug("Skipping existing schema object: %s", statement)
+                    else:
+                        failures += 1
+                        logging.warning("Failed to apply migration statement from %s: %s", os.path.basename(path), e)
+            if failures:
+                logging.warning("Neo4j migration %s incomplete: %d of %d statement(s) failed",
+                                os.path.basename(path), failures, len(statements))
+            else:
+                logging.info("Applied Neo4j migration %s", os.path.basename(path))
 
     def run_cypher_query(self, query, params={}):
         """
@@ -26,67 +79,134 @@ class Neo4jExecutor:
         Returns:
             A list of result records.
         """
-        print(f"\n--- EXECUTING CYPHER QUERY ---\n{query}\nwith params: {params}\n-----------------------------")
+        logging.debug("Executing Cypher query:\n%s\nwith params: %s", query, params)
         try:
-            with self.driver.session() as session:
-                result = session.run(query, params)
-                result_list = [record.data() for record in result]
-                print(f"Query returned {len(result_list)} results.")
-                
-                # --- START OF NEW LOGGING ---
-                # Unconditionally print the first result to inspect its raw structure.
-                if result_list:
-                    print("--- RAW FIRST RESULT ---")
-                    print(result_list[0])
-                    print(f"(Type: {type(result_list[0])})")
-                    print("------------------------")
-                # --- END OF NEW LOGGING ---
-
-                return result_list
+            # execute_query uses the driver's pooled connections and a managed
+            # transaction, avoiding a session setup per call.
+            result_list = self.driver.execute_query(
+                query,
+                parameters_=params,
+                database_=self._db,
+                result_transformer_=lambda result: [record.data() for record in result],
+            )
+            logging.debug("Query returned %d results.", len(result_list))
+            return result_list
         except Exception as e:
-            print(f"An error occurred while executing Cypher query: {e}")
+            logging.exception("An error occurred while executing Cypher query: %s", e)
             # In case of an error, return an empty list or handle as appropriate
             return []
 
+    def run_cypher_query_iter(self, query: str, params: dict = None, keys: tuple = ()):
+        """
+        Streams a Cypher query's results as tuples of the requested `keys`, instead of
+        materializing a dict per record. Records are pulled from the server as the
+        caller iterates; errors are logged and end the iteration.
+
+        Args:
+            query (str): The Cypher query string to execute.
+            params (dict): A dictionary of parameters for the query.
+            keys (tuple): The result columns to yield, in order.
+
+        Yields:
+            One tuple of values per result record.
+        """
+        logging.debug("Streaming Cypher query:\n%s\nwith params: %s", query, params)
+        try:
+            with self.driver.session(database=self._db) as session:
+                for record in session.run(query, params or {}):
+                    yield tuple(record.values(*keys))
+        except Exception as e:
+            logging.exception("An error occurred while streaming Cypher query: %s", e)
+
+    async def arun_cypher_query_iter(self, query: str, params: dict = None, keys: tuple = ()):
+        """
+        Async counterpart of run_cypher_query_iter for callers inside an event loop.
+        Each record is pulled on a worker thread, so the loop keeps serving in-flight
+        work (e.g. LLM calls on earlier rows) while Neo4j streams the rest.
+        """
+        rows = self.run_cypher_query_iter(query, params, keys)
+        exhausted = object()
+        try:
+            while (row := await asyncio.to_thread(next, rows, exhausted)) is not exhausted:
+                yield row
+        finally:
+            rows.close()
+
     def get_graph_schema(self):
         """
         Fetches distinct values for key node properties using Cypher.
         """
-        print("Fetching graph schema from Neo4j...")
-        queries = {
-            "companies": "MATCH (c:Company) RETURN DISTINCT c.name AS name",
-            "years": "MATCH (y:Year) RETURN DISTINCT y.value AS name",
-            "quarters": "MATCH (q:Quarter) RETURN DISTINCT q.label AS name",
-            "sections": "MATCH (s:Section) RETURN DISTINCT s.section AS name"
+        logging.info("Fetching graph schema from Neo4j...")
+        # The four distinct-value scans are independent, so they run as CALL subqueries
+        # of a single query: one round trip instead of four.
+        query = """
+        CALL { MATCH (c:Company) RETURN collect(DISTINCT c.name) AS companies }
+        CALL { MATCH (y:Year) RETURN collect(DISTINCT y.value) AS years }
+        CALL { MATCH (q:Quarter) RETURN collect(DISTINCT q.label) AS quarters }
+        CALL { MATCH (s:Section) RETURN collect(DISTINCT s.section) AS sections }
+        RETURN companies, years, quarters, sections
+        """
+        result = self.run_cypher_query(query)
+        row = result[0] if result else {}
+        details = {
+            key: sorted(row.get(key) or [])
+            for key in ("companies", "years", "quarters", "sections")
         }
-        details = {}
-        for key, query in queries.items():
-            result = self.run_cypher_query(query)
-            # Extract the values from the result records
-            if result:
-                details[key] = sorted([record["name"] for record in result])
-            else:
-                details[key] = []
         
-        print("Graph schema loaded.")
+        logging.info("Graph schema loaded.")
         return details
 
+    def _cached_metadata(self, key: tuple, query: str, params: dict = None) -> list:
+        """
+        Runs a metadata query through the TTL cache. Empty results are not cached,
+        since run_cypher_query also returns an empty list on errors.
+        """
+        cached = self._metadata_cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.metadata_ttl:
+            return list(cached[1])
+
+        results = self.run_cypher_query(query, params or {})
+        if results:
+            self._metadata_cache[key] = (time.monotonic(), results)
+        return list(results)
+
+    def invalidate_metadata_cache(self):
+        """Flushes cached metadata lookups, e.g. after new filings are ingested."""
+        self._metadata_cache.clear()
+        for callback in self._invalidation_callbacks:
+            callback()
+
+    def add_invalidation_callback(self, callback):
+        """Registers `callback()` to run whenever invalidate_metadata_cache() is called."""
+        self._invalidation_callbacks.append(callback)
+
     def get_unique_values_for_property(self, label: str, prop: str) -> list:
         """
         Gets all unique non-null values for a given property of a given node label.
         """
         query = f"MATCH (n:{label}) RETURN DISTINCT n.{prop} AS value"
         try:
-            results = self.run_cypher_query(query)
+            results = self._cached_metadata(("unique_values", label, prop), query)
             return [record["value"] for record in results if record["value"] is not None]
         except Exception as e:
-            print(f"Failed to get unique values for {label}.{prop}: {e}")
+            logging.error("Failed to get unique values for %s.%s: %s", label, prop, e)
             return []
 
+    def get_company_documents(self, company: str) -> list:
+        """
+        Gets the year/quarter/document type combinations available for a company.
+        """
+        query = """
+        MATCH (c:Company {name: $company})-[:HAS_YEAR]->(y:Year)-[:HAS_QUARTER]->(q:Quarter)-[:HAS_DOC]->(d:Document)
+        RETURN y.value as year, q.label as quarter, d.document_type as doc_type
+        ORDER BY y.value DESC, q.label
+        """
+        return self._cached_metadata(("company_documents", company), query, {"company": company})
+
     def close(self):
         """Closes the connection to the Neo4j database."""
         self.driver.close()
-        print("Neo4j connection closed.")
+        logging.info("Neo4j connection closed.")
 
 
 def run_cypher_query(driver, cypher_query, params={}):
@@ -1,7 +1,11 @@
-def format_plan_to_natural_language(analysis, query_type):
+def format_plan_to_natural_language(analysis, query_type, verbose=True):
     """
     Translates the agent's analysis and chosen query plan into a human-readable string.
+    Returns an empty string without formatting anything when `verbose` is False.
     """
+    if not verbose:
+        return ""
+
     sentences = ["Okay, here is my thought process and final plan to answer your request."]
 
     # 1. Companies
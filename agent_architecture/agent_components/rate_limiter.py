@@ -0,0 +1,72 @@
+"""
+Async Rate Limiter
+A leaky-bucket limiter used to pace concurrent LLM requests so that the fan-out in
+the map step stays inside the provider's rate-limit tier. Like the OpenAI cookbook's
+parallel request processor, it tracks request capacity (RPM) and, optionally, token
+capacity (TPM), and only sleeps when submitting would overflow either bucket.
+"""
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """
+    Tracks `available_request_capacity` and `available_token_capacity`, refilled
+    continuously at max_requests_per_minute / 60 and max_tokens_per_minute / 60 per
+    second. Both buckets start full. Instances are meant to be used from a single
+    event loop.
+    """
+    def __init__(self, max_requests_per_minute: float, max_tokens_per_minute: float = None):
+        self.max_requests_per_minute = float(max_requests_per_minute)
+        self.max_tokens_per_minute = float(max_tokens_per_minute) if max_tokens_per_minute else None
+        self.available_request_capacity = self.max_requests_per_minute
+        self.available_token_capacity = self.max_tokens_per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self.available_request_capacity = min(
+            self.max_requests_per_minute,
+            self.available_request_capacity + elapsed * self.max_requests_per_minute / 60.0
+        )
+        if self.max_tokens_per_minute:
+            self.available_token_capacity = min(
+                self.max_tokens_per_minute,
+                self.available_token_capacity + elapsed * self.max_tokens_per_minute / 60.0
+            )
+
+    async def acquire(self, token_count: int = 0):
+        """
+        Waits until one request and `token_count` tokens of capacity are available and
+        consumes them. Requests larger than the whole token bucket wait for a full bucket.
+        """
+        if self.max_tokens_per_minute:
+            token_count = min(float(token_count), self.max_tokens_per_minute)
+        else:
+            token_count = 0.0
+
+        while True:
+            self._refill()
+            has_request = self.available_request_capacity >= 1
+            has_tokens = not self.max_tokens_per_minute or self.available_token_capacity >= token_count
+            if has_request and has_tokens:
+                self.available_request_capacity -= 1
+                if self.max_tokens_per_minute:
+                    self.available_token_capacity -= token_count
+                return
+
+            wait = 0.0
+            if not has_request:
+                wait = (1 - self.available_request_capacity) * 60.0 / self.max_requests_per_minute
+            if not has_tokens:
+                wait = max(wait, (token_count - self.available_token_capacity) * 60.0 / self.max_tokens_per_minute)
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
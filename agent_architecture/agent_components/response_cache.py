@@ -0,0 +1,156 @@
+"""
+Response Cache
+A two-tier cache for LLM responses:
+  1. exact   - SHA-256 of (namespace, text) -> response, persisted in SQLite
+  2. semantic - optional; the embedding of `text` is compared against previously
+                cached texts in the same namespace and a stored response is reused
+                when the cosine similarity clears the threshold.
+
+A namespace should capture everything about a request other than the text itself
+(the call type, model and task list), so semantic matches never cross prompts.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import faiss
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "llm_responses.sqlite")
+DEFAULT_SIMILARITY_THRESHOLD = 0.97
+
+
+class ResponseCache:
+    """
+    Exact + semantic response cache. The semantic tier is only active when an
+    `embedder` (anything with a SentenceTransformer-style `encode`) is supplied.
+    Safe to call from worker threads (e.g. via asyncio.to_thread).
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, embedder=None,
+                 similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD):
+        self.path = path
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        # namespace -> (faiss.IndexFlatIP, [exact keys in index order])
+        self._semantic_indexes = {}
+        # (text, embedding) of the last text embedded; a miss in get() is normally
+        # followed by set() for the same text
+        self._last_embedding = None
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, namespace TEXT NOT NULL, value TEXT NOT NULL, "
+            "embedding BLOB, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_namespace ON responses(namespace)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Stable SHA-256 hex digest of any JSON-serializable parts."""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _embed(self, text: str) -> np.ndarray:
+        if self._last_embedding is not None and self._last_embedding[0] == text:
+            return self._last_embedding[1]
+        embedding = self.embedder.encode([text], normalize_embeddings=True)
+        embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+        self._last_embedding = (text, embedding)
+        return embedding
+
+    def _get_semantic_index(self, namespace: str):
+        """Returns the in-memory semantic index for a namespace, loading it from SQLite on first use."""
+        if namespace not in self._semantic_indexes:
+            rows = self._conn.execute(
+                "SELECT key, embedding FROM responses WHERE namespace = ? AND embedding IS NOT NULL",
+                (namespace,)
+            ).fetchall()
+            index, keys = None, []
+            if rows:
+                vectors = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                index = faiss.IndexFlatIP(vectors.shape[1])
+                index.add(vectors)
+                keys = [row[0] for row in rows]
+            self._semantic_indexes[namespace] = (index, keys)
+        return self._semantic_indexes[namespace]
+
+    def get(self, namespace: str, text: str, semantic: bool = True, similarity_threshold: float = None):
+        """
+        Returns the cached response for (namespace, text), or None on a miss.
+        `similarity_threshold` overrides the instance threshold for this lookup.
+        """
+        with self._lock:
+            value = self._lookup(namespace, text, semantic, similarity_threshold)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def _lookup(self, namespace: str, text: str, semantic: bool, similarity_threshold: float):
+        key = self.make_key(namespace, text)
+        row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row:
+            return row[0]
+        if not (semantic and self.embedder):
+            return None
+
+        index, keys = self._get_semantic_index(namespace)
+        if index is None or index.ntotal == 0:
+            return None
+        scores, positions = index.search(self._embed(text), 1)
+        if similarity_threshold is None:
+            similarity_threshold = self.similarity_threshold
+        if positions[0][0] < 0 or scores[0][0] < similarity_threshold:
+            return None
+        row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (keys[positions[0][0]],)).fetchone()
+        if row:
+            logging.info("Semantic cache hit (cosine=%.3f)", scores[0][0])
+            return row[0]
+        return None
+
+    def set(self, namespace: str, text: str, value: str, semantic: bool = True):
+        """Stores a response in the exact tier and, if enabled, the semantic tier."""
+        key = self.make_key(namespace, text)
+        with self._lock:
+            embedding = None
+            if semantic and self.embedder:
+                embedding = self._embed(text)
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, namespace, value, embedding, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, namespace, value, embedding.tobytes() if embedding is not None else None, time.time())
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logging.error("Failed to write response cache entry: %s", e)
+                return
+
+            if embedding is not None:
+                index, keys = self._get_semantic_index(namespace)
+                if index is None:
+                    index = faiss.IndexFlatIP(embedding.shape[1])
+                    self._semantic_indexes[namespace] = (index, keys)
+                if key not in keys:
+                    index.add(embedding)
+                    keys.append(key)
+
+    def stats(self) -> dict:
+        """Lookup counts since this cache was opened."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -3,84 +3,363 @@ Unified LLM Client
 This module provides a single client to interact with multiple LLM providers,
 mimicking the OpenAI client's API for compatibility.
 """
+import asyncio
 import json
+import logging
+import threading
+import weakref
+import httpx
 from config import LLMConfig
+from .response_cache import ResponseCache
+
+# Connection pool shared by all requests made through one provider client.
+# Keeping connections alive avoids a TCP + TLS handshake per LLM call.
+HTTP_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100)
+HTTP_TIMEOUT_SECONDS = 60.0
+
+# Anthropic has no JSON-object response format, so it is requested in the prompt
+ANTHROPIC_JSON_INSTRUCTION = "You MUST respond with a single, valid JSON object and nothing else."
+
+# Anthropic only reuses a prompt prefix that is explicitly marked as cacheable; the
+# system prompt is marked so static planner/synthesis instructions are read from the
+# cache (at a fraction of the input price and latency) on later calls. OpenAI caches
+# stable prefixes automatically.
+ANTHROPIC_CACHE_CONTROL = {"type": "ephemeral"}
+
+class _MockMessage:
+    """`message` / `delta` of an OpenAI-style choice."""
+    __slots__ = ("content",)
+
+    def __init__(self, content):
+        self.content = content
+
+class _MockChoice:
+    __slots__ = ("message",)
+
+    def __init__(self, message):
+        self.message = message
+
+class _MockResponse:
+    __slots__ = ("choices",)
+
+    def __init__(self, choices):
+        self.choices = choices
+
+class _MockChunkChoice:
+    __slots__ = ("delta",)
+
+    def __init__(self, delta):
+        self.delta = delta
+
+class _MockChunk:
+    __slots__ = ("choices",)
+
+    def __init__(self, choices):
+        self.choices = choices
 
 class MockCompletions:
     """A mock completions object to mimic the OpenAI client structure."""
     def __init__(self, client_instance):
         self._client = client_instance
 
-    def create(self, model: str, messages: list[dict], response_format: dict = None, temperature: float = 0.0):
-        """The unified method that calls the appropriate provider."""
-        return self._client._invoke(messages=messages, response_format=response_format)
+    def create(self, model: str, messages: list[dict], response_format: dict = None, temperature: float = 0.0,
+               no_cache: bool = False):
+        """
+        The unified method that calls the appropriate provider.
+        no_cache=True (implied by temperature > 0) bypasses the client's response cache.
+        """
+        return self._client._invoke(messages=messages, response_format=response_format,
+                                    no_cache=no_cache or temperature > 0)
+
+class MockAsyncCompletions:
+    """Async counterpart of MockCompletions, awaited from inside an event loop."""
+    def __init__(self, client_instance):
+        self._client = client_instance
+
+    async def create(self, model: str, messages: list[dict], response_format: dict = None, temperature: float = 0.0,
+                     stream: bool = False, no_cache: bool = False):
+        """
+        The unified async method that calls the appropriate provider.
+        With stream=True it returns an async iterator of chunks exposing `choices[0].delta.content`.
+        Streamed calls are never cached; see MockCompletions.create for no_cache.
+        """
+        return await self._client._ainvoke(messages=messages, response_format=response_format, stream=stream,
+                                           no_cache=no_cache or temperature > 0)
+
+class MockChat:
+    """Holds `completions`, mirroring the OpenAI client's `chat` attribute."""
+    __slots__ = ("completions",)
+
+    def __init__(self, completions):
+        self.completions = completions
 
 class UnifiedLLMClient:
     """
     A unified client that wraps multiple LLM providers under an OpenAI-compatible API.
     """
-    def __init__(self, config: LLMConfig):
+    def __init__(self, config: LLMConfig, cache: ResponseCache = None):
+        """
+        Args:
+            cache: Optional ResponseCache. Non-streamed completions are then stored in its
+                exact tier, keyed on (model, messages, response_format), and replayed
+                without a network call when the same request is made again.
+        """
         self.provider = config.provider
         self.model = config.model
         self.api_key = config.api_key
+        self.cache = cache
+        # Prompt-cache token counts reported by the provider, summed over non-streamed calls
+        self.prompt_cache_usage = {"cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        self._usage_lock = threading.Lock()
         self._client = self._initialize_client()
+        # Async SDK clients are bound to the event loop they were first used on,
+        # so keep one per loop (each asyncio.run() call creates a new loop).
+        self._async_clients = weakref.WeakKeyDictionary()
         # Expose the chat.completions.create() structure
-        self.chat = type("Chat", (), {"completions": MockCompletions(self)})()
+        self.chat = MockChat(MockCompletions(self))
+        # ...and an awaitable achat.completions.create() for concurrent callers
+        self.achat = MockChat(MockAsyncCompletions(self))
 
     def _initialize_client(self):
         if self.provider == "openai":
-            from openai import OpenAI
-            return OpenAI(api_key=self.api_key)
+            from openai import OpenAI, DefaultHttpxClient
+            return OpenAI(api_key=self.api_key, http_client=DefaultHttpxClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT_SECONDS))
         elif self.provider == "anthropic":
-            from anthropic import Anthropic
-            return Anthropic(api_key=self.api_key)
+            from anthropic import Anthropic, DefaultHttpxClient
+            return Anthropic(api_key=self.api_key, http_client=DefaultHttpxClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT_SECONDS))
         else:
             raise ValueError(f"Unsupported LLM provider: {self.provider}")
 
-    def _invoke(self, messages: list[dict], response_format: dict = None):
-        """Internal method to call the correct provider."""
+    def _get_async_client(self):
+        """Returns the async provider client for the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            if self.provider == "openai":
+                from openai import AsyncOpenAI
+                client = AsyncOpenAI(api_key=self.api_key, http_client=self._build_async_http_client())
+            elif self.provider == "anthropic":
+                from anthropic import AsyncAnthropic
+                client = AsyncAnthropic(api_key=self.api_key, http_client=self._build_async_http_client())
+            else:
+                raise ValueError(f"Unsupported LLM provider: {self.provider}")
+            self._async_clients[loop] = client
+        return client
+
+    def _build_async_http_client(self):
+        """
+        Uses the SDK's aiohttp transport when available (`pip install openai[aiohttp]` /
+        `anthropic[aiohttp]`), which holds up better than the default httpx pool under
+        many concurrent requests. Otherwise falls back to the SDK's httpx client with
+        the tuned connection limits.
+        """
         if self.provider == "openai":
-            return self._client.chat.completions.create(
+            import openai as sdk
+        else:
+            import anthropic as sdk
+
+        try:
+            return sdk.DefaultAioHttpClient(timeout=HTTP_TIMEOUT_SECONDS)
+        except (AttributeError, RuntimeError):
+            return sdk.DefaultAsyncHttpxClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT_SECONDS)
+
+    async def aclose(self):
+        """Closes the async client bound to the running event loop, if one was created."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    def _prepare_anthropic_request(self, messages: list[dict], response_format: dict = None):
+        """
+        Splits out the system prompt and adds the JSON instruction Anthropic needs.
+        Returns new lists and message dicts; the caller's `messages` are never modified,
+        so the same list can be retried or reused (e.g. as a cache key).
+        """
+        system_message = ""
+        if messages and messages[0]['role'] == 'system':
+            system_message = messages[0]['content']
+            messages = messages[1:]
+
+        # Anthropic doesn't have a direct JSON mode via an API param,
+        # so we instruct it in the prompt.
+        if response_format and response_format.get("type") == "json_object":
+            if messages and messages[-1]['role'] == 'user':
+                last = messages[-1]
+                messages = [*messages[:-1], {**last, 'content': f"{last['content']}\n\n{ANTHROPIC_JSON_INSTRUCTION}"}]
+            else:
+                messages = [*messages, {"role": "user", "content": ANTHROPIC_JSON_INSTRUCTION}]
+
+        return system_message, messages
+
+    @staticmethod
+    def _anthropic_system(system_message: str):
+        """The system prompt as a single text block marked as a cacheable prefix."""
+        if not system_message:
+            return system_message
+        return [{"type": "text", "text": system_message, "cache_control": ANTHROPIC_CACHE_CONTROL}]
+
+    def _record_prompt_cache_usage(self, response):
+        """Adds a response's prompt-cache token counts to prompt_cache_usage."""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        if self.provider == "anthropic":
+            created = getattr(usage, "cache_creation_input_tokens", None) or 0
+            read = getattr(usage, "cache_read_input_tokens", None) or 0
+        else:
+            # OpenAI only reports the cached share of the prompt
+            created = 0
+            read = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+        if created or read:
+            logging.debug("Prompt cache: %d token(s) written, %d read", created, read)
+            with self._usage_lock:
+                self.prompt_cache_usage["cache_creation_input_tokens"] += created
+                self.prompt_cache_usage["cache_read_input_tokens"] += read
+
+    @staticmethod
+    def _anthropic_schema_kwargs(response_format: dict = None) -> dict:
+        """
+        Anthropic has no json_schema response format; forcing a single tool whose input
+        schema is the requested schema gives the same structured output.
+        """
+        if not response_format or response_format.get("type") != "json_schema":
+            return {}
+        json_schema = response_format["json_schema"]
+        return {
+            "tools": [{
+                "name": json_schema["name"],
+                "description": json_schema.get("description", "Respond with the structured result."),
+                "input_schema": json_schema["schema"],
+            }],
+            "tool_choice": {"type": "tool", "name": json_schema["name"]},
+        }
+
+    @staticmethod
+    def _anthropic_content(response) -> str:
+        """Returns the text of an Anthropic response, or the forced tool input as JSON."""
+        for block in response.content:
+            if block.type == "tool_use":
+                return json.dumps(block.input)
+        return response.content[0].text
+
+    def _cache_key(self, messages: list[dict], response_format: dict = None, no_cache: bool = False):
+        """Returns (namespace, key) for a cacheable request, or None."""
+        if self.cache is None or no_cache:
+            return None
+        return "llm:" + self.model, ResponseCache.make_key(messages, response_format)
+
+    @staticmethod
+    def _response_content(response):
+        content = response.choices[0].message.content
+        return content if isinstance(content, str) else None
+
+    def _invoke(self, messages: list[dict], response_format: dict = None, no_cache: bool = False):
+        """Internal method to call the correct provider, going through the response cache if set."""
+        cache_key = self._cache_key(messages, response_format, no_cache)
+        if cache_key:
+            cached = self.cache.get(*cache_key, semantic=False)
+            if cached is not None:
+                logging.debug("LLM response cache hit (%s)", cache_key[1][:12])
+                return self._create_mock_response(cached)
+
+        response = self._invoke_provider(messages, response_format)
+        if cache_key and self._response_content(response) is not None:
+            self.cache.set(*cache_key, self._response_content(response), semantic=False)
+        return response
+
+    def _invoke_provider(self, messages: list[dict], response_format: dict = None):
+        if self.provider == "openai":
+            response = self._client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 response_format=response_format
             )
+            self._record_prompt_cache_usage(response)
+            return response
         elif self.provider == "anthropic":
-            system_message = ""
-            if messages and messages[0]['role'] == 'system':
-                system_message = messages[0]['content']
-                messages = messages[1:]
-            
-            # Anthropic doesn't have a direct JSON mode via an API param,
-            # so we instruct it in the prompt.
-            if response_format and response_format.get("type") == "json_object":
-                 if messages and messages[-1]['role'] == 'user':
-                    messages[-1]['content'] += "\n\nYou MUST respond with a single, valid JSON object and nothing else."
-                 else:
-                    messages.append({"role": "user", "content": "You MUST respond with a single, valid JSON object and nothing else."})
-
+            system_message, messages = self._prepare_anthropic_request(messages, response_format)
 
             response = self._client.messages.create(
                 model=self.model,
-                system=system_message,
+                system=self._anthropic_system(system_message),
                 messages=messages,
-                max_tokens=4000
+                max_tokens=4000,
+                **self._anthropic_schema_kwargs(response_format)
             )
+            self._record_prompt_cache_usage(response)
             # We need to wrap the response in a mock object to be compatible
-            content = response.content[0].text
+            content = self._anthropic_content(response)
+            return self._create_mock_response(content)
+
+    async def _ainvoke(self, messages: list[dict], response_format: dict = None, stream: bool = False,
+                       no_cache: bool = False):
+        """Async version of _invoke, using the provider's async SDK client."""
+        cache_key = self._cache_key(messages, response_format, no_cache or stream)
+        if cache_key:
+            cached = await asyncio.to_thread(self.cache.get, *cache_key, semantic=False)
+            if cached is not None:
+                logging.debug("LLM response cache hit (%s)", cache_key[1][:12])
+                return self._create_mock_response(cached)
+
+        response = await self._ainvoke_provider(messages, response_format, stream)
+        if cache_key and self._response_content(response) is not None:
+            await asyncio.to_thread(self.cache.set, *cache_key, self._response_content(response), semantic=False)
+        return response
+
+    async def _ainvoke_provider(self, messages: list[dict], response_format: dict = None, stream: bool = False):
+        client = self._get_async_client()
+        if self.provider == "openai":
+            response = await client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                response_format=response_format,
+                stream=stream
+            )
+            if not stream:
+                self._record_prompt_cache_usage(response)
+            return response
+        elif self.provider == "anthropic":
+            system_message, messages = self._prepare_anthropic_request(messages, response_format)
+
+            schema_kwargs = self._anthropic_schema_kwargs(response_format)
+            if stream and not schema_kwargs:
+                return self._astream_anthropic(client, system_message, messages)
+
+            response = await client.messages.create(
+                model=self.model,
+                system=self._anthropic_system(system_message),
+                messages=messages,
+                max_tokens=4000,
+                **schema_kwargs
+            )
+            self._record_prompt_cache_usage(response)
+            content = self._anthropic_content(response)
+            if stream:
+                # Tool input arrives as partial JSON, so structured output is sent as one chunk
+                return self._aiter_single_chunk(content)
             return self._create_mock_response(content)
-            
+
+    async def _astream_anthropic(self, client, system_message: str, messages: list[dict]):
+        """Re-yields Anthropic text deltas as OpenAI-style stream chunks."""
+        async with client.messages.stream(
+            model=self.model,
+            system=self._anthropic_system(system_message),
+            messages=messages,
+            max_tokens=4000
+        ) as response_stream:
+            async for text in response_stream.text_stream:
+                yield self._create_mock_chunk(text)
+
+    async def _aiter_single_chunk(self, content: str):
+        yield self._create_mock_chunk(content)
+
     def _create_mock_response(self, content: str):
         """Creates a mock response object that mimics the OpenAI structure."""
-        class MockChoice:
-            def __init__(self, content):
-                self.message = type("Message", (), {"content": content})()
-        
-        class MockResponse:
-            def __init__(self, content):
-                self.choices = [MockChoice(content)]
-        
-        return MockResponse(content)
-        
+        return _MockResponse([_MockChoice(_MockMessage(content))])
+
+    def _create_mock_chunk(self, content: str):
+        """Creates a mock stream chunk that mimics the OpenAI streaming structure."""
+        return _MockChunk([_MockChunkChoice(_MockMessage(content))])
+
     def get_provider_info(self) -> dict:
         return {"provider": self.provider, "model": self.model} 
\ No newline at end of file
@@ -2,19 +2,51 @@ import faiss
 import numpy as np
 import os
 import logging
-import json
+import orjson
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Vectors are L2-normalized and ranked by inner product (cosine similarity).
+# Small corpora are scanned exhaustively over int8-encoded vectors (a quarter of the
+# memory traffic of fp32, using FAISS's SIMD int8 kernels). Large corpora use an IVF
+# index with ~4*sqrt(N) lists and product quantization (64 sub-quantizers of 8 bits),
+# which needs roughly 39 training points per list. Everything in between uses an HNSW graph.
+FLAT_MAX_VECTORS = 10_000
+PQ_M = 64
+PQ_NBITS = 8
+IVF_TRAINING_POINTS_PER_LIST = 39
+HNSW_M = 32
+# Candidate list size while building the HNSW graph; higher gives a better graph (recall)
+HNSW_EF_CONSTRUCTION = 200
+# Search-time knobs: IVF lists probed per query, and HNSW candidate list size
+IVF_NPROBE = 32
+HNSW_EF_SEARCH = 64
+
 class VectorDB:
     """A FAISS-based vector database for similarity search."""
 
-    def __init__(self):
-        """Initializes the VectorDB."""
+    def __init__(self, use_gpu: bool = True):
+        """
+        Initializes the VectorDB.
+
+        Args:
+            use_gpu: Serve searches from a GPU copy of the index when a faiss-gpu build and
+                at least one GPU are available. The CPU index is kept for persistence.
+        """
+        self.use_gpu = use_gpu
         self.index_path = "faiss_index_zion_mda.bin"
         self.id_map_path = "faiss_index_zion_mda_mapping.json"
+        # Integer vertex IDs are stored as an int64 .npy instead, memory-mapped on load
+        self.id_map_npy_path = "faiss_index_zion_mda_mapping.npy"
+        # FAISS does not persist search-time parameters, so they are stored alongside
+        self.search_params_path = "faiss_index_zion_mda_search_params.json"
+        self.search_params = {}
         self.index = None
+        # CPU original of a GPU-resident self.index (None while self.index is on the CPU)
+        self._cpu_index = None
         self.index_to_vertex_id = []
+        # index_to_vertex_id as an array, for one-shot gathers in search_batch
+        self._id_map_arr = np.asarray([])
         # Automatically load the index upon initialization
         self.load_index()
 
@@ -28,58 +60,181 @@ class VectorDB:
 
         logging.info(f"Building FAISS index with {len(section_data)} vectors...")
         
-        embeddings = np.array([item['embedding'] for item in section_data]).astype('float32')
-        dimension = embeddings.shape[1]
-        
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index_to_vertex_id = [item['id'] for item in section_data]
+        # Fill a preallocated matrix rather than building an intermediate list of rows
+        num_vectors, dimension = len(section_data), len(section_data[0]['embedding'])
+        embeddings = np.empty((num_vectors, dimension), dtype=np.float32)
+        index_to_vertex_id = [None] * num_vectors
+        for i, item in enumerate(section_data):
+            embeddings[i] = item['embedding']
+            index_to_vertex_id[i] = item['id']
+        faiss.normalize_L2(embeddings)
+
+        index_description = self._choose_index_factory(num_vectors, dimension)
+        logging.info(f"Using FAISS index type '{index_description}'.")
+        self.index = faiss.index_factory(dimension, index_description, faiss.METRIC_INNER_PRODUCT)
+        if isinstance(self.index, faiss.IndexHNSW):
+            # HNSW needs no training, only the build-time search depth
+            self.index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        elif not self.index.is_trained:
+            self.index.train(embeddings)
+        self.index_to_vertex_id = index_to_vertex_id
+        self._id_map_arr = np.asarray(index_to_vertex_id)
         self.index.add(embeddings)
+        self._cpu_index = None
+        self.search_params = self._default_search_params()
+        self.save_index()
+        self._move_to_gpu()
+        self._configure_search()
         
         logging.info(f"FAISS index built successfully. Total vectors indexed: {self.index.ntotal}")
-        self.save_index()
+
+    @staticmethod
+    def _ivf_nlist(num_vectors: int) -> int:
+        return max(1, int(4 * np.sqrt(num_vectors)))
+
+    @classmethod
+    def _choose_index_factory(cls, num_vectors: int, dimension: int) -> str:
+        """Picks an int8 flat scan for small corpora, IVF-PQ for large ones and HNSW otherwise."""
+        if num_vectors < FLAT_MAX_VECTORS:
+            return "SQ8"
+        nlist = cls._ivf_nlist(num_vectors)
+        if num_vectors >= IVF_TRAINING_POINTS_PER_LIST * nlist and dimension % PQ_M == 0:
+            return f"IVF{nlist},PQ{PQ_M}x{PQ_NBITS}"
+        return f"HNSW{HNSW_M}"
+
+    def _default_search_params(self) -> dict:
+        if isinstance(self.index, faiss.IndexIVF):
+            return {"nprobe": IVF_NPROBE}
+        if isinstance(self.index, faiss.IndexHNSW):
+            return {"efSearch": HNSW_EF_SEARCH}
+        return {}
+
+    def _move_to_gpu(self):
+        """
+        Replaces self.index with a copy on all visible GPUs, keeping the CPU index in
+        self._cpu_index. Index types FAISS cannot run on GPU (HNSW, the flat SQ8 scan)
+        and CPU-only FAISS builds keep searching on the CPU.
+        """
+        if not self.use_gpu or self.index is None or not hasattr(faiss, "StandardGpuResources"):
+            return
+        if faiss.get_num_gpus() == 0:
+            return
+        cloner_options = faiss.GpuMultipleClonerOptions()
+        # 64 PQ sub-quantizers need float16 lookup tables to fit in GPU shared memory
+        cloner_options.useFloat16 = True
+        try:
+            gpu_index = faiss.index_cpu_to_all_gpus(self.index, co=cloner_options)
+        except RuntimeError as e:
+            logging.info(f"Index type not supported on GPU ({e}); searching on the CPU.")
+            return
+        self._cpu_index, self.index = self.index, gpu_index
+        logging.info(f"FAISS index moved to {faiss.get_num_gpus()} GPU(s).")
+
+    def _configure_search(self):
+        """Applies the search-time parameters, which FAISS does not persist with the index."""
+        if self._cpu_index is not None:
+            parameter_space = faiss.GpuParameterSpace()
+        else:
+            parameter_space = faiss.ParameterSpace()
+        for name, value in self.search_params.items():
+            parameter_space.set_index_parameter(self.index, name, value)
 
     def save_index(self):
         """Saves the FAISS index and the ID map to disk."""
         logging.info(f"Saving FAISS index to {self.index_path}")
-        faiss.write_index(self.index, self.index_path)
+        faiss.write_index(self._cpu_index if self._cpu_index is not None else self.index, self.index_path)
         
-        with open(self.id_map_path, 'w') as f:
-            json.dump(self.index_to_vertex_id, f)
-        logging.info("Index and ID map saved.")
+        if all(isinstance(vertex_id, (int, np.integer)) for vertex_id in self.index_to_vertex_id):
+            np.save(self.id_map_npy_path, np.asarray(self.index_to_vertex_id, dtype=np.int64))
+            stale_path = self.id_map_path
+        else:
+            with open(self.id_map_path, 'wb') as f:
+                f.write(orjson.dumps(list(self.index_to_vertex_id)))
+            stale_path = self.id_map_npy_path
+        # Only one ID map format may exist, so load_index never picks up an outdated one
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+        with open(self.search_params_path, 'wb') as f:
+            f.write(orjson.dumps(self.search_params))
+        logging.info("Index, ID map and search parameters saved.")
+
+    @staticmethod
+    def _read_index(path: str):
+        """
+        Memory-maps the index so the OS page cache serves vectors on demand and worker
+        processes share them. FAISS builds without mmap support for the index type fall
+        back to a regular read.
+        """
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except (AttributeError, RuntimeError) as e:
+            logging.info(f"Memory-mapped read unavailable ({e}); reading FAISS index into memory.")
+            return faiss.read_index(path)
 
     def load_index(self):
         """Loads the FAISS index and ID map from disk."""
         try:
             logging.info(f"Loading FAISS index from {self.index_path}")
-            self.index = faiss.read_index(self.index_path)
+            self.index = self._read_index(self.index_path)
+            self._cpu_index = None
+            self.search_params = self._default_search_params()
+            if os.path.exists(self.search_params_path):
+                with open(self.search_params_path, 'rb') as f:
+                    self.search_params.update(orjson.loads(f.read()))
+            self._move_to_gpu()
+            self._configure_search()
             
-            with open(self.id_map_path, 'r') as f:
-                self.index_to_vertex_id = json.load(f)
+            if os.path.exists(self.id_map_npy_path):
+                self.index_to_vertex_id = np.load(self.id_map_npy_path, mmap_mode='r')
+            else:
+                with open(self.id_map_path, 'rb') as f:
+                    self.index_to_vertex_id = orjson.loads(f.read())
+            self._id_map_arr = np.asarray(self.index_to_vertex_id)
             
             logging.info(f"FAISS index with {self.index.ntotal} vectors loaded successfully.")
         except Exception as e:
             logging.error(f"Failed to load FAISS index: {e}")
             self.index = None
+            self._cpu_index = None
             self.index_to_vertex_id = []
+            self._id_map_arr = np.asarray([])
+            self.search_params = {}
 
     def search(self, query_embedding: np.ndarray, k: int) -> tuple[list, list]:
         """
         Searches the FAISS index for the k-nearest neighbors to the query embedding.
         """
+        distances, section_ids = self.search_batch(np.reshape(query_embedding, (1, -1)), k)
+        if not distances:
+            return [], []
+        return distances[0], section_ids[0]
+
+    def search_batch(self, query_embeddings: np.ndarray, k: int) -> tuple[list[list], list[list]]:
+        """
+        Searches the index for a whole (n, d) matrix of query embeddings in one call.
+        Returns per-query lists of distances and section IDs, in query order.
+        """
         if self.index is None:
             logging.error("Cannot search: FAISS index is not loaded or built.")
             return [], []
 
-        query_embedding = np.array([query_embedding]).astype('float32')
-        distances, indices = self.index.search(query_embedding, k)
-        
-        # Also, FAISS can return -1 for indices if it can't find k neighbors.
-        valid_indices = indices[0][indices[0] != -1]
-        
-        # Map the FAISS indices back to our original vertex IDs
-        # Use .size to check for emptiness in a numpy array
-        if valid_indices.size > 0:
-            section_ids = [self.index_to_vertex_id[i] for i in valid_indices]
-            return distances[0][indices[0] != -1].tolist(), section_ids
-        else:
-            return [], [] 
\ No newline at end of file
+        # FAISS requires a row-major float32 matrix
+        query_embeddings = np.array(query_embeddings, dtype=np.float32, order='C', copy=True)
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            # Cosine similarity: queries must be unit length like the indexed vectors
+            faiss.normalize_L2(query_embeddings)
+        distances, indices = self.index.search(query_embeddings, k)
+
+        id_map = self._id_map_arr
+        if (indices >= 0).all():
+            # Common case: every query found k neighbors, so no masking is needed
+            return distances.tolist(), id_map[indices].tolist()
+
+        all_distances, all_section_ids = [], []
+        for row_distances, row_indices in zip(distances, indices):
+            # FAISS can return -1 for indices if it can't find k neighbors.
+            valid = row_indices != -1
+            # Map the FAISS indices back to our original vertex IDs in one gather
+            all_section_ids.append(id_map[row_indices[valid]].tolist())
+            all_distances.append(row_distances[valid].tolist())
+        return all_distances, all_section_ids
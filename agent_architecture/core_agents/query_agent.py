@@ -1,10 +1,12 @@
 import os
-import json
+import asyncio
+import orjson
 import logging
 import sys
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
 from neo4j import GraphDatabase
-from typing import List
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
 
 # Add parent directory to path for config import
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -14,23 +16,44 @@ from config import get_config, ConfigManager
 from agent_components.unified_llm_client import UnifiedLLMClient
 from agent_components.neo4j_executor import Neo4jExecutor
 from agent_components.improved_query_planner import ImprovedQueryPlanner
-from agent_components.answer_synthesizer import map_summarize_sections, reduce_and_synthesize_answer
+from agent_components.answer_synthesizer import map_summarize_sections, reduce_and_synthesize_answer, stream_synthesized_answer
 from agent_components.answer_critic import evaluate_and_suggest_improvements
 from agent_components.cypher_builder import CypherQueryBuilder
 from agent_components.vector_db import VectorDB
+from agent_components.response_cache import ResponseCache
+from agent_components.embedding_cache import CachedEmbedder
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# This query assumes `s.text` holds the text and `s.name` the section name.
+# It's crucial this matches your graph schema. Sections without text are dropped in
+# the database (size(null) is null), so they never reach the map step as empty LLM calls.
+SECTION_TEXT_QUERY = """
+MATCH (s:Section) WHERE id(s) IN $section_ids AND size(s.text) > 0
+RETURN s.text AS text, s.name as filename
+"""
+NO_SECTION_TEXT_MESSAGE = ("I found the right documents, but I couldn't extract any text from them. "
+                           "The data might be missing or in an unexpected format.")
+
+@lru_cache(maxsize=4)
+def _get_st_model(model_name: str, device: str = None) -> SentenceTransformer:
+    """Loads each embedding model once per process, shared by every agent instance."""
+    return SentenceTransformer(model_name, device=device)
+
 class Neo4jQueryAgent:
     """
     Clean, production-ready Neo4j Query Agent with streamlined architecture.
     Uses the new ImprovedQueryPlanner for efficient, single-step planning and metadata queries.
     """
 
-    def __init__(self, config=None, llm_client=None):
+    def __init__(self, config=None, llm_client=None, answer_review_rounds: int = 0):
         """
         Initialize the Neo4jQueryAgent.
+
+        Args:
+            answer_review_rounds: How many times the critic may reject a synthesized answer
+                before the latest draft is returned. 0 disables the critic review.
         """
         logging.info("Initializing Neo4jQueryAgent with ImprovedQueryPlanner")
         
@@ -38,16 +61,24 @@ class Neo4jQueryAgent:
         if not ConfigManager.validate_config(self.config):
             raise ValueError("Invalid configuration provided")
         
-        self.llm_client = llm_client or UnifiedLLMClient(self.config.llm)
-        self.model = SentenceTransformer(self.config.embedding_model)
+        self.model = _get_st_model(self.config.embedding_model)
+        # Every embedding the agent needs (cache lookups, hybrid search) goes through one
+        # LRU, so a query text is encoded once however many components look it up
+        self.embedder = CachedEmbedder(self.model, self.config.embedding_model)
+        # Cache for planner and map-step LLM responses. Only planner lookups use the semantic
+        # tier (reusing the embedding model); map-step results are keyed on their exact text.
+        # A client created here also caches every other non-streamed completion in its exact tier.
+        self.response_cache = ResponseCache(embedder=self.embedder)
+        self.llm_client = llm_client or UnifiedLLMClient(self.config.llm, cache=self.response_cache)
         self.vector_db = VectorDB()
-        self.cypher_builder = CypherQueryBuilder(model=self.model, vector_db=self.vector_db)
+        self.cypher_builder = CypherQueryBuilder(model=self.embedder, vector_db=self.vector_db)
         self.neo4j_executor = Neo4jExecutor(
             uri=self.config.database.uri, 
             user=self.config.database.user, 
             password=self.config.database.password
         )
-        self.query_planner = ImprovedQueryPlanner(self.llm_client, self.neo4j_executor)
+        self.query_planner = ImprovedQueryPlanner(self.llm_client, self.neo4j_executor, cache=self.response_cache)
+        self.answer_review_rounds = answer_review_rounds
         
         logging.info("Neo4jQueryAgent initialized successfully")
 
@@ -60,107 +91,216 @@ class Neo4jQueryAgent:
         logging.info(f"🚀 Processing query with dynamic extraction plan: '{query}'")
         
         try:
-            # === STAGE 1: DYNAMIC PLAN GENERATION ===
-            # The new planner returns a single, comprehensive JSON object that guides the entire process.
-            plan = self.query_planner.create_plan(query)
-
-            if not plan:
-                return "I'm sorry, I couldn't create a plan to answer your query. This could be because no relevant documents were found for the entities you mentioned. Please try rephrasing."
-
-            # === STAGE 2: EXECUTE PLAN ===
-            plan_type = plan.get('plan_type')
-            logging.info(f"--- Executing Plan (Type: {plan_type}) ---")
-
-            # Case 1: The plan is a direct metadata query.
-            if plan_type == "metadata":
-                cypher_query = plan.get("cypher_query")
-                if not cypher_query:
-                    logging.warning("Metadata plan is missing the cypher_query.")
-                    return "I identified this as a metadata query, but failed to construct the database query."
-                
-                # Execute and get raw results, which are the final answer.
-                results = self.neo4j_executor.run_cypher_query(cypher_query, {})
-                return json.dumps(results, indent=2)
-
-            # Case 2: The plan is a content extraction workflow.
-            elif plan_type == "content_extraction":
-                section_ids = plan.get("sections_to_retrieve")
-                if not section_ids:
-                    logging.warning("Content extraction plan has no sections to retrieve.")
-                    return "I created a plan, but it did not specify which document sections to analyze. Please try your query again."
-                
-                # Retrieve the full text for the specified sections
-                logging.info(f"Retrieving text for {len(section_ids)} specified section(s)...")
-                # This query assumes `s.text` holds the text and `s.name` the section name.
-                # It's crucial this matches your graph schema.
-                cypher_query = """
-                MATCH (s:Section) WHERE id(s) IN $section_ids
-                RETURN s.text AS text, s.name as filename
-                """
-                results = self.neo4j_executor.run_cypher_query(cypher_query, params={"section_ids": section_ids})
-
-                if not results:
-                    logging.warning("No text could be retrieved for the specified section IDs.")
-                    return "I found the right documents, but I couldn't extract any text from them. The data might be missing or in an unexpected format."
-
-                # === STAGE 3: SYNTHESIZE FINAL ANSWER (with Map-Reduce and Guided Extraction) ===
-                logging.info("--- Preparing for Final Answer Synthesis ---")
-                
-                # The extraction checklist and analysis goal come directly from our dynamic plan
-                extraction_checklist = plan.get("extraction_checklist")
-                analysis_goal = plan.get("analysis_goal")
-
-                # The map-reduce logic remains, but it's now guided by the extraction checklist
-                synthesis_input = self._guided_map_reduce(results, query, extraction_checklist)
-
-                # The final synthesis step is now guided by the analysis goal
-                final_answer = reduce_and_synthesize_answer(
-                    llm_client=self.llm_client,
-                    query=query,
-                    results=synthesis_input,
-                    analysis_goal=analysis_goal
-                )
-                
-                logging.info("Query processed successfully")
-                return final_answer
+            answer, plan = self._plan_and_execute(query)
+            if answer is not None:
+                return answer
+
+            # Map and reduce share one event loop, so they also share the async HTTP pool
+            final_answer = asyncio.run(self._synthesize_answer(
+                self._stream_sections(plan["sections_to_retrieve"]), query,
+                plan.get("extraction_checklist"), plan.get("analysis_goal")
+            ))
             
-            else:
-                logging.error(f"Unknown plan type encountered: {plan_type}")
-                return "I encountered an unknown plan type and could not proceed."
+            logging.info("Query processed successfully")
+            return final_answer
             
         except Exception as e:
             logging.error(f"Error processing query: {e}", exc_info=True)
             return f"I encountered an unexpected error while processing your query: {str(e)}"
 
-    def _guided_map_reduce(self, documents: List[dict], user_query: str, extraction_checklist: List[dict]) -> List[dict]:
+    def run_stream(self, query: str) -> Iterator[str]:
         """
-        Performs the map-reduce process, passing the dynamic extraction checklist
-        to the mapping function.
+        Same workflow as run(), but yields the final answer as text deltas while the reduce
+        step is still generating it. Answers that are not synthesized (metadata results,
+        planning errors) and answers under critic review, which may replace the draft, are
+        yielded in one piece.
+        """
+        logging.info(f"🚀 Streaming query with dynamic extraction plan: '{query}'")
+
+        try:
+            answer, plan = self._plan_and_execute(query)
+            if answer is None and self.answer_review_rounds > 0:
+                answer = asyncio.run(self._synthesize_answer(
+                    self._stream_sections(plan["sections_to_retrieve"]), query,
+                    plan.get("extraction_checklist"), plan.get("analysis_goal")
+                ))
+        except Exception as e:
+            logging.error(f"Error processing query: {e}", exc_info=True)
+            answer = f"I encountered an unexpected error while processing your query: {str(e)}"
+        if answer is not None:
+            yield answer
+            return
+
+        # The async pipeline is driven one delta at a time on a private event loop, so
+        # callers can consume it from ordinary synchronous code
+        loop = asyncio.new_event_loop()
+        deltas = self._stream_answer(
+            self._stream_sections(plan["sections_to_retrieve"]), query,
+            plan.get("extraction_checklist"), plan.get("analysis_goal")
+        )
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(deltas.__anext__())
+                except StopAsyncIteration:
+                    break
+            logging.info("Query processed successfully")
+        except Exception as e:
+            logging.error(f"Error processing query: {e}", exc_info=True)
+            yield f"I encountered an unexpected error while processing your query: {str(e)}"
+        finally:
+            loop.run_until_complete(deltas.aclose())
+            loop.close()
+
+    def _plan_and_execute(self, query: str) -> Tuple[Optional[str], Optional[dict]]:
+        """
+        Creates the plan and runs every step that comes before answer synthesis.
+        Returns (answer, None) when the query is answered without synthesis (metadata
+        results or a message explaining why no answer could be produced), and
+        (None, plan) for a content extraction plan whose sections should be synthesized.
         """
-        TOKEN_ESTIMATE_PER_CHAR = 4
-        MAX_CONTEXT_CHARACTERS = 180000 
+        # === STAGE 1: DYNAMIC PLAN GENERATION ===
+        # The new planner returns a single, comprehensive JSON object that guides the entire process.
+        plan = self.query_planner.create_plan(query)
+
+        if not plan:
+            return "I'm sorry, I couldn't create a plan to answer your query. This could be because no relevant documents were found for the entities you mentioned. Please try rephrasing.", None
+
+        # === STAGE 2: EXECUTE PLAN ===
+        plan_type = plan.get('plan_type')
+        logging.info(f"--- Executing Plan (Type: {plan_type}) ---")
+
+        # Case 1: The plan is a direct metadata query.
+        if plan_type == "metadata":
+            cypher_query = plan.get("cypher_query")
+            if not cypher_query:
+                logging.warning("Metadata plan is missing the cypher_query.")
+                return "I identified this as a metadata query, but failed to construct the database query.", None
+            
+            # Execute and get raw results, which are the final answer.
+            results = self.neo4j_executor.run_cypher_query(cypher_query, {})
+            return orjson.dumps(results, option=orjson.OPT_INDENT_2).decode(), None
+
+        # Case 2: The plan is a content extraction workflow.
+        elif plan_type == "content_extraction":
+            section_ids = plan.get("sections_to_retrieve")
+            if not section_ids:
+                logging.warning("Content extraction plan has no sections to retrieve.")
+                return "I created a plan, but it did not specify which document sections to analyze. Please try your query again.", None
+            
+            # The full text for the specified sections is streamed from Neo4j straight
+            # into the map step, so the first LLM calls start with the first row.
+            logging.info(f"Streaming text for {len(section_ids)} specified section(s)...")
 
-        # Robustly calculate total characters, handling None values for text
-        total_chars = sum(len(doc.get('text') or '') for doc in documents)
+            # === STAGE 3: SYNTHESIZE FINAL ANSWER (with Map-Reduce and Guided Extraction) ===
+            # The extraction checklist and analysis goal come directly from our dynamic plan
+            logging.info("--- Preparing for Final Answer Synthesis ---")
+            return None, plan
         
-        # If context is too large, perform the "Map" step with the checklist
-        if total_chars > MAX_CONTEXT_CHARACTERS:
-            logging.warning(f"Context size ({total_chars} chars) exceeds threshold. Applying guided map-reduce summarization.")
-            # Pass the checklist to the summarizer
-            return map_summarize_sections(
-                client=self.llm_client,
-                documents=documents,
-                user_query=user_query,
-                extraction_checklist=extraction_checklist
+        else:
+            logging.error(f"Unknown plan type encountered: {plan_type}")
+            return "I encountered an unknown plan type and could not proceed.", None
+
+    async def _stream_sections(self, section_ids: List[int]) -> AsyncIterator[dict]:
+        """Yields {"text", "filename"} documents as Neo4j returns the section rows."""
+        rows = self.neo4j_executor.arun_cypher_query_iter(
+            SECTION_TEXT_QUERY, {"section_ids": section_ids}, keys=("text", "filename")
+        )
+        async for text, filename in rows:
+            yield {"text": text, "filename": filename}
+
+    async def _synthesize_answer(self, documents: AsyncIterator[dict], user_query: str,
+                                 extraction_checklist: List[dict], analysis_goal: str) -> str:
+        """
+        Runs the guided map step followed by the final reduce step inside a single event loop.
+        """
+        try:
+            # The map-reduce logic remains, but it's now guided by the extraction checklist
+            synthesis_input = await self._guided_map_reduce(documents, user_query, extraction_checklist)
+            if not synthesis_input:
+                logging.warning("No text could be retrieved for the specified section IDs.")
+                return NO_SECTION_TEXT_MESSAGE
+
+            # The final synthesis step is now guided by the analysis goal
+            answer = await reduce_and_synthesize_answer(
+                llm_client=self.llm_client,
+                query=user_query,
+                results=synthesis_input,
+                analysis_goal=analysis_goal
             )
-        
-        logging.info("Context size is within limits. Proceeding with direct synthesis.")
-        # If not too large, we still need to process it to get structured data
-        return map_summarize_sections(
+            if self.answer_review_rounds > 0:
+                answer = await self._review_answer(answer, synthesis_input, user_query, analysis_goal)
+            return answer
+        finally:
+            await self.llm_client.aclose()
+
+    async def _stream_answer(self, documents: AsyncIterator[dict], user_query: str,
+                             extraction_checklist: List[dict], analysis_goal: str) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of _synthesize_answer without the critic review: the map step
+        runs to completion, then the reduce step's text deltas are yielded as they arrive.
+        """
+        try:
+            synthesis_input = await self._guided_map_reduce(documents, user_query, extraction_checklist)
+            if not synthesis_input:
+                logging.warning("No text could be retrieved for the specified section IDs.")
+                yield NO_SECTION_TEXT_MESSAGE
+                return
+
+            async for delta in stream_synthesized_answer(
+                llm_client=self.llm_client,
+                query=user_query,
+                results=synthesis_input,
+                analysis_goal=analysis_goal
+            ):
+                yield delta
+        finally:
+            await self.llm_client.aclose()
+
+    async def _review_answer(self, answer: str, synthesis_input: List[dict], user_query: str, analysis_goal: str) -> str:
+        """
+        Critique -> redraft loop. The critic evaluates the current answer; on a REFINE
+        verdict the answer is redrafted with the critic's feedback in the reduce prompt.
+        A failed redraft keeps the current answer.
+        """
+        context = "\n\n".join(res.get('text', '') for res in synthesis_input)
+        for round_number in range(1, self.answer_review_rounds + 1):
+            evaluation = await evaluate_and_suggest_improvements(
+                self.llm_client, user_query, answer, context, cache=self.response_cache
+            )
+            if evaluation.get("decision") != "REFINE":
+                logging.info(f"Critic accepted the answer in review round {round_number}.")
+                return answer
+
+            feedback = evaluation.get("feedback")
+            logging.info(f"Critic requested a refinement in round {round_number}: {feedback}")
+            try:
+                answer = await reduce_and_synthesize_answer(
+                    llm_client=self.llm_client,
+                    query=user_query,
+                    results=synthesis_input,
+                    analysis_goal=analysis_goal,
+                    feedback=feedback
+                )
+            except Exception as e:
+                logging.error(f"Redraft failed in review round {round_number}; keeping the current answer: {e}")
+                return answer
+        return answer
+
+    async def _guided_map_reduce(self, documents: AsyncIterator[dict], user_query: str,
+                                 extraction_checklist: List[dict]) -> List[dict]:
+        """
+        Performs the map-reduce process, passing the dynamic extraction checklist
+        to the mapping function. Documents of any total size go through the map step
+        (it is what produces the structured data), so they are consumed as a stream
+        rather than measured up front.
+        """
+        return await map_summarize_sections(
             client=self.llm_client,
             documents=documents,
             user_query=user_query,
-            extraction_checklist=extraction_checklist
+            extraction_checklist=extraction_checklist,
+            cache=self.response_cache
         )
 
     def close(self):
@@ -168,6 +308,8 @@ class Neo4jQueryAgent:
         if hasattr(self, 'neo4j_executor'):
             self.neo4j_executor.close()
             logging.info("Neo4j connection closed")
+        if hasattr(self, 'response_cache'):
+            self.response_cache.close()
 
     def get_config_info(self) -> dict:
         """Get information about current configuration"""
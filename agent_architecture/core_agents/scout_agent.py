@@ -1,21 +1,27 @@
+from collections import Counter
+
 from neo4j import GraphDatabase
 
-def generate_cypher_for_raw_scout(query_embedding, excluded_docs, top_k=3):
-    """Generates the Cypher query for the 'raw scout' phase."""
+def generate_cypher_for_raw_scout(query_embeddings, excluded_docs, top_k=3):
+    """
+    Generates the Cypher query for the 'raw scout' phase. All concept embeddings are
+    searched in the same query (one vector-index lookup per embedding, one round trip).
+    """
     # We now check if the excluded_docs list is empty to avoid an unnecessary WHERE clause.
     where_clause = ""
     if excluded_docs:
         where_clause = "WHERE s.filename NOT IN $excluded_docs"
 
     query = f"""
-    CALL db.index.vector.queryNodes('section_embeddings', {top_k}, $query_embedding)
+    UNWIND $query_embeddings AS query_embedding
+    CALL db.index.vector.queryNodes('section_embeddings', {top_k}, query_embedding)
     YIELD node AS s, score
     WITH s, score
     {where_clause}
     RETURN s.filename AS filename, s.section AS section_name, score
     ORDER BY score DESC
     """
-    params = {"query_embedding": query_embedding, "excluded_docs": excluded_docs}
+    params = {"query_embeddings": query_embeddings, "excluded_docs": excluded_docs}
     return query, params
 
 def find_relevant_sections(driver: GraphDatabase.driver, query_embedding, excluded_docs=[]):
@@ -24,13 +30,15 @@ def find_relevant_sections(driver: GraphDatabase.driver, query_embedding, exclud
     
     Args:
         driver: The Neo4j database driver.
-        query_embedding: The vector embedding for the user's concept.
+        query_embedding: The vector embedding for the user's concept, or a list of
+            embeddings for several concepts, which are scouted in a single query.
 
     Returns:
         A list of the most relevant section names (e.g., ['Financials', 'Risk Factors']).
     """
     # === Query 1: Get the raw scout data for visibility ===
-    raw_scout_query, params = generate_cypher_for_raw_scout(query_embedding, excluded_docs=excluded_docs)
+    query_embeddings = query_embedding if hasattr(query_embedding[0], '__len__') else [query_embedding]
+    raw_scout_query, params = generate_cypher_for_raw_scout(query_embeddings, excluded_docs=excluded_docs)
     
     print("\n--- Scout Phase: Identifying relevant section types ---")
     print("Step 1/2: Running raw scout query to find top 10 candidate documents...")
@@ -51,18 +59,12 @@ def find_relevant_sections(driver: GraphDatabase.driver, query_embedding, exclud
     # This step is now done in Python for clarity, using the data from the first query.
     print("\nStep 2/2: Tallying results to determine best section types...")
     
-    # Count occurrences of each section type from the raw results
-    section_counts = {}
+    # Weight each section type by the scores of the candidates it appeared in, so that
+    # frequency and relevance both count, and take the top 3 most relevant section types
+    section_scores = Counter()
     for doc in raw_candidates:
-        section = doc['section_name']
-        section_counts[section] = section_counts.get(section, 0) + 1
-        
-    # Sort the sections by how many times they appeared in the top 10
-    # This gives us the most frequently relevant section types
-    sorted_sections = sorted(section_counts.items(), key=lambda item: item[1], reverse=True)
-    
-    # We will return the top 3 most frequent section types
-    top_section_names = [section[0] for section in sorted_sections[:3]]
+        section_scores[doc['section_name']] += doc['score']
+    top_section_names = [section for section, _ in section_scores.most_common(3)]
     
     if top_section_names:
         print(f"Scout Phase identified the following section types as most relevant: {top_section_names}")
@@ -1,7 +1,42 @@
 import os
-import json
+import orjson
+import multiprocessing as mp
+from functools import lru_cache
 import tiktoken
 
+# Per-worker tokenizer, created once by _init_worker
+_encoding = None
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    return tiktoken.get_encoding("cl100k_base")
+
+def _init_worker():
+    global _encoding
+    try:
+        _encoding = _get_encoding()
+    except Exception:
+        # As a fallback, let's use a simple word count.
+        _encoding = None
+
+def _count_one(file_path):
+    """Returns (file_name, token_count) for one JSON file, or (file_name, None) if it fails."""
+    file_name = os.path.basename(file_path)
+    try:
+        with open(file_path, 'rb') as f:
+            data = orjson.loads(f.read())
+            text = data.get("text", "")
+            if _encoding:
+                token_count = len(_encoding.encode(text))
+            else:
+                token_count = len(text.split())
+            return file_name, token_count
+    except orjson.JSONDecodeError:
+        print(f"Warning: Could not decode JSON from {file_name}. Skipping.")
+    except Exception as e:
+        print(f"Error processing file {file_name}: {e}")
+    return file_name, None
+
 def count_tokens_in_files():
     """
     Counts the tokens in each JSON file in the 'BAC_2025' directory
@@ -17,30 +52,17 @@ def count_tokens_in_files():
         return
 
     try:
-        encoding = tiktoken.get_encoding("cl100k_base")
+        _get_encoding()
     except Exception as e:
         print(f"Error initializing tiktoken: {e}")
-        # As a fallback, let's use a simple word count.
-        encoding = None
-
-    token_counts = {}
-
-    for file_name in files:
-        file_path = os.path.join(dir_path, file_name)
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                text = data.get("text", "")
-                if encoding:
-                    token_count = len(encoding.encode(text))
-                else:
-                    token_count = len(text.split())
-                token_counts[file_name] = token_count
-        except json.JSONDecodeError:
-            print(f"Warning: Could not decode JSON from {file_name}. Skipping.")
-        except Exception as e:
-            print(f"Error processing file {file_name}: {e}")
+        # Workers fall back to a simple word count.
+
+    # Reading, parsing and BPE-tokenizing each file is CPU-bound and independent,
+    # so the files are spread across one worker process per core.
+    paths = [os.path.join(dir_path, file_name) for file_name in files]
+    with mp.Pool(initializer=_init_worker) as pool:
+        results = pool.map(_count_one, paths)
+    token_counts = {file_name: count for file_name, count in results if count is not None}
 
     try:
         with open(output_file, 'w', encoding='utf-8') as f:
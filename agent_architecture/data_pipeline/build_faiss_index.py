@@ -2,11 +2,15 @@ import json
 import os
 import numpy as np
 import faiss
+import torch
 from sentence_transformers import SentenceTransformer
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Texts per forward pass; large batches keep a GPU busy
+ENCODE_BATCH_SIZE = 256
+
 def build_and_save_faiss_index(text_data_path, vector_index_path, model_name):
     """
     Builds a FAISS index from text data and saves it.
@@ -26,11 +30,22 @@ def build_and_save_faiss_index(text_data_path, vector_index_path, model_name):
     filenames = list(text_map.keys())
     texts = list(text_map.values())
 
-    logging.info(f"Loading sentence transformer model '{model_name}'...")
-    model = SentenceTransformer(model_name)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    logging.info(f"Loading sentence transformer model '{model_name}' on {device}...")
+    model = SentenceTransformer(model_name, device=device)
 
     logging.info("Generating embeddings for the texts...")
-    embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+    embeddings = model.encode(
+        texts,
+        batch_size=ENCODE_BATCH_SIZE,
+        show_progress_bar=True,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    )
+    # Release the model (and its GPU memory) before building the index
+    del model
+    if device == "cuda":
+        torch.cuda.empty_cache()
     
     if embeddings.size == 0:
         logging.error("Embedding generation resulted in an empty array. Aborting.")
@@ -40,11 +55,13 @@ def build_and_save_faiss_index(text_data_path, vector_index_path, model_name):
     logging.info(f"Embeddings generated with dimension: {embedding_dim}")
 
     logging.info("Building the FAISS index...")
-    index = faiss.IndexFlatL2(embedding_dim)
-    index = faiss.IndexIDMap(index)
-    
-    ids = np.array(range(len(filenames)))
-    index.add_with_ids(embeddings.astype('float32'), ids)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    # Unit-length vectors (normalized by encode) ranked by inner product (cosine
+    # similarity), stored as int8: a quarter of the memory and scan bandwidth of fp32
+    index = faiss.IndexScalarQuantizer(embedding_dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    index.train(embeddings)
+    # FAISS ids are the positions in `filenames`, so no IndexIDMap translation layer is needed
+    index.add(embeddings)
 
     logging.info(f"FAISS index built successfully with {index.ntotal} vectors.")
 
@@ -1,73 +1,134 @@
+import mmap
 import os
-import json
+import orjson
 import tiktoken
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
-def chunk_text_by_tokens(text, max_tokens):
-    """Splits text into chunks of a maximum token size."""
-    encoding = tiktoken.get_encoding("cl100k_base")
-    tokens = encoding.encode(text)
+# File reads/writes overlap disk latency on threads; the pool is sized for I/O, not CPU
+IO_WORKERS = min(32, (os.cpu_count() or 1) * 4)
 
-    chunks = []
-    current_chunk = []
-    current_count = 0
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Loads the cl100k_base BPE tables once per process."""
+    return tiktoken.get_encoding("cl100k_base")
 
-    for token in tokens:
-        current_chunk.append(token)
-        current_count += 1
-        if current_count >= max_tokens:
-            chunks.append(encoding.decode(current_chunk))
-            current_chunk = []
-            current_count = 0
+def chunk_text_by_tokens(text, max_tokens, tokens=None):
+    """
+    Splits text into chunks of a maximum token size.
+    Pass `tokens` when the text has already been encoded to skip a second encode.
+    """
+    encoding = _get_encoding()
+    if tokens is None:
+        tokens = encoding.encode(text)
 
-    if current_chunk:
-        chunks.append(encoding.decode(current_chunk))
+    # Slice the token list directly and decode all chunks in one batched call
+    slices = [tokens[i:i + max_tokens] for i in range(0, len(tokens), max_tokens)]
+    return encoding.decode_batch(slices)
 
-    return chunks
+def _load_json(path):
+    """
+    Parses a JSON file straight from a read-only memory map of it, so large filings
+    are not first copied into an intermediate bytes object.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped; let orjson report them as invalid JSON
+            return orjson.loads(b"")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return orjson.loads(view)
+
+def _load_json_lines(path):
+    """
+    Returns (filename, section) pairs from a per-filing .jsonl written by process_filing;
+    each line names the per-section file it stands for under "filename".
+    """
+    with open(path, 'rb') as f:
+        records = [orjson.loads(line) for line in f if line.strip()]
+    return [(record.pop("filename"), record) for record in records]
+
+def _write_output(filename, data, tokens, output_dir, max_tokens):
+    """Writes one input file to output_dir, split into parts if it exceeds max_tokens."""
+    if len(tokens) > max_tokens:
+        chunks = chunk_text_by_tokens(data.get("text", ""), max_tokens, tokens=tokens)
+        base_name = filename[:-5] # Remove .json
+
+        for i, chunk_text in enumerate(chunks):
+            new_data = data.copy()
+            new_data["text"] = chunk_text
+
+            # Update section name to reflect chunking
+            original_section = new_data.get("section", "Unnamed Section")
+            new_data["section"] = f"{original_section} (Part {i+1}/{len(chunks)})"
+
+            new_filename = f"{base_name}_part_{i+1}.json"
+            output_path = os.path.join(output_dir, new_filename)
+
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(new_data, option=orjson.OPT_INDENT_2))
+        print(f"Split {filename} into {len(chunks)} parts.")
+    else:
+        output_path = os.path.join(output_dir, filename)
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        print(f"Copied {filename} as is.")
+
+def _is_up_to_date(filename, src_mtime, output_dir):
+    """True if `filename` already has an output (copied or part 1) at least as new as `src_mtime`."""
+    for output_name in (filename, f"{filename[:-5]}_part_1.json"):
+        try:
+            if os.path.getmtime(os.path.join(output_dir, output_name)) >= src_mtime:
+                return True
+        except OSError:
+            continue
+    return False
 
-def process_files(input_dir, output_dir, max_tokens=20000):
+def process_files(input_dir, output_dir, max_tokens=20000, incremental=False):
     """
     Processes JSON files from input_dir, splits them if they exceed max_tokens,
-    and saves the results in output_dir.
+    and saves the results in output_dir. Per-filing .jsonl inputs are expanded into
+    one output per line, named by the line's "filename".
+    With incremental=True, inputs whose output is newer than the input are skipped.
+    Outputs written with a different max_tokens are not detected; rerun without it then.
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    for filename in os.listdir(input_dir):
-        if not filename.endswith('.json'):
-            continue
-
-        input_path = os.path.join(input_dir, filename)
-        with open(input_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        text = data.get("text", "")
-        encoding = tiktoken.get_encoding("cl100k_base")
-        token_count = len(encoding.encode(text))
-
-        if token_count > max_tokens:
-            chunks = chunk_text_by_tokens(text, max_tokens)
-            base_name = filename[:-5] # Remove .json
-
-            for i, chunk_text in enumerate(chunks):
-                new_data = data.copy()
-                new_data["text"] = chunk_text
-
-                # Update section name to reflect chunking
-                original_section = new_data.get("section", "Unnamed Section")
-                new_data["section"] = f"{original_section} (Part {i+1}/{len(chunks)})"
-
-                new_filename = f"{base_name}_part_{i+1}.json"
-                output_path = os.path.join(output_dir, new_filename)
-
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(new_data, f, indent=4)
-            print(f"Split {filename} into {len(chunks)} parts.")
-        else:
-            output_path = os.path.join(output_dir, filename)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4)
-            print(f"Copied {filename} as is.")
+    # DirEntry carries the file type from the directory listing, so no extra stat per file
+    with os.scandir(input_dir) as entries:
+        inputs = [entry for entry in entries if entry.name.endswith(('.json', '.jsonl')) and entry.is_file()]
+    json_inputs = [entry for entry in inputs if entry.name.endswith('.json')]
+    line_inputs = [entry for entry in inputs if entry.name.endswith('.jsonl')]
+    skipped = 0
+    if incremental:
+        total = len(json_inputs)
+        json_inputs = [entry for entry in json_inputs if not _is_up_to_date(entry.name, entry.stat().st_mtime, output_dir)]
+        skipped = total - len(json_inputs)
+    filenames = [entry.name for entry in json_inputs]
+    with ThreadPoolExecutor(max_workers=IO_WORKERS) as pool:
+        documents = list(pool.map(_load_json, [entry.path for entry in json_inputs]))
+        for entry, records in zip(line_inputs, pool.map(_load_json_lines, [entry.path for entry in line_inputs])):
+            src_mtime = entry.stat().st_mtime
+            for filename, data in records:
+                if incremental and _is_up_to_date(filename, src_mtime, output_dir):
+                    skipped += 1
+                    continue
+                filenames.append(filename)
+                documents.append(data)
+        if incremental:
+            print(f"Skipping {skipped} up-to-date file(s).")
+
+        # Tokenize every file in one call; tiktoken spreads the batch over native threads
+        all_tokens = _get_encoding().encode_ordinary_batch(
+            [data.get("text", "") for data in documents], num_threads=os.cpu_count() or 1
+        )
+
+        # list() drains the iterator so a failed write raises here
+        list(pool.map(
+            lambda item: _write_output(*item, output_dir, max_tokens),
+            zip(filenames, documents, all_tokens)
+        ))
 
 if __name__ == '__main__':
     # --- Configuration ---
@@ -76,5 +137,5 @@ if __name__ == '__main__':
     OUTPUT_DIRECTORY = f"{INPUT_DIRECTORY}_chunked"
     MAX_TOKEN_LIMIT = 20000
 
-    process_files(INPUT_DIRECTORY, OUTPUT_DIRECTORY, MAX_TOKEN_LIMIT)
+    process_files(INPUT_DIRECTORY, OUTPUT_DIRECTORY, MAX_TOKEN_LIMIT, incremental=True)
     print(f"Processing complete. Chunked files are in '{OUTPUT_DIRECTORY}'.")
@@ -1,10 +1,30 @@
-import json
+import orjson
 import glob
 import re
 import os
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from neo4j import GraphDatabase
 
+# Sections written per transaction; each batch is one UNWIND round trip for its
+# documents and one for its sections instead of one transaction per section
+WRITE_BATCH_SIZE = 500
+# Concurrent writer sessions. Work is partitioned by company, so two sessions never
+# MERGE the same Company/Year/Quarter chain; only the shared Domain/Subdomain nodes
+# can contend, and execute_write retries the resulting transient lock deadlocks.
+WRITE_WORKERS = 8
+
+# Section text is stored on one line: newlines, carriage returns and tabs become spaces
+SECTION_TEXT_WHITESPACE = str.maketrans({'\n': ' ', '\r': ' ', '\t': ' '})
+
+# The section filename format, with an optional "_part_X" suffix added by the chunker.
+# Matched against the whole basename, so a miss fails fast instead of being retried
+# at every offset.
+FILENAME_PATTERN = re.compile(
+    r"external_SEC_(?P<company>[A-Z]+)_(?P<doc_type>[0-9A-Z-]+)_(?P<year>\d{4})_(?P<quarter>q\d)_.*?(?:_part_\d+)?\.json",
+    re.IGNORECASE
+)
+
 class Neo4jGraph:
     def __init__(self, uri, user, password):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
@@ -50,94 +70,120 @@ class Neo4jGraph:
         files = glob.glob(path)
         
         grouped_files = defaultdict(list)
-        # Regex to parse the new filename format, now handling optional "_part_X"
-        pattern = re.compile(r"external_SEC_([A-Z]+)_([0-9A-Z-]+)_(\d{4})_(q\d)_(.*?)(_part_\d+)?\.json", re.IGNORECASE)
-
         for f_path in files:
-            basename = os.path.basename(f_path)
-            match = pattern.search(basename)
+            match = FILENAME_PATTERN.fullmatch(os.path.basename(f_path))
             if match:
-                company, doc_type, year, quarter, _, _ = match.groups()
+                company, doc_type, year, quarter = match.group("company", "doc_type", "year", "quarter")
                 # Normalize key components for consistent grouping
                 key = (company.upper(), doc_type.upper(), year, quarter.upper())
                 grouped_files[key].append(f_path)
-        
+
+        partitions = defaultdict(list)
+        for key, filenames in grouped_files.items():
+            partitions[hash(key[0]) % WRITE_WORKERS].append((key, filenames))
+        if not partitions:
+            return
+
+        # The driver is thread-safe; each worker opens its own session
+        with ThreadPoolExecutor(max_workers=len(partitions)) as pool:
+            # list() drains the results so an error in any worker is raised here
+            list(pool.map(self._write_groups, partitions.values()))
+
+    def _write_groups(self, groups):
+        """Writes (key, filenames) document groups in batched transactions on one session."""
         with self.driver.session() as session:
-            for (company, doc_type, year, quarter), filenames in grouped_files.items():
+            doc_rows, section_rows = [], []
+            for (company, doc_type, year, quarter), filenames in groups:
                 # Define the parent Document's unique filename
                 document_filename = f"SEC_{company}_{year}_{quarter}_{doc_type}"
                 
-                # Use metadata from the first file in the group to create the parent doc
-                with open(filenames[0], 'r') as f:
-                    record = json.load(f)
-                    
-                    # Prepare a clean parameter map for the document query
-                    doc_params = {
-                        "domain": record.get("domain"),
-                        "subdomain": record.get("subdomain"),
-                        "company": company,
-                        "year": int(year),
-                        "quarter_label": quarter,
-                        "doc_type": doc_type,
-                        "filename": document_filename
-                    }
-                
-                # Create the hierarchy up to the Document node
-                session.execute_write(self._create_document_tx, doc_params)
-
-                # Process each file in the group as a Section
-                for f_path in filenames:
-                    with open(f_path, 'r') as f:
-                        record = json.load(f)
-                        basename = os.path.basename(f_path)
-                        
-                        # Prepare a clean parameter map for the section query
-                        section_params = {
-                            "doc_filename": document_filename,
-                            "section_filename": basename,
-                            "section_name": record.get("section", "Unnamed Section"),
-                            "text": record.get("text", "")
-                        }
-                        session.execute_write(self._create_section_tx, section_params)
+                # Parse every file of the group once; the first also supplies the document metadata
+                records = {f_path: self._load_record(f_path) for f_path in filenames}
+                record = records[filenames[0]]
+
+                # Prepare a clean parameter map for the document query
+                doc_rows.append({
+                    "domain": record.get("domain"),
+                    "subdomain": record.get("subdomain"),
+                    "company": company,
+                    "year": int(year),
+                    "quarter_label": quarter,
+                    "doc_type": doc_type,
+                    "filename": document_filename
+                })
+
+                # Every file in the group becomes a Section
+                for f_path, record in records.items():
+                    section_rows.append({
+                        "doc_filename": document_filename,
+                        "section_filename": os.path.basename(f_path),
+                        "section_name": record.get("section", "Unnamed Section"),
+                        "clean_text": record.get("text", "").translate(SECTION_TEXT_WHITESPACE)
+                    })
+
+                if len(section_rows) >= WRITE_BATCH_SIZE:
+                    session.execute_write(self._write_batch_tx, doc_rows, section_rows)
+                    doc_rows, section_rows = [], []
+
+            if doc_rows:
+                session.execute_write(self._write_batch_tx, doc_rows, section_rows)
 
     @staticmethod
-    def _create_document_tx(tx, params):
+    def _load_record(path):
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+
+    @classmethod
+    def _write_batch_tx(cls, tx, doc_rows, section_rows):
+        # Documents first, so the section query can MATCH them in the same transaction
+        cls._create_documents_tx(tx, doc_rows)
+        cls._create_sections_tx(tx, section_rows)
+
+    @staticmethod
+    def _create_documents_tx(tx, rows):
+        # Each node is merged on exactly its uniqueness-constraint key, so the lookup is an
+        # index seek and concurrent sessions serialize on the constraint instead of racing
+        # to create the same path; relationships are merged separately between them.
         query = """
-        MERGE (domain:Domain {name: $domain})
-        MERGE (domain)-[:HAS_SUBDOMAIN]->(subdomain:Subdomain {name: $subdomain})
-        MERGE (subdomain)-[:HAS_COMPANY]->(company:Company {name: $company})
-        MERGE (company)-[:HAS_YEAR]->(year:Year {company: $company, value: $year, name: toString($year)})
-        MERGE (year)-[:HAS_QUARTER]->(quarter:Quarter {company: $company, year: $year, label: $quarter_label, name: $quarter_label})
+        UNWIND $rows AS row
+        MERGE (domain:Domain {name: row.domain})
+        MERGE (subdomain:Subdomain {name: row.subdomain})
+        MERGE (domain)-[:HAS_SUBDOMAIN]->(subdomain)
+        MERGE (company:Company {name: row.company})
+        MERGE (subdomain)-[:HAS_COMPANY]->(company)
+        MERGE (year:Year {company: row.company, value: row.year})
+        ON CREATE SET year.name = toString(row.year)
+        MERGE (company)-[:HAS_YEAR]->(year)
+        MERGE (quarter:Quarter {company: row.company, year: row.year, label: row.quarter_label})
+        ON CREATE SET quarter.name = row.quarter_label
+        MERGE (year)-[:HAS_QUARTER]->(quarter)
         
-        MERGE (quarter)-[:HAS_DOC]->(doc:Document {filename: $filename})
+        MERGE (doc:Document {filename: row.filename})
         ON CREATE SET
-            doc.name = $doc_type,
-            doc.document_type = $doc_type,
-            doc.company = $company,
-            doc.year = $year,
-            doc.quarter = $quarter_label
+            doc.name = row.doc_type,
+            doc.document_type = row.doc_type,
+            doc.company = row.company,
+            doc.year = row.year,
+            doc.quarter = row.quarter_label
+        MERGE (quarter)-[:HAS_DOC]->(doc)
         """
-        tx.run(query, **params)
+        tx.run(query, rows=rows)
 
     @staticmethod
-    def _create_section_tx(tx, params):
-        # Clean the text by replacing newlines with spaces
-        clean_text = params.get("text", "").replace('\n', ' ')
-
+    def _create_sections_tx(tx, rows):
         query = """
-        MATCH (doc:Document {filename: $doc_filename})
-        MERGE (section:Section {filename: $section_filename})
+        UNWIND $rows AS row
+        MATCH (doc:Document {filename: row.doc_filename})
+        MERGE (section:Section {filename: row.section_filename})
         ON CREATE SET
-            section.name = $section_name,
-            section.section = $section_name,
-            section.text = $clean_text
+            section.name = row.section_name,
+            section.section = row.section_name,
+            section.text = row.clean_text
         ON MATCH SET
-            section.text = $clean_text
+            section.text = row.clean_text
         MERGE (doc)-[:HAS_SECTION]->(section)
         """
-        # Add the cleaned text to the parameters
-        params["clean_text"] = clean_text
-        tx.run(query, **params)
+        tx.run(query, rows=rows)
 
     def create_horizontal_links(self):
         with self.driver.session() as session:
@@ -1,6 +1,18 @@
-import json
+import os
+import orjson
 from neo4j import GraphDatabase
 
+# Sections fetched per query. Pages are keyed on s.filename (backed by the
+# unique_section constraint's index), so each page is an index range seek and
+# neither the server nor the client ever holds the whole corpus.
+SECTION_PAGE_SIZE = 10_000
+SECTION_PAGE_QUERY = """
+MATCH (s:Section) WHERE s.filename > $cursor
+RETURN s.filename AS filename, s.text AS text
+ORDER BY s.filename
+LIMIT $limit
+"""
+
 class EmbeddingExtractor:
     def __init__(self, uri, user, password):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
@@ -13,27 +25,41 @@ class EmbeddingExtractor:
     def fetch_and_save_section_texts(self, output_file='section_texts.json'):
         """
         Fetches all section texts from Neo4j and saves them to a JSON file.
+        Records are read in pages of SECTION_PAGE_SIZE and written to the file as they
+        arrive instead of being collected in memory first; the output is the same
+        {filename: text} object.
         """
-        text_map = {}
-        query = "MATCH (s:Section) RETURN s.filename AS filename, s.text AS text"
+        # Written next to the target and renamed into place once complete
+        partial_file = output_file + ".partial"
+        count = 0
 
-        with self.driver.session() as session:
+        with self.driver.session() as session, open(partial_file, 'wb') as f:
             print("Querying Neo4j for section filenames and text...")
-            result = session.run(query)
-            records = list(result)
-            for record in records:
-                filename = record["filename"]
-                text = record["text"]
-                if filename and text:
-                    text_map[filename] = text
+            f.write(b'{')
+            # Every non-empty filename sorts after ""; sections without one are skipped
+            cursor = ""
+            while True:
+                page_rows = 0
+                for record in session.run(SECTION_PAGE_QUERY, cursor=cursor, limit=SECTION_PAGE_SIZE):
+                    filename = record["filename"]
+                    text = record["text"]
+                    cursor = filename
+                    page_rows += 1
+                    if text:
+                        f.write(b',\n  ' if count else b'\n  ')
+                        f.write(orjson.dumps(filename) + b': ' + orjson.dumps(text))
+                        count += 1
+                if page_rows < SECTION_PAGE_SIZE:
+                    break
+            f.write(b'\n}' if count else b'}')
         
-        print(f"Successfully fetched text for {len(text_map)} sections.")
+        print(f"Successfully fetched text for {count} sections.")
 
-        if text_map:
-            with open(output_file, 'w') as f:
-                json.dump(text_map, f, indent=2)
+        if count:
+            os.replace(partial_file, output_file)
             print(f"Section texts saved to '{output_file}'.")
         else:
+            os.remove(partial_file)
             print("No text data found or retrieved.")
 
 if __name__ == "__main__":
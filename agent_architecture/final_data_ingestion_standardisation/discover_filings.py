@@ -1,8 +1,12 @@
 import os
+import json
 import requests
 import datetime
-import csv
+import pandas as pd
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 # --- Configuration for Testing ---
 # For the initial test, we'll focus on a single bank and a shorter time frame.
@@ -14,15 +18,54 @@ FORMS_TO_SEARCH = ["10-K", "10-Q"]
 # Correct, reliable URL for Ticker -> CIK mapping
 CIK_LOOKUP_URL = "https://www.sec.gov/files/company_tickers.json"
 OUTPUT_CSV_FILE = "filings_to_process.csv"
+# The SEC regenerates the ticker file daily, so a local copy is reused for a day
+CIK_MAP_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "sec_cik_map.json")
+CIK_MAP_CACHE_MAX_AGE_SECONDS = 24 * 60 * 60
+OUTPUT_CSV_COLUMNS = ["ticker", "cik", "accession_number", "filing_date", "form_type"]
+
+# SEC fair-access policy: no more than 10 requests per second. Submissions are
+# fetched concurrently, with request starts spaced to stay under this rate.
+SEC_MAX_REQUESTS_PER_SECOND = 10
+
+# One keep-alive session for every SEC request, so repeated calls to sec.gov and
+# data.sec.gov reuse their TCP/TLS connections instead of handshaking each time
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=SEC_MAX_REQUESTS_PER_SECOND))
+
+_rate_lock = threading.Lock()
+_next_request_time = 0.0
+
+def sec_get(url, headers):
+    """GETs an SEC URL through the shared session, waiting for the next free rate-limit slot."""
+    global _next_request_time
+    with _rate_lock:
+        now = time.monotonic()
+        wait = _next_request_time - now
+        _next_request_time = max(now, _next_request_time) + 1.0 / SEC_MAX_REQUESTS_PER_SECOND
+    if wait > 0:
+        time.sleep(wait)
+    response = SESSION.get(url, headers=headers)
+    response.raise_for_status()
+    return response
 
 def get_cik_map(headers):
     """
     Downloads the official SEC ticker/CIK mapping and returns a dictionary
-    mapping uppercase tickers to their zero-padded CIK.
+    mapping uppercase tickers to their zero-padded CIK. The map is cached at
+    CIK_MAP_CACHE_PATH and reused while it is less than a day old.
     """
+    try:
+        if time.time() - os.path.getmtime(CIK_MAP_CACHE_PATH) < CIK_MAP_CACHE_MAX_AGE_SECONDS:
+            with open(CIK_MAP_CACHE_PATH, 'r', encoding='utf-8') as f:
+                cik_map = json.load(f)
+            print("Loaded cached SEC company ticker-CIK map.")
+            return cik_map
+    except (OSError, ValueError):
+        # Missing, unreadable or corrupt cache: fall through to a fresh download
+        pass
+
     print("Downloading SEC company ticker-CIK map...")
-    response = requests.get(CIK_LOOKUP_URL, headers=headers)
-    response.raise_for_status()
+    response = sec_get(CIK_LOOKUP_URL, headers)
     all_companies = response.json()
     
     # The JSON is a dictionary of dictionaries. The key is a counter, the value has the company info.
@@ -32,43 +75,51 @@ def get_cik_map(headers):
         for company in all_companies.values() if 'ticker' in company
     }
     print("Successfully created CIK map.")
+
+    try:
+        os.makedirs(os.path.dirname(CIK_MAP_CACHE_PATH), exist_ok=True)
+        partial_path = f"{CIK_MAP_CACHE_PATH}.{os.getpid()}.partial"
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            json.dump(cik_map, f)
+        os.replace(partial_path, CIK_MAP_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: Could not cache the CIK map: {e}")
     return cik_map
 
 def fetch_filings_for_cik(cik, years_to_check, headers):
     """
     Fetches the submission history for a CIK and filters for recent 10-K/10-Q filings.
+    Returns a DataFrame with accession_number, filing_date and form_type columns.
     """
     print(f"Fetching filing history for CIK: {cik}...")
     submissions_url = f"https://data.sec.gov/submissions/CIK{cik}.json"
-    response = requests.get(submissions_url, headers=headers)
-    response.raise_for_status()
+    response = sec_get(submissions_url, headers)
     submissions = response.json()
 
-    recent_filings = []
-    cutoff_date = datetime.datetime.now() - datetime.timedelta(days=years_to_check * 365)
+    # Filing dates are ISO-8601 (YYYY-MM-DD), so they compare correctly as strings
+    cutoff_date_str = (datetime.datetime.now() - datetime.timedelta(days=years_to_check * 365)).strftime('%Y-%m-%d')
 
-    if 'filings' in submissions and 'recent' in submissions['filings']:
-        filings = submissions['filings']['recent']
-        for i in range(len(filings['accessionNumber'])):
-            filing_date_str = filings['filingDate'][i]
-            filing_date = datetime.datetime.strptime(filing_date_str, '%Y-%m-%d')
-            form_type = filings['form'][i]
+    if 'filings' not in submissions or 'recent' not in submissions['filings']:
+        return pd.DataFrame(columns=['accession_number', 'filing_date', 'form_type'])
 
-            if filing_date >= cutoff_date and form_type in ['10-K', '10-Q']:
-                recent_filings.append({
-                    'accession_number': filings['accessionNumber'][i].replace('-', ''),
-                    'filing_date': filing_date_str,
-                    'form_type': form_type,
-                })
-    return recent_filings
+    # The submissions API returns parallel column lists, so filter them as columns
+    filings = submissions['filings']['recent']
+    df = pd.DataFrame({
+        'accession_number': filings['accessionNumber'],
+        'filing_date': filings['filingDate'],
+        'form_type': filings['form'],
+    })
+    df = df[(df['filing_date'] >= cutoff_date_str) & df['form_type'].isin(FORMS_TO_SEARCH)]
+    # assign() returns a new frame, so the filtered view is never written to in place
+    return df.assign(accession_number=df['accession_number'].str.replace('-', '', regex=False))
 
 def discover_and_save_filings(tickers, years_to_check, headers, output_csv_path="filings_to_process.csv"):
     """
     Main function to discover and save filings for a list of tickers.
     """
-    all_filings_to_process = []
     cik_map = get_cik_map(headers)
     
+    ticker_ciks = []
     for ticker in tickers:
         ticker_upper = ticker.upper()
         print(f"\n--- Processing ticker: {ticker_upper} ---")
@@ -77,28 +128,25 @@ def discover_and_save_filings(tickers, years_to_check, headers, output_csv_path=
         if not cik:
             print(f"Could not find CIK for ticker: {ticker_upper}. Skipping.")
             continue
-            
-        filings = fetch_filings_for_cik(cik, years_to_check, headers)
-        
-        for filing in filings:
-            all_filings_to_process.append({
-                "ticker": ticker_upper,
-                "cik": cik,
-                **filing
-            })
-        
-        # Adding a small delay to respect SEC rate limits
-        time.sleep(0.5)
+        ticker_ciks.append((ticker_upper, cik))
+
+    # Submissions are fetched concurrently; sec_get keeps the overall request rate
+    # within the SEC limit. Results come back in ticker order.
+    with ThreadPoolExecutor(max_workers=SEC_MAX_REQUESTS_PER_SECOND) as pool:
+        results = pool.map(lambda ticker_cik: fetch_filings_for_cik(ticker_cik[1], years_to_check, headers), ticker_ciks)
+        filings_by_ticker = [
+            filings.assign(ticker=ticker_upper, cik=cik)
+            for (ticker_upper, cik), filings in zip(ticker_ciks, results)
+            if not filings.empty
+        ]
 
-    if not all_filings_to_process:
+    if not filings_by_ticker:
         print("No relevant filings found for the given tickers and time period.")
         return
 
+    all_filings_to_process = pd.concat(filings_by_ticker, ignore_index=True)
     print(f"\nWriting {len(all_filings_to_process)} filings to '{output_csv_path}'...")
-    with open(output_csv_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=["ticker", "cik", "accession_number", "filing_date", "form_type"])
-        writer.writeheader()
-        writer.writerows(all_filings_to_process)
+    all_filings_to_process.to_csv(output_csv_path, columns=OUTPUT_CSV_COLUMNS, index=False, encoding='utf-8')
         
     print("Discovery complete.")
 
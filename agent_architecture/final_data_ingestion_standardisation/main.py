@@ -48,6 +48,8 @@ def main():
     YEARS_TO_CHECK = config.get("years_to_check", 1)
     TICKER_FILENAME = config.get("ticker_file", "tickers.txt")
     HEADERS = {"User-Agent": config.get("user_agent_email", "Default User-Agent <email@example.com>")}
+    TEXT_FORMAT = config.get("text_format", "markdown")
+    OUTPUT_FORMAT = config.get("output_format", "json")
     
     ticker_file_path = os.path.join(base_dir, TICKER_FILENAME)
     output_dir = os.path.join(base_dir, "eternal_sec")
@@ -82,7 +84,9 @@ def main():
         process_filing.batch_process_filings(
             input_csv_path=temp_csv_path,
             output_dir=output_dir,
-            headers=HEADERS
+            headers=HEADERS,
+            text_format=TEXT_FORMAT,
+            output_format=OUTPUT_FORMAT
         )
         print("[Step 2/2] Processing complete.")
     else:
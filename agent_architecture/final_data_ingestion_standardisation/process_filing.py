@@ -1,18 +1,87 @@
 import os
 import re
-import json
-import requests
+import orjson
 import shutil
 import datetime
-import csv
+import multiprocessing
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from io import StringIO
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer
+from lxml import etree, html as lxml_html
 from markdownify import markdownify as md
+from discover_filings import sec_get
 
 # --- Configuration ---
 # We no longer need hardcoded values here, as they will come from the CSV.
 
+# BeautifulSoup backend. lxml's C parser is roughly an order of magnitude faster
+# than the pure-Python html.parser on multi-megabyte filings, and given the raw
+# response bytes it detects the document encoding itself.
+HTML_PARSER = 'lxml'
+
+# Tables are read directly from their cells unless pandas is needed to resolve header
+# rows or row/column spans. Single-row tables, and tables with any cell longer than
+# this, never go through pandas: it adds nothing for them, and its parser degrades
+# badly on the huge single-cell text blobs some filings use for layout.
+MAX_PANDAS_CELL_CHARS = 2048
+
+# Compiled once at import; these run for every candidate tag and section title
+_SECTION_RE = re.compile(r'item\s*\d+[a-z]?\.?', re.IGNORECASE)
+_TITLE_ONLY_RE = re.compile(r'^\s*item\s*\d+[a-z]?\.?\s*$', re.IGNORECASE)
+_FILENAME_STRIP_RE = re.compile(r'[\\/*?:"<>|]')
+_WHITESPACE_RE = re.compile(r'\s+')
+# Text nodes that can begin a section header; the only strings header detection looks at.
+# Besides strings starting with "item", a string holding only the start of the word ("I",
+# "It", "Ite") can begin a header split across nodes, e.g. small-caps
+# <font>I</font><font size=1>TEM</font> 1A. or <b>It</b>em 7.
+_ITEM_PREFIX_RE = re.compile(r'^\s*(?:item|i(?:te?)?\s*$)', re.IGNORECASE)
+
+# Tags that can be section headers, and enough leading text to test one against
+# _SECTION_RE without extracting its whole subtree
+_HEADER_TAGS = frozenset(['p', 'b', 'strong', 'div'])
+_HEADER_PREFIX_CHARS = 32
+
+# Heuristic: a table with more than 5 links to internal anchors is likely a ToC.
+# Evaluated by lxml in C instead of a Python href callback per anchor.
+_TOC_LINKS_XPATH = etree.XPath(
+    '//table[count(.//a[starts-with(@href, "#")]) > 5]//a[starts-with(@href, "#")]'
+)
+
+# Only div#formName, div.infoHead and table.tableFile are read from a filing's index
+# page, so everything outside divs and tables (scripts, nav, header links) is skipped
+# at parse time
+INDEX_PAGE_STRAINER = SoupStrainer(['div', 'table'])
+
+# Filings are fetched and parsed concurrently. Every request goes through
+# discover_filings.sec_get, whose shared session and rate limiter keep the combined
+# request rate within the SEC's 10 requests per second.
+FILING_WORKERS = 8
+
+# Parsing, table extraction and markdownify are CPU-bound Python, so they run in a
+# process pool rather than on the fetch threads. forkserver keeps the workers from
+# being forked out of a process whose fetch threads may be holding locks.
+PARSE_WORKERS = os.cpu_count() or 1
+PARSE_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# A filing never changes once it is accepted under an accession number, so the fetched
+# index metadata and primary document are kept on disk and re-runs skip both SEC requests
+FILING_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sec_filings")
+
+# Section "text" is markdown by default. 'text' emits plain paragraphs instead, which is
+# all the chunk/embed pipeline needs and skips markdownify's per-node Python recursion.
+TEXT_FORMATS = ('markdown', 'text')
+
+# 'json' writes one file per section. 'jsonl' writes one <accession>.jsonl per filing,
+# a line per section carrying the section's would-be file name under "filename";
+# data_pipeline/chunker.py expands those lines back into per-section outputs.
+OUTPUT_FORMATS = ('json', 'jsonl')
+
+# Tags that start a new paragraph in plain-text output. Filings lay out most of their
+# prose in divs rather than p tags, so divs count as blocks too.
+_TEXT_BLOCK_TAGS = frozenset(['p', 'div', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote'])
+_TEXT_SKIP_TAGS = frozenset(['script', 'style'])
+
 
 def sanitize_for_filename(name):
     """
@@ -24,23 +93,21 @@ def sanitize_for_filename(name):
     pascal_case_name = ''.join(word.capitalize() for word in name.split())
     
     # Remove any remaining characters that are invalid in filenames
-    safe_name = re.sub(r'[\\/*?:"<>|]', "", pascal_case_name)
+    safe_name = _FILENAME_STRIP_RE.sub("", pascal_case_name)
     return safe_name[:100]
 
 
-def extract_toc_titles(soup):
+def extract_toc_titles(html_content):
     """
-    Finds the Table of Contents in the document and returns a clean list of section titles.
+    Finds the Table of Contents in a document's raw HTML (str or bytes) and returns a
+    clean list of section titles.
     """
-    toc_titles = set()
-    # Heuristic: Find tables that contain links to internal anchors, which is characteristic of a ToC.
-    for table in soup.find_all('table'):
-        links = table.find_all('a', href=lambda href: href and href.startswith('#'))
-        if len(links) > 5: # A table with more than 5 internal links is likely a ToC.
-            for link in links:
-                # Clean up the text to use for matching later
-                clean_title = re.sub(r'\s+', ' ', link.get_text(strip=True)).lower()
-                toc_titles.add(clean_title)
+    tree = lxml_html.fromstring(html_content)
+    # Clean up the text to use for matching later
+    toc_titles = {
+        _WHITESPACE_RE.sub(' ', link.text_content()).strip().lower()
+        for link in _TOC_LINKS_XPATH(tree)
+    }
     return list(toc_titles)
 
 
@@ -53,6 +120,105 @@ def get_quarter(filing_date_str):
     return f"q{quarter}"
 
 
+def _extract_text(soup):
+    """
+    Returns the plain text of a parsed section: the strings under each innermost block
+    tag joined into one whitespace-normalised paragraph, paragraphs separated by blank lines.
+    """
+    paragraphs = []
+    current_paragraph = []
+    current_block = None
+    for string in soup.find_all(string=True):
+        # Comments, CDATA and doctypes are NavigableString subclasses
+        if type(string) is not NavigableString or string.parent.name in _TEXT_SKIP_TAGS:
+            continue
+        text = string.strip()
+        if not text:
+            continue
+        block = next((parent for parent in string.parents if parent.name in _TEXT_BLOCK_TAGS), None)
+        if block is not current_block and current_paragraph:
+            paragraphs.append(' '.join(' '.join(current_paragraph).split()))
+            current_paragraph = []
+        current_block = block
+        current_paragraph.append(text)
+    if current_paragraph:
+        paragraphs.append(' '.join(' '.join(current_paragraph).split()))
+    return '\n\n'.join(paragraphs)
+
+
+def _text_prefix(tag, min_length=_HEADER_PREFIX_CHARS):
+    """Returns the start of tag.get_text(strip=True), stopping once min_length characters are collected."""
+    parts, length = [], 0
+    for text in tag.stripped_strings:
+        parts.append(text)
+        length += len(text)
+        if length >= min_length:
+            break
+    return ''.join(parts)
+
+
+def _find_section_headers(soup):
+    """
+    Returns, in document order, the p/b/strong/div tags outside tables and links whose
+    text starts with an "Item N." heading.
+
+    A tag's stripped text can only match if its first non-blank string starts with
+    "item" or is a leading fragment of it (_ITEM_PREFIX_RE), so the search starts from
+    those strings (one compiled-regex scan over the text nodes) and walks up through the
+    ancestors that begin with them. Each of those tags is then tested on its leading
+    stripped text joined across strings, as get_text(strip=True) would, so headers split
+    across nodes are still found; only those few tags have their text assembled, instead
+    of every candidate tag's full get_text().
+    """
+    headers_found = []
+    for string in soup.find_all(string=_ITEM_PREFIX_RE):
+        if type(string) is not NavigableString or string.parent.name in _TEXT_SKIP_TAGS:
+            continue
+        ancestors = list(string.parents)
+        # Ancestors below the outermost table or link are inside it and are never headers
+        first_allowed = max((level for level, tag in enumerate(ancestors) if tag.name in ('table', 'a')), default=0)
+        candidates = []
+        for level, ancestor in enumerate(ancestors):
+            # Once this string is no longer the ancestor's first text, no higher ancestor begins with it
+            if next((text for text in ancestor.strings if text.strip()), None) is not string:
+                break
+            if level >= first_allowed and ancestor.name in _HEADER_TAGS and _SECTION_RE.match(_text_prefix(ancestor)):
+                candidates.append(ancestor)
+        # Outer tags come first in document order
+        headers_found.extend(reversed(candidates))
+    return headers_found
+
+
+def _is_spanning(cell):
+    """True if a cell declares a colspan or rowspan other than 1."""
+    return any(cell.get(attr, '1').strip() not in ('', '1') for attr in ('colspan', 'rowspan'))
+
+
+def _direct_table(table):
+    """
+    Returns (columns, rows) for a table that does not need pandas, read straight from
+    its cells, or None if it should go through pd.read_html: a multi-row table with a
+    <thead>, <th> header cells or spanning cells, whose layout pandas has to resolve.
+    """
+    row_cells = [cells for cells in (tr.find_all(['td', 'th']) for tr in table.find_all('tr')) if cells]
+    row_texts = [[' '.join(cell.get_text(' ', strip=True).split()) for cell in cells] for cells in row_cells]
+
+    trivial = len(row_texts) < 2 or any(len(text) > MAX_PANDAS_CELL_CHARS for texts in row_texts for text in texts)
+    if not trivial and (
+        table.find('thead') is not None
+        or any(cell.name == 'th' or _is_spanning(cell) for cells in row_cells for cell in cells)
+    ):
+        return None
+
+    width = max((len(texts) for texts in row_texts), default=0)
+    columns = [f"Column_{j}" for j in range(width)]
+    rows = [
+        dict(zip(columns, texts + [""] * (width - len(texts))))
+        for texts in row_texts if any(texts)
+    ]
+    return columns, rows
+
+
 def _extract_and_structure_tables(html_content):
     """
     Finds all tables in a chunk of HTML, intelligently converting them to a
@@ -61,13 +227,13 @@ def _extract_and_structure_tables(html_content):
     if not html_content:
         return [], None
 
-    soup = BeautifulSoup(html_content, 'html.parser')
+    # One parse serves both the table extraction and the clean text; tables are only
+    # removed after all of them have been read, so name lookups see the original tree
+    soup = BeautifulSoup(html_content, HTML_PARSER)
     all_tables_structured = []
+    tables = soup.find_all('table')
 
-    # Use a copy of the soup to find tables to prevent modification issues
-    soup_for_tables = BeautifulSoup(html_content, 'html.parser')
-
-    for i, table in enumerate(soup_for_tables.find_all('table')):
+    for i, table in enumerate(tables):
         try:
             # 1. Extract a potential name for the table
             name = f"Table {i + 1}"
@@ -82,9 +248,18 @@ def _extract_and_structure_tables(html_content):
                     if 0 < len(text) < 150:
                         name = text
 
-            # 2. Use pandas to parse the HTML table into a DataFrame
-            # This robustly handles most complex headers and merged cells
-            df_list = pd.read_html(StringIO(str(table)), flavor='bs4')
+            # 2. Plain grids and trivial tables are taken straight from their cells
+            direct = _direct_table(table)
+            if direct is not None:
+                columns, rows = direct
+                if rows:
+                    all_tables_structured.append({"name": name, "columns": columns, "rows": rows})
+                continue
+
+            # Otherwise use pandas to parse the HTML table into a DataFrame
+            # This robustly handles most complex headers and merged cells.
+            # lxml is tried first; pandas falls back to bs4 for tables lxml rejects.
+            df_list = pd.read_html(StringIO(str(table)), flavor=['lxml', 'bs4'])
             if not df_list:
                 continue
             
@@ -121,89 +296,153 @@ def _extract_and_structure_tables(html_content):
             # print(f"Skipping a table that failed to parse: {e}")
             continue
             
-    # Decompose tables from the original soup to get clean text
-    for table in soup.find_all('table'):
-        table.decompose()
+    # Detach tables from the soup to get clean text. extract() only relinks the
+    # neighbouring nodes; the detached subtrees are simply freed with `tables`, instead
+    # of decompose() visiting every node inside each table to tear it down.
+    for table in tables:
+        table.extract()
         
     return all_tables_structured, soup
 
 
-def fetch_and_process_filing(cik, accession_number, company_name, output_dir, headers):
+def _filing_cache_paths(accession_number):
+    base = os.path.join(FILING_CACHE_DIR, accession_number)
+    return base + ".json", base + ".htm"
+
+
+def _load_cached_filing(accession_number):
+    """Returns the cached (index metadata, primary document bytes) for a filing, or None."""
+    meta_path, doc_path = _filing_cache_paths(accession_number)
+    try:
+        with open(meta_path, 'rb') as f:
+            index_metadata = orjson.loads(f.read())
+        with open(doc_path, 'rb') as f:
+            return index_metadata, f.read()
+    except (OSError, orjson.JSONDecodeError):
+        # Missing or partial entry: fetch the filing again
+        return None
+
+
+def _save_cached_filing(accession_number, index_metadata, content):
+    """Caches a fetched filing. The document is written before the metadata that marks the entry complete."""
+    meta_path, doc_path = _filing_cache_paths(accession_number)
+    try:
+        os.makedirs(FILING_CACHE_DIR, exist_ok=True)
+        for path, data in ((doc_path, content), (meta_path, orjson.dumps(index_metadata))):
+            partial_path = f"{path}.{os.getpid()}.partial"
+            with open(partial_path, 'wb') as f:
+                f.write(data)
+            os.replace(partial_path, path)
+    except OSError as e:
+        print(f"Warning: Could not cache filing {accession_number}: {e}")
+
+
+def _fetch_filing_bytes(cik, accession_number, company_name, headers):
     """
-    Fetches, parses, and saves a filing into individual section files in the specified directory.
+    Fetches a filing's index page and its primary document, or reads them from
+    FILING_CACHE_DIR if this accession number was fetched before.
+    Returns (metadata, primary document bytes).
     """
-    try:
-        # 1. Get the filing index page
-        accession_no_dashes = accession_number.replace("-", "")
-        index_url = f"https://www.sec.gov/Archives/edgar/data/{cik}/{accession_no_dashes}/{accession_number}-index.html"
-        
-        response = requests.get(index_url, headers=headers)
-        response.raise_for_status()
-        index_soup = BeautifulSoup(response.content, 'html.parser')
-
-        # 2. Extract metadata
-        form_name_tag = index_soup.find('div', id='formName')
-        form_type = form_name_tag.find('strong').text.strip() if form_name_tag and form_name_tag.find('strong') else "UNKNOWN_FORM"
-
-        filing_date_tag = index_soup.find('div', class_='infoHead', string='Filing Date')
-        filing_date = filing_date_tag.find_next_sibling('div').text.strip() if filing_date_tag and filing_date_tag.find_next_sibling('div') else "UNKNOWN_DATE"
-
-        metadata = {
-            "accession_number": accession_number,
-            "cik": cik,
-            "company": company_name,
-            "filing_date": filing_date,
-            "form_type": form_type
-        }
-
-        # 3. Find and fetch the primary document
-        file_table = index_soup.find('table', class_='tableFile')
-        if not file_table:
-            raise ValueError("Could not find the file table in the index file.")
-
-        primary_doc_link_tag = None
-        for row in file_table.find_all('tr'):
-            cells = row.find_all('td')
-            if len(cells) > 3 and cells[3].text.strip() in metadata['form_type']:
-                primary_doc_link_tag = cells[2].find('a')
-                if primary_doc_link_tag:
-                    break
-        
-        if not primary_doc_link_tag or not primary_doc_link_tag.has_attr('href'):
-            raise ValueError(f"Could not find a valid link for Form Type '{metadata['form_type']}' in the index file.")
-        
-        doc_path = primary_doc_link_tag['href']
-        if "?doc=" in doc_path:
-            doc_path = doc_path.split('?doc=')[-1]
-        doc_url = "https://www.sec.gov" + doc_path
-        
-        doc_response = requests.get(doc_url, headers=headers)
-        doc_response.raise_for_status()
+    cached = _load_cached_filing(accession_number)
+    if cached:
+        index_metadata, content = cached
+        print(f"Loaded cached filing {accession_number}.")
+        return {"accession_number": accession_number, "cik": cik, "company": company_name, **index_metadata}, content
+
+    # 1. Get the filing index page
+    accession_no_dashes = accession_number.replace("-", "")
+    index_url = f"https://www.sec.gov/Archives/edgar/data/{cik}/{accession_no_dashes}/{accession_number}-index.html"
+    
+    response = sec_get(index_url, headers)
+    index_soup = BeautifulSoup(response.content, HTML_PARSER, parse_only=INDEX_PAGE_STRAINER)
+
+    # 2. Extract metadata
+    form_name_tag = index_soup.find('div', id='formName')
+    form_type = form_name_tag.find('strong').text.strip() if form_name_tag and form_name_tag.find('strong') else "UNKNOWN_FORM"
+
+    filing_date_tag = index_soup.find('div', class_='infoHead', string='Filing Date')
+    filing_date = filing_date_tag.find_next_sibling('div').text.strip() if filing_date_tag and filing_date_tag.find_next_sibling('div') else "UNKNOWN_DATE"
+
+    metadata = {
+        "accession_number": accession_number,
+        "cik": cik,
+        "company": company_name,
+        "filing_date": filing_date,
+        "form_type": form_type
+    }
+
+    # 3. Find and fetch the primary document
+    file_table = index_soup.find('table', class_='tableFile')
+    if not file_table:
+        raise ValueError("Could not find the file table in the index file.")
+
+    primary_doc_link_tag = None
+    for row in file_table.find_all('tr'):
+        cells = row.find_all('td')
+        if len(cells) > 3 and cells[3].text.strip() in metadata['form_type']:
+            primary_doc_link_tag = cells[2].find('a')
+            if primary_doc_link_tag:
+                break
+    
+    if not primary_doc_link_tag or not primary_doc_link_tag.has_attr('href'):
+        raise ValueError(f"Could not find a valid link for Form Type '{metadata['form_type']}' in the index file.")
+    
+    doc_path = primary_doc_link_tag['href']
+    if "?doc=" in doc_path:
+        doc_path = doc_path.split('?doc=')[-1]
+    doc_url = "https://www.sec.gov" + doc_path
+    
+    doc_response = sec_get(doc_url, headers)
+    _save_cached_filing(accession_number, {"filing_date": filing_date, "form_type": form_type}, doc_response.content)
+    return metadata, doc_response.content
 
+
+def _parse_and_write(content, metadata, output_dir, text_format='markdown', output_format='json'):
+    """
+    Splits a fetched primary document into sections and saves each valid one to
+    output_dir. Runs in a worker process during batch processing.
+    `text_format` is one of TEXT_FORMATS and selects how each section's text is rendered;
+    `output_format` is one of OUTPUT_FORMATS.
+    """
+    if text_format not in TEXT_FORMATS:
+        raise ValueError(f"Unknown text_format '{text_format}'; expected one of {TEXT_FORMATS}.")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output_format '{output_format}'; expected one of {OUTPUT_FORMATS}.")
+    company_name = metadata['company']
+    accession_number = metadata['accession_number']
+    cik = metadata['cik']
+    try:
         # 4. Parse the primary HTML document for sections
         print("Parsing HTML for sections...")
-        filing_soup = BeautifulSoup(doc_response.content, 'html.parser')
+        filing_soup = BeautifulSoup(content, HTML_PARSER)
 
         sections = []
-        section_pattern = re.compile(r'item\s*\d+[a-z]?\.?', re.IGNORECASE)
-        potential_headers = filing_soup.find_all(['p', 'b', 'strong', 'div'])
-
-        headers_found = []
-        for p in potential_headers:
-            if p.find_parent('table') or p.find_parent('a'):
+        headers_found = _find_section_headers(filing_soup)
+
+        # A section is every sibling tag after its header up to the next header under the
+        # same parent. Each parent's children are walked once, so the pass is linear in
+        # the document rather than a sibling scan (and list membership test) per header.
+        header_ids = {id(header) for header in headers_found}
+        content_by_header = {}
+        walked_parents = set()
+        for header in headers_found:
+            parent = header.parent
+            if id(parent) in walked_parents:
                 continue
-            text = p.get_text(strip=True)
-            if section_pattern.match(text):
-                headers_found.append(p)
-        
-        for i, header in enumerate(headers_found):
+            walked_parents.add(id(parent))
+            current_section_buffer = None
+            for child in parent.children:
+                if child.name is None:
+                    # Text and comment nodes were never part of a section's content
+                    continue
+                if id(child) in header_ids:
+                    current_section_buffer = content_by_header[id(child)] = []
+                elif current_section_buffer is not None:
+                    current_section_buffer.append(str(child))
+
+        for header in headers_found:
             section_title = header.get_text(strip=True)
-            section_content_tags = []
-            for sibling in header.find_next_siblings():
-                if sibling in headers_found:
-                    break
-                section_content_tags.append(str(sibling))
-            content_html = "".join(section_content_tags)
+            content_html = "".join(content_by_header[id(header)])
             sections.append({'name': section_title, 'content': content_html})
 
         # 5. Filter and Save each valid section
@@ -212,17 +451,22 @@ def fetch_and_process_filing(cik, accession_number, company_name, output_dir, he
         min_content_length = 250
         sections = [s for s in sections if len(s['content']) > min_content_length]
 
-        title_only_pattern = re.compile(r'^\s*item\s*\d+[a-z]?\.?\s*$', re.IGNORECASE)
-        sections = [s for s in sections if not title_only_pattern.match(s['name'])]
+        sections = [s for s in sections if not _TITLE_ONLY_RE.match(s['name'])]
 
         saved_count = 0
+        section_lines = []
         for section in sections:
             title = section['name']
             content_html = section['content']
             
             tables, soup_without_tables = _extract_and_structure_tables(content_html)
             
-            clean_markdown = md(str(soup_without_tables), heading_style="ATX") if soup_without_tables else ""
+            if not soup_without_tables:
+                clean_text = ""
+            elif text_format == 'text':
+                clean_text = _extract_text(soup_without_tables)
+            else:
+                clean_text = md(str(soup_without_tables), heading_style="ATX")
             year = metadata['filing_date'].split('-')[0]
             quarter = get_quarter(metadata['filing_date'])
             doc_type = metadata['form_type'].replace('Form ', '')
@@ -231,7 +475,7 @@ def fetch_and_process_filing(cik, accession_number, company_name, output_dir, he
                 "domain": "external", "subdomain": "SEC", "Company": company_name,
                 "Document type": doc_type, "year": year, "quarter": quarter,
                 "section": title, "accession_number": accession_number, "cik": cik,
-                "filing_date": metadata['filing_date'], "text": clean_markdown,
+                "filing_date": metadata['filing_date'], "text": clean_text,
                 "tables": tables
             }
 
@@ -242,22 +486,46 @@ def fetch_and_process_filing(cik, accession_number, company_name, output_dir, he
                 safe_section_title
             ]
             filename = "_".join(filename_parts) + ".json"
-            output_path = os.path.join(output_dir, filename)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(structured_data, f, indent=4)
+
+            if output_format == 'jsonl':
+                section_lines.append(orjson.dumps({**structured_data, "filename": filename}) + b"\n")
+            else:
+                output_path = os.path.join(output_dir, filename)
+                # orjson encodes the whole section in C and returns bytes, so each file is a
+                # single write
+                with open(output_path, 'wb') as f:
+                    f.write(orjson.dumps(structured_data, option=orjson.OPT_INDENT_2))
             
             saved_count += 1
 
+        if section_lines:
+            # The whole filing goes out in one file creation and one write
+            with open(os.path.join(output_dir, f"{accession_number}.jsonl"), 'wb') as f:
+                f.write(b"".join(section_lines))
+
         print(f"Successfully saved {saved_count} valid sections.")
 
     except Exception as e:
         print(f"An error occurred while processing {accession_number}: {e}")
 
 
-def batch_process_filings(input_csv_path, output_dir, headers):
+def fetch_and_process_filing(cik, accession_number, company_name, output_dir, headers, text_format='markdown',
+                             output_format='json'):
+    """
+    Fetches, parses, and saves a filing into individual section files in the specified directory.
+    """
+    try:
+        metadata, content = _fetch_filing_bytes(cik, accession_number, company_name, headers)
+    except Exception as e:
+        print(f"An error occurred while processing {accession_number}: {e}")
+        return
+    _parse_and_write(content, metadata, output_dir, text_format, output_format)
+
+
+def batch_process_filings(input_csv_path, output_dir, headers, text_format='markdown', output_format='json'):
     """
-    Reads a CSV file of filings and processes each one.
+    Reads a CSV file of filings and processes them concurrently: FILING_WORKERS threads
+    fetch filings while PARSE_WORKERS processes parse and save the ones already fetched.
     """
     try:
         if os.path.exists(output_dir):
@@ -265,22 +533,43 @@ def batch_process_filings(input_csv_path, output_dir, headers):
             shutil.rmtree(output_dir)
         os.makedirs(output_dir)
 
-        with open(input_csv_path, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                accession_with_dashes = f"{row['accession_number'][:10]}-{row['accession_number'][10:12]}-{row['accession_number'][12:]}"
-                
-                print("\n" + "="*80)
-                print(f"Processing {row['ticker']} {row['form_type']} filing from {row['filing_date']}...")
-                print("="*80 + "\n")
-                
-                fetch_and_process_filing(
-                    cik=row['cik'],
-                    accession_number=accession_with_dashes,
-                    company_name=row['ticker'],
-                    output_dir=output_dir,
+        # Every column is read as a string so CIKs and accession numbers keep their
+        # leading zeros; the dashed accession number is built for all rows at once
+        filings = pd.read_csv(input_csv_path, dtype='string')
+        accession_numbers = filings['accession_number'].str
+        filings['accession_with_dashes'] = (
+            accession_numbers.slice(0, 10) + '-' + accession_numbers.slice(10, 12) + '-' + accession_numbers.slice(12)
+        )
+
+        def fetch_row(row):
+            print("\n" + "="*80)
+            print(f"Processing {row.ticker} {row.form_type} filing from {row.filing_date}...")
+            print("="*80 + "\n")
+
+            try:
+                return _fetch_filing_bytes(
+                    cik=row.cik,
+                    accession_number=row.accession_with_dashes,
+                    company_name=row.ticker,
                     headers=headers
                 )
+            except Exception as e:
+                print(f"An error occurred while processing {row.accession_with_dashes}: {e}")
+                return None
+
+        # Filings are independent and every section filename is unique, so parse workers
+        # write straight to output_dir; _parse_and_write reports its own errors. Each
+        # filing is handed to the process pool as soon as its fetch completes.
+        parse_context = multiprocessing.get_context(PARSE_START_METHOD)
+        with ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=parse_context) as parse_pool:
+            with ThreadPoolExecutor(max_workers=FILING_WORKERS) as fetch_pool:
+                parse_jobs = [
+                    parse_pool.submit(_parse_and_write, fetched[1], fetched[0], output_dir, text_format, output_format)
+                    for fetched in fetch_pool.map(fetch_row, filings.itertuples(index=False))
+                    if fetched is not None
+                ]
+            for job in parse_jobs:
+                job.result()
         
         print("\nBatch processing complete.")
 
@@ -0,0 +1,8 @@
+// Indexes backing the planner's section pre-filtering
+// (Company -> Year -> Quarter -> Document lookups). Every statement is idempotent.
+// Constraint names match data_pipeline/create_graph_v3.py.
+
+CREATE CONSTRAINT unique_company IF NOT EXISTS FOR (c:Company) REQUIRE c.name IS UNIQUE;
+CREATE INDEX year_value IF NOT EXISTS FOR (y:Year) ON (y.value);
+CREATE INDEX quarter_label IF NOT EXISTS FOR (q:Quarter) ON (q.label);
+CREATE INDEX document_type IF NOT EXISTS FOR (d:Document) ON (d.document_type);
@@ -10,20 +10,54 @@ sys.path.append(str(parent_dir))
 from config import get_config
 from agent_components.cypher_builder import CypherQueryBuilder
 from agent_components.neo4j_executor import Neo4jExecutor
+from agent_components.vector_db import VectorDB
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
 
-def test_basic_hybrid_search():
-    """Test basic hybrid search with realistic company and concept."""
-    print("=== Test 1: Basic Hybrid Search ===")
-    
+# The embedding model, query builder and Neo4j driver are created on first use and
+# shared by every test; loading the model dominates this script's runtime.
+@lru_cache(maxsize=None)
+def get_cypher_builder():
+    return CypherQueryBuilder(SentenceTransformer('all-MiniLM-L6-v2'), VectorDB())
+
+@lru_cache(maxsize=None)
+def get_executor():
     config = get_config("anthropic", "default")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    cypher_builder = CypherQueryBuilder(model)
-    executor = Neo4jExecutor(
+    return Neo4jExecutor(
         uri=config.database.uri,
         user=config.database.user,
         password=config.database.password
     )
+
+# Concepts searched by the tests below; they are embedded together before the run
+TEST_CONCEPTS = [
+    'business overview and revenue streams',
+    'executive compensation and corporate governance',
+    'mortgage lending and real estate loans',
+    'financial performance metrics',
+    'manufacturing processes for semiconductor wafers',
+    'company revenue and earnings report',
+    'stress testing and capital adequacy',
+]
+
+def precompute_concept_searches():
+    """
+    Embeds every test concept in one batched forward pass and FAISS search. The results
+    land in the builder's search cache, so each test's build_query reuses them.
+    """
+    plans = [{'search_type': 'Hybrid', 'concept': concept} for concept in TEST_CONCEPTS]
+    try:
+        get_cypher_builder().build_queries(plans)
+        print(f"Precomputed searches for {len(plans)} test concepts")
+    except Exception as e:
+        print(f"⚠️ Could not precompute concept searches, tests will embed individually: {e}")
+
+def test_basic_hybrid_search():
+    """Test basic hybrid search with realistic company and concept."""
+    print("=== Test 1: Basic Hybrid Search ===")
+    
+    cypher_builder = get_cypher_builder()
+    executor = get_executor()
     
     try:
         # Use UMBF which we know has embeddings
@@ -65,21 +99,13 @@ def test_basic_hybrid_search():
     except Exception as e:
         print(f"❌ Test failed: {e}")
         return False
-    finally:
-        executor.close()
 
 def test_no_filters_hybrid_search():
     """Test hybrid search without company/year filters."""
     print("\n=== Test 2: Hybrid Search No Filters ===")
     
-    config = get_config("anthropic", "default")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    cypher_builder = CypherQueryBuilder(model)
-    executor = Neo4jExecutor(
-        uri=config.database.uri,
-        user=config.database.user,
-        password=config.database.password
-    )
+    cypher_builder = get_cypher_builder()
+    executor = get_executor()
     
     try:
         test_plan = {
@@ -108,21 +134,13 @@ def test_no_filters_hybrid_search():
     except Exception as e:
         print(f"❌ Test failed: {e}")
         return False
-    finally:
-        executor.close()
 
 def test_all_filters_hybrid_search():
     """Test hybrid search with multiple companies and filters."""
     print("\n=== Test 3: Hybrid Search All Filters ===")
     
-    config = get_config("anthropic", "default")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    cypher_builder = CypherQueryBuilder(model)
-    executor = Neo4jExecutor(
-        uri=config.database.uri,
-        user=config.database.user,
-        password=config.database.password
-    )
+    cypher_builder = get_cypher_builder()
+    executor = get_executor()
     
     try:
         # Use companies we actually have data for
@@ -155,16 +173,12 @@ def test_all_filters_hybrid_search():
     except Exception as e:
         print(f"❌ Test failed: {e}")
         return False
-    finally:
-        executor.close()
 
 def test_hybrid_search_edge_cases():
     """Test hybrid search edge cases"""
     print("\n=== Test 4: Hybrid Search Edge Cases ===")
     
-    config = get_config("anthropic", "default")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    cypher_builder = CypherQueryBuilder(model)
+    cypher_builder = get_cypher_builder()
     
     # Test case 1: Empty concept
     test_plan_empty = {
@@ -206,8 +220,7 @@ def test_embedding_generation():
     """Test that embeddings are generated correctly"""
     print("\n=== Test 5: Embedding Generation ===")
     
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    cypher_builder = CypherQueryBuilder(model)
+    cypher_builder = get_cypher_builder()
     
     test_concept = "financial performance metrics"
     
@@ -247,14 +260,8 @@ def test_no_matching_results():
     """Test hybrid search for a concept that should yield no results."""
     print("\n=== Test 6: No Matching Results ===")
     
-    config = get_config("anthropic", "default")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    cypher_builder = CypherQueryBuilder(model)
-    executor = Neo4jExecutor(
-        uri=config.database.uri,
-        user=config.database.user,
-        password=config.database.password
-    )
+    cypher_builder = get_cypher_builder()
+    executor = get_executor()
     
     try:
         test_plan = {
@@ -284,21 +291,13 @@ def test_no_matching_results():
     except Exception as e:
         print(f"❌ Test failed: {e}")
         return False
-    finally:
-        executor.close()
 
 def test_multi_company_financial_comparison():
     """Test comparing financial performance across multiple companies."""
     print("\n=== Test 7: Multi-Company Financial Comparison ===")
     
-    config = get_config("anthropic", "default")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    cypher_builder = CypherQueryBuilder(model)
-    executor = Neo4jExecutor(
-        uri=config.database.uri,
-        user=config.database.user,
-        password=config.database.password
-    )
+    cypher_builder = get_cypher_builder()
+    executor = get_executor()
     
     try:
         test_plan = {
@@ -326,21 +325,13 @@ def test_multi_company_financial_comparison():
     except Exception as e:
         print(f"❌ Test failed: {e}")
         return False
-    finally:
-        executor.close()
 
 def test_regulatory_and_risk_search():
     """Test for specific regulatory items like Dodd-Frank or Basel III"""
     print("\n=== Test 8: Regulatory and Risk Search ===")
     
-    config = get_config("anthropic", "default")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    cypher_builder = CypherQueryBuilder(model)
-    executor = Neo4jExecutor(
-        uri=config.database.uri,
-        user=config.database.user,
-        password=config.database.password
-    )
+    cypher_builder = get_cypher_builder()
+    executor = get_executor()
     
     try:
         test_plan = {
@@ -366,22 +357,25 @@ def test_regulatory_and_risk_search():
     except Exception as e:
         print(f"❌ Test failed: {e}")
         return False
-    finally:
-        executor.close()
 
 if __name__ == "__main__":
     print("🧪 Testing Hybrid Search Tool Independently")
     print("=" * 60)
     
     results = []
-    results.append(test_basic_hybrid_search())
-    results.append(test_no_filters_hybrid_search())
-    results.append(test_all_filters_hybrid_search())
-    results.append(test_hybrid_search_edge_cases())
-    results.append(test_embedding_generation())
-    results.append(test_no_matching_results())
-    results.append(test_multi_company_financial_comparison())
-    results.append(test_regulatory_and_risk_search())
+    try:
+        precompute_concept_searches()
+        results.append(test_basic_hybrid_search())
+        results.append(test_no_filters_hybrid_search())
+        results.append(test_all_filters_hybrid_search())
+        results.append(test_hybrid_search_edge_cases())
+        results.append(test_embedding_generation())
+        results.append(test_no_matching_results())
+        results.append(test_multi_company_financial_comparison())
+        results.append(test_regulatory_and_risk_search())
+    finally:
+        if get_executor.cache_info().currsize:
+            get_executor().close()
 
     print("\n" + "="*60)
     print("📊 Test Summary:")
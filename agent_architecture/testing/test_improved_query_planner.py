@@ -4,7 +4,7 @@ Test script for the improved query planner with focused data approach
 
 import sys
 import os
-import json
+import orjson
 from pathlib import Path
 import logging
 
@@ -17,6 +17,7 @@ from config import get_config, ConfigManager
 from agent_components.unified_llm_client import UnifiedLLMClient
 from agent_components.neo4j_executor import Neo4jExecutor
 from agent_components.improved_query_planner import ImprovedQueryPlanner
+from agent_components.response_cache import ResponseCache
 
 # =============================================================================
 # TEST CONFIGURATION
@@ -44,21 +45,28 @@ SAMPLE_QUERIES = [
 # TEST FUNCTIONS
 # =============================================================================
 
+def _emit(lines):
+    """Write a block of output lines with a single stdout write"""
+    sys.stdout.write("\n".join(lines) + "\n")
+
+def _header_lines(title):
+    return ["", "="*80, f" {title}", "="*80]
+
+def _section_lines(title):
+    return ["", f"📋 {title}", "-" * 60]
+
 def print_header(title):
     """Print a formatted header"""
-    print("\n" + "="*80)
-    print(f" {title}")
-    print("="*80)
+    _emit(_header_lines(title))
 
 def print_section(title):
     """Print a formatted section"""
-    print(f"\n📋 {title}")
-    print("-" * 60)
+    _emit(_section_lines(title))
 
 def print_json_pretty(data, title="JSON Output"):
     """Pretty print JSON data"""
     print(f"\n🔍 {title}:")
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    print(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode())
 
 def test_improved_planner(planner, query):
     """Test the improved query planner"""
@@ -77,10 +85,11 @@ def test_improved_planner(planner, query):
 
 def analyze_improved_plan(plan_or_list):
     """Analyze and explain the improved planning decision. Handles a single plan or a list of plans."""
-    print_section("PLAN ANALYSIS")
+    lines = _section_lines("PLAN ANALYSIS")
 
     if not plan_or_list:
-        print("❌ No plan generated")
+        lines.append("❌ No plan generated")
+        _emit(lines)
         return
 
     # If it's a list of plans, analyze each one. Otherwise, put the single plan in a list to standardize.
@@ -88,7 +97,7 @@ def analyze_improved_plan(plan_or_list):
 
     for i, plan in enumerate(plans):
         if len(plans) > 1:
-            print(f"\n--- Analyzing Plan {i+1}/{len(plans)} ---")
+            lines.append(f"\n--- Analyzing Plan {i+1}/{len(plans)} ---")
 
         search_type = plan.get('search_type', 'Unknown')
         # Extract the specific company for this part of the plan, if available.
@@ -98,41 +107,43 @@ def analyze_improved_plan(plan_or_list):
 
         reasoning = plan.get('reasoning', 'No reasoning provided')
         
-        print(f"🎯 Search Strategy: {search_type}")
-        print(f"🏢 Target Company: {company}")
-        print(f"💭 Reasoning: {reasoning}")
+        lines.append(f"🎯 Search Strategy: {search_type}")
+        lines.append(f"🏢 Target Company: {company}")
+        lines.append(f"💭 Reasoning: {reasoning}")
         
         if search_type == 'Direct':
             sections = plan.get('sections', [])
-            print(f"📂 Target Sections: {sections}")
-            print("   ✅ Will use metadata filtering to find exact sections")
+            lines.append(f"📂 Target Sections: {sections}")
+            lines.append("   ✅ Will use metadata filtering to find exact sections")
             
         elif search_type == 'Hybrid':
             concept = plan.get('concept', '')
-            print(f"🔍 Search Concept: '{concept}'")
-            print("   ✅ Will use vector search + metadata filtering")
+            lines.append(f"🔍 Search Concept: '{concept}'")
+            lines.append("   ✅ Will use vector search + metadata filtering")
             
         elif search_type == 'Comprehensive':
-            print("📊 Will retrieve latest documents for the company")
+            lines.append("📊 Will retrieve latest documents for the company")
             
         else:
-            print(f"❓ Unknown search strategy: {search_type}")
+            lines.append(f"❓ Unknown search strategy: {search_type}")
+
+    _emit(lines)
 
 def compare_old_vs_new_approach():
     """Compare the old 3-step vs new 1-step approach"""
-    print_section("OLD vs NEW APPROACH COMPARISON")
-    
-    print("❌ OLD APPROACH (3 steps):")
-    print("  1. Preliminary Plan: Extract entities with ALL companies' data")
-    print("  2. Dynamic Schema: Get sections for extracted entities") 
-    print("  3. Final Plan: LLM confused by too much irrelevant data")
-    print("  Result: Poor section matching, wrong search type")
-    
-    print("\n✅ NEW APPROACH (1 step):")
-    print("  1. Extract company → Get ONLY that company's real data")
-    print("  2. Get focused sections for specific context")
-    print("  3. LLM gets clean, relevant data → Better decisions")
-    print("  Result: Accurate section matching, correct search type")
+    _emit(_section_lines("OLD vs NEW APPROACH COMPARISON") + [
+        "❌ OLD APPROACH (3 steps):",
+        "  1. Preliminary Plan: Extract entities with ALL companies' data",
+        "  2. Dynamic Schema: Get sections for extracted entities",
+        "  3. Final Plan: LLM confused by too much irrelevant data",
+        "  Result: Poor section matching, wrong search type",
+        "",
+        "✅ NEW APPROACH (1 step):",
+        "  1. Extract company → Get ONLY that company's real data",
+        "  2. Get focused sections for specific context",
+        "  3. LLM gets clean, relevant data → Better decisions",
+        "  Result: Accurate section matching, correct search type",
+    ])
 
 def main():
     """Main test execution"""
@@ -167,8 +178,10 @@ def main():
         )
         print("✅ Neo4j executor initialized")
         
-        # Initialize improved planner
-        planner = ImprovedQueryPlanner(llm_client, neo4j_executor)
+        # Initialize improved planner. Its LLM responses are cached on disk, so rerunning
+        # the same USER_QUERY skips the planner's LLM calls.
+        plan_cache = ResponseCache()
+        planner = ImprovedQueryPlanner(llm_client, neo4j_executor, cache=plan_cache)
         print("✅ Improved planner initialized")
         
     except Exception as e:
@@ -201,6 +214,11 @@ def main():
                     print(f"📂 Matched Sections: {plan.get('sections', [])}")
         else:
             print("❌ Plan generation failed")
+
+        stats = plan_cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        if lookups:
+            print(f"♻️  Planner cache hit rate: {100 * stats['hits'] / lookups:.0f}% ({stats['hits']}/{lookups})")
         
     except Exception as e:
         print(f"❌ Test execution failed: {e}")
@@ -210,6 +228,7 @@ def main():
     finally:
         # Cleanup
         neo4j_executor.close()
+        plan_cache.close()
         print("\n✅ Test complete. Connection closed.")
 
 def show_sample_queries():
@@ -251,10 +270,10 @@ def _validate_and_enhance_plan(self, plan: dict, focused_data: dict, available_s
     
     # LOG section mismatches but DON'T override
     if plan.get("search_type") == "Direct" and plan.get("sections"):
-        section_names = [s['name'] for s in available_sections]
+        section_names = {s['name'] for s in available_sections}
         for section in plan["sections"]:
             if section not in section_names:
-                logging.warning(f"⚠️  LLM section '{section}' not found in available sections, but keeping Direct search")
+                logging.warning("⚠️  LLM section '%s' not found in available sections, but keeping Direct search", section)
     
     # NEVER override the LLM's decision
     return plan
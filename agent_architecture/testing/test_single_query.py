@@ -55,17 +55,29 @@ def main():
         agent = Neo4jQueryAgent(config=config)
         print("✅ Agent initialized successfully!")
         
-        # 2. Run the end-to-end query
+        # 2. Run the end-to-end query, streaming the answer as it is synthesized
         print(f"\n🚀 Processing query: '{USER_QUERY}'")
         print("-" * 60)
-        result = agent.run(USER_QUERY)
+        chunks = agent.run_stream(USER_QUERY)
         
-        # 3. Print the final result
-        print("\n📊 FINAL RESULT:")
-        print("-" * 60)
-        # The result is a string, so we just print it.
-        # If it were JSON, we would use json.dumps
-        print(result)
+        # 3. Print the final result. On a terminal it is printed token by token; when the
+        # output is redirected it is collected and printed once.
+        if sys.stdout.isatty():
+            first_chunk = next(chunks, "")
+            print("\n📊 FINAL RESULT:")
+            print("-" * 60)
+            print(first_chunk, end="", flush=True)
+            for chunk in chunks:
+                print(chunk, end="", flush=True)
+            print()
+        else:
+            result = "".join(chunks)
+            print("\n📊 FINAL RESULT:")
+            print("-" * 60)
+            print(result)
+
+        stats = agent.embedder.stats()
+        print(f"\n🧮 Embedding cache: {stats['hits']} hit(s), {stats['misses']} miss(es)")
 
     except Exception as e:
         print(f"\n❌ An error occurred during agent execution: {e}")